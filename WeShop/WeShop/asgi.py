@@ -2,6 +2,7 @@
 ASGI config for WeShop project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+It defaults to the settings in WeShop/settings_asgi.py.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
@@ -11,6 +12,6 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'WeShop.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'WeShop.settings_asgi')
 
 application = get_asgi_application()
@@ -0,0 +1,40 @@
+"""
+Base class for the async API views served under ASGI (see WeShop/asgi.py).
+
+DRF's APIView runs its handlers synchronously, so async endpoints are plain
+Django views with ``async def`` handlers. They authenticate with the same
+token header and cache as the DRF views (account.api.authentication) and
+render JSON with the same encoder (WeShop.responses), so they send the same
+bytes as their sync counterparts. The queries and serialization are shared
+with the sync views through the helpers of each app's api/views.py.
+"""
+
+from django.views import View
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from account.api.authentication import aauthenticate
+from WeShop.responses import JSONResponse
+
+
+class AsyncAPIView(View):
+    """
+    Async view returning JSON; DRF exceptions become their usual error responses.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except APIException as exc:
+            headers = {}
+            if exc.status_code == status.HTTP_401_UNAUTHORIZED:
+                headers['WWW-Authenticate'] = 'Token'
+            return JSONResponse({'detail': exc.detail}, status=exc.status_code, headers=headers)
+
+    async def authenticate(self, request):
+        """
+        Return the user of the request token, or None when no token was sent.
+        """
+        result = await aauthenticate(request)
+        return result[0] if result is not None else None
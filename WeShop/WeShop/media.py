@@ -0,0 +1,137 @@
+"""
+Serving of uploaded media files.
+
+Files are streamed with FileResponse, which WSGI servers such as gunicorn
+send with sendfile(), and can be handed to the front web server instead with
+settings.MEDIA_SENDFILE_HEADER ('X-Sendfile' for Apache/lighttpd,
+'X-Accel-Redirect' for nginx, with MEDIA_SENDFILE_PREFIX naming the internal
+location that maps to MEDIA_ROOT).
+"""
+
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+from WeShop.storage import content_digest
+
+# A year, the longest lifetime caches are expected to honour
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+DEFAULT_CACHE_CONTROL = 'public, max-age=86400'
+
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def parse_range(header, size):
+    """
+    Return the (start, end) bytes, end inclusive, requested by a single-range
+    Range header, None to send the whole file, or False if unsatisfiable.
+    """
+    match = RANGE.match(header.strip())
+    if not match:
+        return None  # malformed or multiple ranges: ignore the header
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # The last N bytes
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def if_range_matches(request, etag, last_modified):
+    if_range = request.headers.get('If-Range')
+    if if_range is None:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def file_chunks(path, start, length):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def serve_media(request, path):
+    """
+    Serve a file from MEDIA_ROOT with validators, caching headers and byte ranges.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('Not found.')
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404('Not found.')
+    if not os.path.isfile(full_path):
+        raise Http404('Not found.')
+
+    size = stat.st_size
+    last_modified = int(stat.st_mtime)
+    digest = content_digest(path)
+    # Content-addressed files carry their hash in the name and never change
+    etag = f'"{digest}"' if digest else f'"{stat.st_mtime_ns:x}-{size:x}"'
+    cache_control = IMMUTABLE_CACHE_CONTROL if digest else DEFAULT_CACHE_CONTROL
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        content_type, encoding = mimetypes.guess_type(full_path)
+        content_type = content_type or 'application/octet-stream'
+        byte_range = None
+        if 'Range' in request.headers and if_range_matches(request, etag, last_modified):
+            byte_range = parse_range(request.headers['Range'], size)
+
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+        elif getattr(settings, 'MEDIA_SENDFILE_HEADER', None):
+            # The front server sends the file and handles Range itself
+            response = HttpResponse(content_type=content_type)
+            header = settings.MEDIA_SENDFILE_HEADER
+            if header == 'X-Accel-Redirect':
+                prefix = getattr(settings, 'MEDIA_SENDFILE_PREFIX', '/protected-media/')
+                response[header] = quote(prefix.rstrip('/') + '/' + path)
+            else:
+                response[header] = full_path
+        elif byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                file_chunks(full_path, start, end - start + 1),
+                status=206,
+                content_type=content_type,
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(end - start + 1)
+        else:
+            response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+        if encoding:
+            response['Content-Encoding'] = encoding
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = cache_control
+    return response
@@ -0,0 +1,87 @@
+"""
+Paginator for admin changelists over large tables.
+
+Django's Paginator runs ``SELECT COUNT(*)`` on every changelist page, which
+scans the whole table on PostgreSQL and MySQL/InnoDB. ApproximateCountPaginator
+caches the count for a short time and, for unfiltered lists of big tables,
+reads the row estimate kept by the database statistics instead.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+DEFAULTS = {
+    'BACKEND': 'default',         # CACHES alias holding the counts
+    'TIMEOUT': 60,                # seconds a count is reused
+    'ESTIMATE_ABOVE': 100000,     # rows from which the estimate replaces COUNT(*)
+    'KEY_PREFIX': 'admin-count',
+}
+
+
+def get_config():
+    config = DEFAULTS.copy()
+    config.update(getattr(settings, 'ADMIN_COUNT_CACHE', {}))
+    return config
+
+
+def estimate_count(model, using='default'):
+    """
+    Row count of the model's table from the database statistics, or None when
+    the database keeps no estimate (SQLite) or the table was never analysed.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == 'postgresql':
+        sql = 'SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)'
+    elif connection.vendor == 'mysql':
+        sql = 'SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s'
+    else:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [table])
+        row = cursor.fetchone()
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class ApproximateCountPaginator(Paginator):
+    """
+    Paginator whose count is cached and, for unfiltered querysets of more than
+    ESTIMATE_ABOVE rows, estimated. Filtered and searched lists are counted
+    exactly, then cached.
+    """
+
+    def _cache_key(self):
+        queryset = self.object_list
+        sql, params = queryset.query.sql_with_params()
+        digest = hashlib.md5(f'{queryset.db}:{sql}:{params!r}'.encode()).hexdigest()
+        return f"{get_config()['KEY_PREFIX']}:{digest}"
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not hasattr(queryset, 'query'):
+            return super().count
+
+        config = get_config()
+        cache = caches[config['BACKEND']]
+        key = self._cache_key()
+        count = cache.get(key)
+        if count is not None:
+            return count
+
+        count = None
+        if not queryset.query.where:
+            estimate = estimate_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > config['ESTIMATE_ABOVE']:
+                count = estimate
+        if count is None:
+            count = queryset.count()
+        cache.set(key, count, config['TIMEOUT'])
+        return count
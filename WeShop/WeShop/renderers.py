@@ -0,0 +1,76 @@
+"""
+JSON renderer and parser backed by orjson, when it is installed.
+
+orjson serializes dicts, lists, strings, numbers, datetimes, dates, times and
+UUIDs natively, several times faster than the json module. Other values, such
+as Decimal prices, go through DRF's JSONEncoder, so the output is the same as
+with DRF's JSONRenderer. Without orjson both classes behave exactly like DRF's.
+"""
+
+import codecs
+
+from django.conf import settings
+
+from rest_framework import renderers, parsers
+from rest_framework.exceptions import ParseError
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    # Naive datetimes are written as they are, like JSONEncoder does; aware
+    # UTC ones end in "Z"; dict keys such as order IDs may be integers.
+    OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+_default = JSONEncoder().default
+
+
+def dumps(data):
+    """
+    Encode data to compact UTF-8 JSON bytes, with the escaping JSONRenderer applies.
+    """
+    if orjson is not None:
+        content = orjson.dumps(data, default=_default, option=OPTIONS)
+    else:
+        content = JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode(data).encode()
+    # Line and paragraph separators are valid JSON but not valid JavaScript
+    return content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+def fast_path_enabled():
+    return orjson is not None and api_settings.UNICODE_JSON and api_settings.COMPACT_JSON
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    """
+    JSONRenderer using orjson for compact responses.
+    Indented output, requested through the Accept header, is left to DRF.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if not fast_path_enabled() or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
+
+
+class FastJSONParser(parsers.JSONParser):
+    """
+    JSONParser using orjson for UTF-8 request bodies.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            # Like the strict JSONParser, orjson rejects NaN and Infinity
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
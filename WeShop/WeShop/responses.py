@@ -0,0 +1,20 @@
+"""
+Plain Django responses rendering JSON with the API's encoder (WeShop.renderers),
+for code that answers outside DRF views: the async views and the catalogue cache.
+"""
+
+from django.http import HttpResponse
+
+from rest_framework import status
+
+from WeShop.renderers import dumps
+
+
+class JSONResponse(HttpResponse):
+    """
+    JSON response keeping the data it was rendered from, like DRF's Response.
+    """
+
+    def __init__(self, data, status=status.HTTP_200_OK, headers=None):
+        self.data = data
+        super().__init__(dumps(data), status=status, headers=headers, content_type='application/json')
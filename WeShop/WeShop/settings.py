@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from .db import database_from_env, sqlite_pragmas_from_env
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -46,9 +49,15 @@ INSTALLED_APPS = [
     'products.apps.ProductsConfig',
     'cart.apps.CartConfig',
     'orders.apps.OrdersConfig',
+    'benchmarks.apps.BenchmarksConfig',
+    'monitoring.apps.MonitoringConfig',
 ]
 
 MIDDLEWARE = [
+    # First, so it times the rest of the stack too (see monitoring/profiling.py)
+    'monitoring.middleware.ProfilingMiddleware',
+    # Streams ?stream=true and media responses chunk by chunk under ASGI (see WeShop/streaming.py)
+    'WeShop.streaming.AsyncStreamingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -83,13 +92,15 @@ WSGI_APPLICATION = 'WeShop.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Configured from DATABASE_URL and the DB_* variables, see WeShop/db.py.
+# Defaults to the db.sqlite3 file next to manage.py.
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_from_env(BASE_DIR),
 }
 
+# Applied to every new SQLite connection by WeShop.db.configure_sqlite
+SQLITE_PRAGMAS = sqlite_pragmas_from_env()
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -139,12 +150,127 @@ REST_FRAMEWORK = {
 'DEFAULT_SCHEMA_CLASS':
 'rest_framework.schemas.coreapi.AutoSchema',
 'DEFAULT_AUTHENTICATION_CLASSES': [
-'rest_framework.authentication.TokenAuthentication',
+'account.api.authentication.CachedTokenAuthentication',
+],
+# orjson-backed JSON when it is installed, DRF's own otherwise (see WeShop/renderers.py)
+'DEFAULT_RENDERER_CLASSES': [
+'WeShop.renderers.FastJSONRenderer',
+'rest_framework.renderers.BrowsableAPIRenderer',
 ],
+'DEFAULT_PARSER_CLASSES': [
+'WeShop.renderers.FastJSONParser',
+'rest_framework.parsers.FormParser',
+'rest_framework.parsers.MultiPartParser',
+],
+}
+
+# Product listing pagination (see products/api/pagination.py)
+PRODUCTS_PAGE_SIZE = 20
+PRODUCTS_MAX_PAGE_SIZE = 100
+
+# Largest number of operations accepted by the product batch endpoint
+PRODUCTS_BATCH_MAX_SIZE = 1000
+
+# Upper bounds of the price ranges counted by the product listing facets
+PRODUCT_PRICE_BUCKETS = [50, 100, 200, 500]
+
+# Cart storage (see cart/models.py): 'json' keeps the contents in the Cart.items
+# JSON field, 'table' stores one CartItem row per product with atomic updates.
+# Carts are only written to the configured mode: after changing it, run
+# "python manage.py sync_cart_storage" before serving requests.
+CART_STORAGE = 'json'
+
+# Order history pagination (see orders/api/pagination.py)
+ORDERS_PAGE_SIZE = 20
+ORDERS_MAX_PAGE_SIZE = 100
+
+# Cached catalogue responses (see products/api/cache.py). With several workers
+# BACKEND must be a shared cache (Redis, Memcached, database): the default
+# LocMemCache is per process, so the other workers would not see invalidations.
+CATALOGUE_CACHE = {
+    'BACKEND': 'default',
+    'TIMEOUT': 60,
+}
+
+# Cached product prices used for cart totals (see products/prices.py)
+PRICE_CACHE = {
+    'BACKEND': 'default',
+    'TIMEOUT': 300,
+}
+
+# Cache of resolved authentication tokens (see account/api/authentication.py).
+# Without BACKEND each worker caches tokens for itself and only sees logouts,
+# password changes and deactivations made in other workers after LOCAL_TIMEOUT,
+# which suits a single worker. Set BACKEND to a shared cache (Redis,
+# Memcached, database) when running several workers.
+TOKEN_AUTH_CACHE = {
+    'TIMEOUT': 300,
+    'LOCAL_TIMEOUT': 10,
+    'MAX_ENTRIES': 1024,
+    'BACKEND': None,  # name of a CACHES alias to share the cache between workers
 }
 
+# Row counts of the admin changelists for orders and products (see
+# WeShop/pagination.py). Unfiltered lists of tables larger than ESTIMATE_ABOVE
+# rows show the estimate kept by PostgreSQL or MySQL instead of COUNT(*).
+ADMIN_COUNT_CACHE = {
+    'BACKEND': 'default',
+    'TIMEOUT': 60,
+    'ESTIMATE_ABOVE': 100000,
+}
+
+# Resized WebP copies of product images, built in background threads
+# (see products/images.py)
+PRODUCT_IMAGES = {
+    'VARIANTS': {
+        'thumbnail': (200, 200),
+        'medium': (800, 800),
+    },
+    'QUALITY': 80,
+    'WORKERS': 2,
+    'SYNC': False,
+}
+
+# Per-request profiling of views and SQL queries (see monitoring/profiling.py).
+# Staff users read the hottest views and queries at /monitoring/profile/.
+PROFILING = {
+    'ENABLED': True,
+    'SERVER_TIMING': DEBUG,  # the header reveals query counts and timings to clients
+}
+
+# Prometheus metrics at /metrics (see monitoring/metrics.py). Every worker
+# process writes its counters to its own file in METRICS_DIR. Metrics are off
+# in management commands other than runserver (see manage.py). Outside DEBUG,
+# /metrics requires METRICS_TOKEN; with DEBUG on and no token it only answers
+# ALLOWED_IPS.
+METRICS = {
+    'ENABLED': os.environ.get('METRICS_ENABLED', '1') == '1',
+    'FLUSH_INTERVAL': 1.0,
+    'TOKEN': os.environ.get('METRICS_TOKEN'),  # require "Authorization: Bearer <token>" from the scraper
+    'ALLOWED_IPS': ['127.0.0.1', '::1'],
+}
+
+# Per-endpoint budgets of the benchmark_api command, overriding the ones in
+# benchmarks/load.py, e.g. {'products:list': {'queries': 2, 'p95_ms': 100}}
+BENCHMARK_BUDGETS = {}
+
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
 # Media file settings
 MEDIA_URL = '/media/'  # URL prefix for media files
-MEDIA_ROOT = BASE_DIR / 'media'  # Absolute path to media directory
\ No newline at end of file
+MEDIA_ROOT = BASE_DIR / 'media'  # Absolute path to media directory
+
+# Uploads are stored under the SHA-256 of their content (see WeShop/storage.py)
+STORAGES = {
+    'default': {
+        'BACKEND': 'WeShop.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
+# Let the front web server send media files: None, 'X-Sendfile' or
+# 'X-Accel-Redirect' (nginx, with an internal location mapped to MEDIA_ROOT)
+MEDIA_SENDFILE_HEADER = None
+MEDIA_SENDFILE_PREFIX = '/protected-media/'
\ No newline at end of file
@@ -0,0 +1,13 @@
+"""
+Settings for running WeShop under an ASGI server (see WeShop/asgi.py).
+
+The async views (the async/ routes of products and cart) run on the event
+loop, so one process can keep thousands of slow clients waiting on I/O.
+"""
+
+from .settings import *  # noqa: F401,F403
+
+# Under ASGI the database work of a request runs in a worker thread shared by
+# all requests, and persistent connections would outlive the requests that
+# opened them; use a connection pooler (DB_POOL=pgbouncer) to reuse them.
+DATABASES['default']['CONN_MAX_AGE'] = 0  # noqa: F405
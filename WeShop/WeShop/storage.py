@@ -0,0 +1,49 @@
+import hashlib
+import os
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+# Names produced by ContentAddressedStorage: "ab/ab12...ef.jpg"
+HASHED_NAME = re.compile(r'^[0-9a-f]{2}/(?P<digest>[0-9a-f]{64})(\.[\w]+)?$')
+
+
+def content_digest(name):
+    """
+    Return the SHA-256 embedded in a content-addressed file name, or None.
+    """
+    match = HASHED_NAME.match(name)
+    return match.group('digest') if match else None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage that names every file after the SHA-256 of its content.
+
+    The directory given by ``upload_to`` is dropped, so the same image uploaded
+    for several products is stored once and every product points to that file.
+    A stored file never changes, which lets it be served with immutable caching
+    headers (see WeShop/media.py). Files are never deleted by Django, so a file
+    shared between products stays available when one of them is removed.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+
+        digest = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        name = f'{digest[:2]}/{digest}{extension}'
+        if self.exists(name):
+            return name
+        # Two concurrent uploads of a new file may both get here; the second
+        # one is then stored under a suffixed name, which is only a wasted copy.
+        return super().save(name, content, max_length)
@@ -0,0 +1,162 @@
+"""
+Streaming JSON responses for large lists.
+
+Views opt in with ``?stream=true``: instead of building the whole list and
+rendering it at once, rows are read with QuerySet.iterator(), serialized one
+at a time and sent as chunks of a single JSON array (or object), so memory use
+does not grow with the size of the result. Rows are encoded like the regular
+responses (see WeShop/renderers.py), so the bytes are the same.
+
+Under ASGI, Django 4.2 reads a synchronous streaming response into a list
+before sending it. AsyncStreamingMiddleware avoids that by pulling the chunks
+one at a time from the synchronous thread, so memory stays flat under both
+WSGI and ASGI.
+"""
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.http import StreamingHttpResponse
+
+from rest_framework.renderers import JSONRenderer
+
+from WeShop.renderers import dumps
+
+# Rows fetched from the database, and serialized rows sent, at a time
+CHUNK_SIZE = 500
+ROWS_PER_CHUNK = 100
+
+
+def wants_stream(request):
+    """
+    Whether the client asked for a streamed response that will be rendered as JSON.
+    Other negotiated formats, such as the browsable API, keep the regular response.
+    """
+    renderer = getattr(request, 'accepted_renderer', None)
+    return stream_requested(request) and isinstance(renderer, JSONRenderer)
+
+
+def stream_requested(request):
+    """
+    Whether ``?stream=true`` was given; works on DRF and plain Django requests.
+    """
+    return request.GET.get('stream', '').lower() in ('true', '1')
+
+
+def _chunks(items, opening, closing, encode):
+    buffer = [opening]
+    first = True
+    for item in items:
+        if not first:
+            buffer.append(b',')
+        buffer.append(encode(item))
+        first = False
+        if len(buffer) >= ROWS_PER_CHUNK:
+            yield b''.join(buffer)
+            buffer = []
+    buffer.append(closing)
+    yield b''.join(buffer)
+
+
+async def _achunks(items, opening, closing, encode):
+    buffer = [opening]
+    first = True
+    async for item in items:
+        if not first:
+            buffer.append(b',')
+        buffer.append(encode(item))
+        first = False
+        if len(buffer) >= ROWS_PER_CHUNK:
+            yield b''.join(buffer)
+            buffer = []
+    buffer.append(closing)
+    yield b''.join(buffer)
+
+
+def stream_json_array(rows, status=200):
+    """
+    Stream an iterable, or async iterable, of JSON-compatible rows as one JSON array.
+    """
+    chunks = _achunks if hasattr(rows, '__aiter__') else _chunks
+    return StreamingHttpResponse(
+        chunks(rows, b'[', b']', dumps),
+        status=status,
+        content_type='application/json',
+    )
+
+
+def stream_json_object(pairs, status=200):
+    """
+    Stream an iterable of (key, value) pairs as one JSON object.
+    """
+    def encode(pair):
+        key, value = pair
+        return dumps(str(key)) + b':' + dumps(value)
+
+    return StreamingHttpResponse(
+        _chunks(pairs, b'{', b'}', encode),
+        status=status,
+        content_type='application/json',
+    )
+
+
+def serialize_rows(queryset, serializer_class, chunk_size=CHUNK_SIZE, **kwargs):
+    """
+    Serialize a queryset one row at a time, reading it in chunks.
+    """
+    # One serializer for every row: a serializer per row leaves reference
+    # cycles (fields point back to their parent) for the garbage collector
+    serializer = serializer_class(**kwargs)
+    for instance in queryset.iterator(chunk_size=chunk_size):
+        yield serializer.to_representation(instance)
+
+
+async def aserialize_rows(queryset, serializer_class, chunk_size=CHUNK_SIZE, **kwargs):
+    """
+    Async version of serialize_rows, for async views.
+    """
+    serializer = serializer_class(**kwargs)
+    async for instance in queryset.aiterator(chunk_size=chunk_size):
+        yield serializer.to_representation(instance)
+
+
+_DONE = object()
+
+
+async def aiterate(iterator):
+    """
+    Iterate a synchronous iterator from async code, fetching each item in the
+    thread-sensitive executor where the sync views (and their database
+    connection) run.
+    """
+    iterator = iter(iterator)
+    fetch = sync_to_async(next, thread_sensitive=True)
+    while True:
+        item = await fetch(iterator, _DONE)
+        if item is _DONE:
+            return
+        yield item
+
+
+class AsyncStreamingMiddleware:
+    """
+    Under ASGI, send synchronous streaming responses chunk by chunk instead of
+    letting Django buffer them. Does nothing under WSGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if response.streaming and not response.is_async:
+            response.streaming_content = aiterate(response.streaming_content)
+        return response
@@ -0,0 +1,92 @@
+"""
+Test fixtures and helpers pinning the number of SQL queries of the API endpoints.
+"""
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from account.api.authentication import clear_token_cache
+from products.models import Category, Product
+
+# Fixture sizes every endpoint is measured against
+SIZES = (1, 10, 100)
+
+
+def create_products(size, categories=1, username='seller'):
+    """
+    A user with a token, owning ``size`` available products spread over
+    ``categories`` categories. Returns a dict of the created rows.
+    """
+    user = User.objects.create_user(username)
+    token = Token.objects.create(user=user)
+    category_rows = Category.objects.bulk_create(
+        Category(name=f'Categoria {index}', slug=f'categoria-{index}') for index in range(categories)
+    )
+    products = Product.objects.bulk_create(
+        Product(
+            category=category_rows[index % categories],
+            user=user,
+            name=f'Camiseta {index}',
+            slug=f'camiseta-{index}',
+            description='Camiseta de algodão',
+            price=Decimal(index % 300) + Decimal('9.90'),
+        )
+        for index in range(size)
+    )
+    return {'user': user, 'token': token, 'categories': category_rows, 'products': products}
+
+
+def clear_caches():
+    for alias in settings.CACHES:
+        caches[alias].clear()
+    clear_token_cache()
+
+
+class QueryCountTestCase(TestCase):
+    """
+    TestCase asserting that an endpoint runs the same number of queries
+    whatever the size of the data it reads or writes.
+    """
+
+    def client_for(self, token):
+        """
+        An APIClient authenticated with a Token created by the fixture.
+        """
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def assertQueryCount(self, expected, build, request, sizes=SIZES, status=None):
+        """
+        For each size, call ``build(size)`` to create the fixture, then run
+        ``request(fixture)`` on cold caches and check it runs ``expected``
+        queries. Each size is rolled back before the next one. On failure the
+        captured queries are listed.
+        """
+        for size in sizes:
+            with self.subTest(size=size):
+                savepoint = transaction.savepoint()
+                try:
+                    fixture = build(size)
+                    clear_caches()
+                    with CaptureQueriesContext(connection) as queries:
+                        response = request(fixture)
+                    if status is not None:
+                        self.assertEqual(response.status_code, status, getattr(response, 'content', b'')[:500])
+                    if len(queries) != expected:
+                        captured = '\n'.join(
+                            f'{position}. {query["sql"]}' for position, query in enumerate(queries.captured_queries, 1)
+                        )
+                        self.fail(f'{len(queries)} queries with {size} items, expected {expected}:\n{captured}')
+                finally:
+                    transaction.savepoint_rollback(savepoint)
+                    clear_caches()
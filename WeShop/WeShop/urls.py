@@ -1,7 +1,6 @@
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 
 from rest_framework import routers
 from rest_framework import permissions
@@ -10,6 +9,9 @@ from rest_framework.schemas import get_schema_view
 from drf_yasg.views import get_schema_view as yasg_schema_view
 from drf_yasg import openapi
 
+from WeShop.media import serve_media
+from monitoring.views import metrics_view
+
 schema_view = yasg_schema_view(
     openapi.Info(
         title="API de Exemplo",
@@ -28,6 +30,10 @@ urlpatterns = [
     path('products/', include('products.api.urls', namespace = 'products')),
     path('cart/', include('cart.api.urls', namespace = 'cart')),
     path('orders/', include('orders.api.urls', namespace = 'orders')),
+    path('monitoring/', include('monitoring.api.urls', namespace = 'monitoring')),
+    path('metrics',
+        metrics_view,
+        name='metrics'),
 
     path('docs/',
         include_docs_urls(title='Documentação da API')),
@@ -43,6 +49,7 @@ urlpatterns = [
         name='openapi-schema'),
 ]
 
-# Serve media files during development
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# Serve media files with caching headers and byte ranges (see WeShop/media.py)
+urlpatterns += [
+    re_path(r'^%s(?P<path>.*)$' % settings.MEDIA_URL.lstrip('/'), serve_media, name = 'media'),
+]
@@ -0,0 +1,247 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
+from rest_framework.authtoken.models import Token
+
+from monitoring.metrics import count_cache
+
+DEFAULTS = {
+    'TIMEOUT': 300,        # seconds a token resolved by the shared BACKEND is trusted
+    'LOCAL_TIMEOUT': 10,   # same for the in-process cache, which other workers cannot invalidate
+    'MAX_ENTRIES': 1024,   # bound of the in-process cache
+    'BACKEND': None,       # CACHES alias shared between worker processes
+    'KEY_PREFIX': 'authtoken',
+}
+
+
+def get_config():
+    config = DEFAULTS.copy()
+    config.update(getattr(settings, 'TOKEN_AUTH_CACHE', {}))
+    return config
+
+
+class TokenCache:
+    """
+    Bounded, TTL-based LRU cache mapping token keys to resolved Token objects.
+    The timeout (LOCAL_TIMEOUT) and size come from TOKEN_AUTH_CACHE unless given.
+
+    The cache lives in one process: logouts, password changes and deactivations
+    handled by other workers only reach it once the entry expires, so it suits
+    a single worker. Several workers should share a cache through BACKEND.
+    """
+
+    def __init__(self, timeout=None, max_entries=None):
+        self._timeout = timeout
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def timeout(self):
+        return get_config()['LOCAL_TIMEOUT'] if self._timeout is None else self._timeout
+
+    @property
+    def max_entries(self):
+        return get_config()['MAX_ENTRIES'] if self._max_entries is None else self._max_entries
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, token = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return token
+
+    def set(self, key, token):
+        timeout, max_entries = self.timeout, self.max_entries
+        with self._lock:
+            self._entries[key] = (time.monotonic() + timeout, token)
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_user(self, user_id):
+        with self._lock:
+            stale = [key for key, (_, token) in self._entries.items() if token.user_id == user_id]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache()
+
+
+def _shared_cache():
+    alias = get_config()['BACKEND']
+    return caches[alias] if alias else None
+
+
+def _shared_key(key):
+    return f"{get_config()['KEY_PREFIX']}:{key}"
+
+
+def get_cached_token(key):
+    """
+    Return the cached Token (with its user) for ``key`` or None.
+    """
+    shared = _shared_cache()
+    if shared is not None:
+        return shared.get(_shared_key(key))
+    return token_cache.get(key)
+
+
+async def aget_cached_token(key):
+    """
+    Async version of get_cached_token, for async views.
+    """
+    shared = _shared_cache()
+    if shared is not None:
+        return await shared.aget(_shared_key(key))
+    return token_cache.get(key)
+
+
+def cache_token(token):
+    shared = _shared_cache()
+    if shared is not None:
+        shared.set(_shared_key(token.key), token, get_config()['TIMEOUT'])
+    else:
+        token_cache.set(token.key, token)
+
+
+async def acache_token(token):
+    shared = _shared_cache()
+    if shared is not None:
+        await shared.aset(_shared_key(token.key), token, get_config()['TIMEOUT'])
+    else:
+        token_cache.set(token.key, token)
+
+
+def invalidate_token(key):
+    """
+    Drop a token from the cache. Must be called whenever a token is deleted or rotated.
+    """
+    shared = _shared_cache()
+    if shared is not None:
+        shared.delete(_shared_key(key))
+    token_cache.delete(key)
+
+
+def clear_token_cache():
+    """
+    Forget every token cached by this process.
+    """
+    token_cache.clear()
+
+
+def invalidate_user(user_id):
+    """
+    Drop every cached token belonging to a user, e.g. after the user is saved.
+    """
+    shared = _shared_cache()
+    if shared is not None:
+        keys = Token.objects.filter(user_id=user_id).values_list('key', flat=True)
+        shared.delete_many([_shared_key(key) for key in keys])
+    token_cache.delete_user(user_id)
+
+
+def reload_token(request):
+    """
+    Read the request's token and user again from the database, bypassing the cache.
+
+    Views that write to the user call it so a cached copy, possibly stale when
+    another worker changed the user, is never saved back over newer data.
+    Raises AuthenticationFailed when the token was deleted or the user
+    deactivated since the token was cached.
+    """
+    try:
+        token = Token.objects.select_related('user').get(key=request.auth.key)
+    except Token.DoesNotExist:
+        raise exceptions.AuthenticationFailed(_('Invalid token.'))
+    if not token.user.is_active:
+        raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+    return token
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that resolves token and user with a single joined
+    query and serves repeated lookups from the token cache.
+
+    Accepts the same "Authorization: Token <key>" header as DRF's
+    TokenAuthentication. When TOKEN_AUTH_CACHE['BACKEND'] names a shared cache
+    the in-process cache is bypassed, so invalidations reach every worker;
+    without it tokens are only cached for LOCAL_TIMEOUT seconds.
+    """
+
+    def authenticate_credentials(self, key):
+        token = get_cached_token(key)
+        count_cache('token', token is not None, token is None)
+        if token is None:
+            model = self.get_model()
+            try:
+                token = model.objects.select_related('user').get(key=key)
+            except model.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            cache_token(token)
+        return _resolved(token)
+
+
+def _resolved(token):
+    # Hand out copies so views mutating request.user never touch the cached instance
+    token = copy.copy(token)
+    user = copy.copy(token.user)
+    token.user = user
+
+    if not user.is_active:
+        raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+    return (user, token)
+
+
+async def aauthenticate(request):
+    """
+    Async counterpart of CachedTokenAuthentication.authenticate for async views.
+
+    Reads the same "Authorization: Token <key>" header and shares the token
+    cache. Returns ``(user, token)``, or None when no token was sent.
+    """
+    auth = get_authorization_header(request).split()
+    if not auth or auth[0].lower() != b'token':
+        return None
+    if len(auth) == 1:
+        raise exceptions.AuthenticationFailed(_('Invalid token header. No credentials provided.'))
+    if len(auth) > 2:
+        raise exceptions.AuthenticationFailed(_('Invalid token header. Token string should not contain spaces.'))
+    try:
+        key = auth[1].decode()
+    except UnicodeError:
+        raise exceptions.AuthenticationFailed(_('Invalid token header. Token string should not contain invalid characters.'))
+
+    token = await aget_cached_token(key)
+    count_cache('token', token is not None, token is None)
+    if token is None:
+        try:
+            token = await Token.objects.select_related('user').aget(key=key)
+        except Token.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        await acache_token(token)
+    return _resolved(token)
@@ -5,6 +5,8 @@ class ProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = Profile
         fields = ['id', 'user', 'date_of_birth']
+        # Set by the view from the request, e.g. on registration
+        read_only_fields = ['user']
         
 
     def to_representation(self, instance):
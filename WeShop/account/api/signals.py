@@ -1,8 +1,13 @@
+from django.conf import settings
 from django.core.mail import EmailMultiAlternatives
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.template.loader import render_to_string
 from django.urls import reverse
 from django_rest_passwordreset.signals import reset_password_token_created
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_token, invalidate_user
 
 @receiver(reset_password_token_created)
 def password_reset_token_created(sender, instance, reset_password_token, **kwargs):
@@ -40,3 +45,20 @@ def password_reset_token_created(sender, instance, reset_password_token, **kwarg
     )
     msg.attach_alternative(email_html_message, "text/html")
     msg.send()
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """
+    Evict deleted tokens (logout, password change, account removal) from the auth cache.
+    """
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_changed(sender, instance, **kwargs):
+    """
+    Cached tokens carry a copy of the user, so drop them whenever the user changes.
+    """
+    invalidate_user(instance.pk)
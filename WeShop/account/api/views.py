@@ -14,6 +14,9 @@ from django.contrib.auth import logout
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
+from WeShop.streaming import serialize_rows, stream_json_array, wants_stream
+from .authentication import reload_token
+
 
 
 class CustomAuthToken(ObtainAuthToken):
@@ -74,17 +77,14 @@ class CustomAuthToken(ObtainAuthToken):
         Parâmetros: o token de acesso
         Retorna: o username ou 'visitante'
         '''
-        try:
-            token = request.META.get('HTTP_AUTHORIZATION').split(' ')[1] # token
-            token_obj = Token.objects.get(key=token)
-            user = token_obj.user
+        user = request.user
+        if user.is_authenticated:
             return Response(
                 {'username': user.username},
                 status=status.HTTP_200_OK)
-        except (Token.DoesNotExist, AttributeError):
-            return Response(
-            {'username': 'visitante'},
-            status=status.HTTP_404_NOT_FOUND)
+        return Response(
+                {'username': 'visitante'},
+                status=status.HTTP_404_NOT_FOUND)
     
     @swagger_auto_schema(
         operation_description='Realiza logout do usuário, apagando o seu token',
@@ -106,17 +106,14 @@ class CustomAuthToken(ObtainAuthToken):
             },
         )
     def delete(self, request):
-        try:
-            token = request.META.get('HTTP_AUTHORIZATION').split(' ')[1]
-            token_obj = Token.objects.get(key=token)
-        except (Token.DoesNotExist, IndexError):
+        token_obj = request.auth
+        if token_obj is None:
             return Response({'msg': 'Token não existe.'}, status=status.HTTP_400_BAD_REQUEST)
-        user = token_obj.user
+        user = request.user
         if user.is_authenticated:
-            request.user = user
             logout(request)
-            token = Token.objects.get(user=user)
-            token.delete()
+            # Deleting the token also evicts it from the authentication cache
+            token_obj.delete()
             return Response({'msg': 'Logout bem-sucedido.'},
                             status=status.HTTP_200_OK)
         else:
@@ -156,28 +153,28 @@ class CustomAuthToken(ObtainAuthToken):
         }
     )
     def put(self, request):
-        token = request.META.get('HTTP_AUTHORIZATION').split(' ')[1] # token
-        token_obj = Token.objects.get(key=token)
-        user = token_obj.user
+        user = request.user
+        if not user.is_authenticated:
+            return Response({'msg': 'Token não existe.'}, status=status.HTTP_400_BAD_REQUEST)
         oldPassword = request.data.get('old_password')
         newPassword = request.data.get('new_password1')
         confirmPassword = request.data.get('new_password2')
         
         if newPassword != confirmPassword:
             return Response({'error': 'New passwords do not match'}, status=status.HTTP_400_BAD_REQUEST)
-        
+
+        # O usuário do cache de autenticação pode estar desatualizado: relê token e usuário do banco
+        token = reload_token(request)
+        user = token.user
+
         # Verificar se a senha atual está correta
         if user.check_password(oldPassword):
         # Alterar a senha e atualizar o token
             user.set_password(newPassword)
-            user.save()
-            # Atualizar token
-            try:
-                token = Token.objects.get(user=user)
-                token.delete()
-                token, _ = Token.objects.get_or_create(user=user)
-            except Token.DoesNotExist:
-                pass
+            user.save(update_fields=['password'])
+            # Atualizar token (a exclusão também remove o token antigo do cache de autenticação)
+            token.delete()
+            token = Token.objects.create(user=user)
             return Response({'token': token.key, "message": "Senha alterada com sucesso."},
                             status=status.HTTP_200_OK)
         else:
@@ -185,8 +182,11 @@ class CustomAuthToken(ObtainAuthToken):
 
 class ProfileView(APIView):
     def get(self, request):
-        queryset = Profile.objects.all()
-        
+        # The serializer adds the username, so load users in the same query
+        queryset = Profile.objects.select_related('user').order_by('id')
+        if wants_stream(request):
+            return stream_json_array(serialize_rows(queryset, ProfileSerializer))
+
         serializer = ProfileSerializer(queryset, many=True)
         return Response(serializer.data)
     
@@ -231,15 +231,9 @@ class UserAPI(APIView):
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
     def get(self, request):
-        try:
-            token = request.META.get('HTTP_AUTHORIZATION').split(' ')[1]
-            token_obj = Token.objects.get(key=token)
-        except (Token.DoesNotExist, IndexError):
+        if request.auth is None:
             return Response({'msg': 'Token não existe.'}, status=status.HTTP_400_BAD_REQUEST)
-        user = token_obj.user
-        if user.is_authenticated:
-            
-            user = token_obj.user
+        user = request.user
 
         if user.is_authenticated:
             # Retrieve the user's profile
@@ -264,21 +258,18 @@ class UserAPI(APIView):
             return Response({'msg': 'Usuário não autenticado.'}, status=status.HTTP_401_UNAUTHORIZED)
         
     def put(self, request):
-        try:
-            # Extract the token from the Authorization header
-            token = request.META.get('HTTP_AUTHORIZATION').split(' ')[1]
-            token_obj = Token.objects.get(key=token)
-        except (Token.DoesNotExist, IndexError):
+        if request.auth is None:
             return Response({'msg': 'Token não existe.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        user = token_obj.user
+        user = request.user
 
         if user.is_authenticated:
-            # Update user fields
+            # The cached user may be stale, so update a fresh copy, saving only the fields edited here
+            user = reload_token(request).user
             user.first_name = request.data.get('first_name', user.first_name)
             user.last_name = request.data.get('last_name', user.last_name)
             user.email = request.data.get('email', user.email)
-            user.save()
+            user.save(update_fields=['first_name', 'last_name', 'email'])
 
             # Update profile fields if provided
             try:
@@ -293,16 +284,14 @@ class UserAPI(APIView):
             return Response({'msg': 'Usuário não autenticado.'}, status=status.HTTP_401_UNAUTHORIZED)
     
     def delete(self, request):
-        try:
-            # Extract the token from the Authorization header
-            token = request.META.get('HTTP_AUTHORIZATION').split(' ')[1]
-            token_obj = Token.objects.get(key=token)
-        except (Token.DoesNotExist, IndexError):
+        if request.auth is None:
             return Response({'msg': 'Token não existe.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        user = token_obj.user
+        user = request.user
 
         if user.is_authenticated:
+            # Refuse tokens deleted or users deactivated in another worker
+            user = reload_token(request).user
             # Delete user and associated profile
             try:
                 Profile.objects.filter(user=user).delete()
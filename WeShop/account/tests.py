@@ -1,3 +1,150 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from account.models import Profile
+from WeShop.testing import QueryCountTestCase, clear_caches
+
+PASSWORD = 'senha-de-teste'
+
+
+def create_users(size):
+    """
+    A user with a token and a profile, among ``size`` other users with profiles.
+    """
+    user = User.objects.create_user('cliente', password=PASSWORD)
+    token = Token.objects.create(user=user)
+    others = User.objects.bulk_create(User(username=f'usuario-{index}') for index in range(size))
+    Profile.objects.bulk_create(Profile(user=other) for other in [user, *others])
+    return {'user': user, 'token': token}
+
+
+class AccountQueryCountTests(QueryCountTestCase):
+
+    def test_whoami(self):
+        self.assertQueryCount(
+            1, create_users, lambda fixture: self.client_for(fixture['token']).get('/account/token-auth/'), status=200,
+        )
+
+    def test_profile(self):
+        self.assertQueryCount(
+            3, create_users, lambda fixture: self.client_for(fixture['token']).get('/account/profile/'), status=200,
+        )
+
+    def test_login(self):
+        def request(fixture):
+            return APIClient().post('/account/token-auth/', {'username': 'cliente', 'password': PASSWORD}, format='json')
+
+        self.assertQueryCount(11, create_users, request, status=200)
+
+    def test_register(self):
+        def request(fixture):
+            response = APIClient().post('/account/profile/', {
+                'username': 'nova', 'password': PASSWORD, 'email': 'nova@example.com', 'date_of_birth': '2000-01-31',
+            }, format='json')
+            self.assertTrue(Profile.objects.filter(user__username='nova', date_of_birth='2000-01-31').exists())
+            return response
+
+        # The user and the profile; the check above is the third query
+        self.assertQueryCount(3, create_users, request, status=201)
+
+    def test_update(self):
+        def request(fixture):
+            return self.client_for(fixture['token']).put('/account/profile/', {
+                'first_name': 'Ana', 'date_of_birth': '2000-01-31',
+            }, format='json')
+
+        self.assertQueryCount(5, create_users, request, status=200)
+
+    def test_delete(self):
+        self.assertQueryCount(
+            14, create_users, lambda fixture: self.client_for(fixture['token']).delete('/account/profile/'), status=200,
+        )
+
+    def test_logout(self):
+        self.assertQueryCount(
+            2, create_users, lambda fixture: self.client_for(fixture['token']).delete('/account/token-auth/'), status=200,
+        )
+
+    def test_change_password(self):
+        def request(fixture):
+            return self.client_for(fixture['token']).put('/account/token-auth/', {
+                'old_password': PASSWORD, 'new_password1': 'nova-senha-1', 'new_password2': 'nova-senha-1',
+            }, format='json')
+
+        self.assertQueryCount(5, create_users, request, status=200)
+
+
+class TokenCacheTests(QueryCountTestCase):
+
+    def setUp(self):
+        clear_caches()
+        self.addCleanup(clear_caches)
+        self.fixture = create_users(0)
+        self.client = self.client_for(self.fixture['token'])
+
+    def whoami(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/account/token-auth/')
+        return response, len(queries)
+
+    def test_repeated_requests_use_the_cache(self):
+        self.assertEqual(self.whoami()[1], 1)
+        response, queries = self.whoami()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, 0)
+
+    @override_settings(TOKEN_AUTH_CACHE={'LOCAL_TIMEOUT': 0})
+    def test_timeout_setting(self):
+        self.whoami()
+        self.assertEqual(self.whoami()[1], 1)
+
+    def test_deleted_token_is_rejected(self):
+        self.whoami()
+        self.fixture['token'].delete()
+        self.assertEqual(self.whoami()[0].status_code, 401)
+
+    def test_deactivated_user_is_rejected(self):
+        self.whoami()
+        user = self.fixture['user']
+        user.is_active = False
+        user.save()
+        self.assertEqual(self.whoami()[0].status_code, 401)
+
+    def test_deleted_user_is_rejected(self):
+        self.whoami()
+        self.fixture['user'].delete()
+        self.assertEqual(self.whoami()[0].status_code, 401)
+
+    @override_settings(TOKEN_AUTH_CACHE={'BACKEND': 'default'})
+    def test_shared_cache_invalidation(self):
+        self.whoami()
+        self.assertEqual(self.whoami()[1], 0)
+        self.fixture['token'].delete()
+        self.assertEqual(self.whoami()[0].status_code, 401)
+
+    def test_writes_reread_the_user(self):
+        # Changes made by another worker skip this process's signals
+        self.whoami()
+        User.objects.filter(pk=self.fixture['user'].pk).update(last_name='Souza')
+
+        response = self.client.put('/account/profile/', {'first_name': 'Ana'}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        user = User.objects.get(pk=self.fixture['user'].pk)
+        self.assertEqual((user.first_name, user.last_name), ('Ana', 'Souza'))
+
+    def test_writes_reject_users_deactivated_elsewhere(self):
+        self.whoami()
+        User.objects.filter(pk=self.fixture['user'].pk).update(is_active=False)
+
+        response = self.client.put('/account/token-auth/', {
+            'old_password': PASSWORD, 'new_password1': 'nova-senha-1', 'new_password2': 'nova-senha-1',
+        }, format='json')
+
+        self.assertEqual(response.status_code, 401)
+        self.assertTrue(User.objects.get(pk=self.fixture['user'].pk).check_password(PASSWORD))
+        self.assertFalse(User.objects.get(pk=self.fixture['user'].pk).is_active)
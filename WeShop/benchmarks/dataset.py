@@ -0,0 +1,196 @@
+"""
+Synthetic dataset for the API benchmarks (see benchmark_api).
+
+Everything is written with bulk inserts, so seeding tens of thousands of
+products takes seconds. The dataset is reproducible: the same sizes and seed
+always produce the same rows.
+"""
+
+import itertools
+import random
+from dataclasses import dataclass, field
+from decimal import Decimal
+from functools import lru_cache
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+
+from rest_framework.authtoken.models import Token
+
+from account.models import Profile
+from cart.models import Cart, CartItem
+from orders.models import Order, OrderItem
+from products.api.cache import bump_catalogue_version
+from products.models import Category, Product
+from products.search import get_search_backend
+
+DEFAULTS = {
+    'categories': 12,
+    'products': 2000,
+    'users': 50,
+    'cart_items': 5,
+    'orders': 5,        # per user
+    'order_items': 4,   # per order
+    'seed': 1407,
+}
+
+# Every benchmark user logs in with this password
+PASSWORD = 'benchmark-password'
+
+WORDS = [
+    'camiseta', 'calça', 'tênis', 'jaqueta', 'vestido', 'boné', 'mochila', 'relógio',
+    'azul', 'preta', 'branca', 'estampada', 'algodão', 'couro', 'esportiva', 'clássica',
+]
+
+
+# Numbers making the names of the throwaway rows unique within a run
+_throwaway_numbers = itertools.count()
+
+
+@lru_cache(maxsize=None)
+def password_hash():
+    # Hashing is slow on purpose; every user shares one hash of PASSWORD
+    return make_password(PASSWORD)
+
+
+def next_throwaway_number():
+    return next(_throwaway_numbers)
+
+
+@dataclass
+class Dataset:
+    """
+    Ids and credentials of the seeded rows, used to build the benchmark requests.
+    """
+    categories: list = field(default_factory=list)   # slugs
+    category_ids: list = field(default_factory=list)
+    products: list = field(default_factory=list)     # (id, slug, owner id)
+    available: list = field(default_factory=list)    # the available products
+    users: list = field(default_factory=list)        # (id, username, token key)
+
+    def products_of(self, user_id):
+        return [product for product in self.products if product[2] == user_id]
+
+
+def seed(categories, products, users, cart_items, orders, order_items, seed=DEFAULTS['seed']):
+    """
+    Fill an empty database with the given number of rows and return a Dataset.
+    """
+    rng = random.Random(seed)
+    dataset = Dataset()
+
+    user_rows = User.objects.bulk_create(
+        User(username=f'user{index}', email=f'user{index}@example.com', password=password_hash())
+        for index in range(users)
+    )
+    Profile.objects.bulk_create(Profile(user=user) for user in user_rows)
+    tokens = Token.objects.bulk_create(Token(key=Token.generate_key(), user=user) for user in user_rows)
+    dataset.users = [(user.id, user.username, token.key) for user, token in zip(user_rows, tokens)]
+
+    category_rows = Category.objects.bulk_create(
+        Category(name=f'Categoria {index}', slug=f'categoria-{index}') for index in range(categories)
+    )
+    dataset.categories = [category.slug for category in category_rows]
+    dataset.category_ids = [category.id for category in category_rows]
+
+    product_rows = []
+    for index in range(products):
+        name = ' '.join(rng.sample(WORDS, 3)).capitalize() + f' {index}'
+        product_rows.append(Product(
+            category=rng.choice(category_rows),
+            user=rng.choice(user_rows),
+            name=name,
+            slug=f'produto-{index}',
+            description=f'{name} com acabamento de qualidade. ' * 4,
+            price=Decimal(rng.randrange(500, 100000)) / 100,
+            available=rng.random() < 0.9,
+        ))
+    product_rows = Product.objects.bulk_create(product_rows, batch_size=500)
+    dataset.products = [(product.id, product.slug, product.user_id) for product in product_rows]
+    available = [product for product in product_rows if product.available]
+    dataset.available = [(product.id, product.slug, product.user_id) for product in available]
+
+    cart_rows = Cart.objects.bulk_create(
+        Cart(user=user, items={
+            str(product.id): rng.randint(1, 3)
+            for product in rng.sample(available, min(cart_items, len(available)))
+        })
+        for user in user_rows
+    )
+    if cart_rows and cart_rows[0].uses_table:
+        CartItem.objects.bulk_create(
+            CartItem(cart=cart, product_id=int(product_id), quantity=quantity)
+            for cart in cart_rows
+            for product_id, quantity in cart.items.items()
+        )
+        Cart.objects.update(items={})
+
+    order_lines = [
+        [(product, rng.randint(1, 3)) for product in rng.sample(available, min(order_items, len(available)))]
+        for _ in range(users * orders)
+    ]
+    order_rows = Order.objects.bulk_create(
+        Order(
+            user=user_rows[index // orders],
+            first_name='Cliente',
+            last_name=user_rows[index // orders].username,
+            email=user_rows[index // orders].email,
+            address='Rua Marquês de São Vicente, 225',
+            postal_code='22451-900',
+            city='Rio de Janeiro',
+            paid=rng.random() < 0.5,
+            total_cost=sum((product.price * quantity for product, quantity in lines), Decimal('0.00')),
+            item_count=sum(quantity for _, quantity in lines),
+        )
+        for index, lines in enumerate(order_lines)
+    )
+    OrderItem.objects.bulk_create(
+        (
+            OrderItem(
+                order=order, product=product, product_name=product.name, product_slug=product.slug,
+                price=product.price, quantity=quantity,
+            )
+            for order, lines in zip(order_rows, order_lines)
+            for product, quantity in lines
+        ),
+        batch_size=500,
+    )
+
+    # Bulk inserts skip the signals keeping the search index and caches current
+    get_search_backend().rebuild()
+    bump_catalogue_version()
+    return dataset
+
+
+def create_throwaway_user():
+    """
+    A user with a profile and a token, for the endpoints that log out, change
+    the password or delete the user. Returns (id, username, token key).
+    """
+    number = next_throwaway_number()
+    user = User.objects.create(
+        username=f'throwaway{number}', email=f'throwaway{number}@example.com', password=password_hash(),
+    )
+    Profile.objects.create(user=user)
+    token = Token.objects.create(user=user)
+    return (user.id, user.username, token.key)
+
+
+def create_throwaway_products(user_id, count):
+    """
+    ``count`` products of the user, for the endpoints that delete products.
+    Returns their (id, slug, owner id).
+    """
+    number = next_throwaway_number()
+    category = Category.objects.order_by('id').first()
+    product_rows = Product.objects.bulk_create(
+        Product(
+            category=category,
+            user_id=user_id,
+            name=f'Produto descartável {number}-{index}',
+            slug=f'descartavel-{number}-{index}',
+            price=Decimal('9.90'),
+        )
+        for index in range(count)
+    )
+    return [(product.id, product.slug, product.user_id) for product in product_rows]
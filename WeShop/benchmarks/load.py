@@ -0,0 +1,380 @@
+"""
+Endpoints exercised by benchmark_api and the in-process load generator.
+
+Each endpoint builds its request from the seeded Dataset. Requests go through
+django.test.Client, so the whole stack (middleware, authentication, views,
+serializers, rendering) is measured without the network. Every worker thread
+has its own client and acts as its own benchmark user, so concurrent writes
+touch different carts and orders. Endpoints that log out, change the password
+or delete rows prepare throwaway users and products (see dataset.py) outside
+the timed request, so the seeded dataset stays the same for the other endpoints.
+
+SQLite allows one writer at a time and fails, instead of waiting, when a read
+transaction turns into a write while another connection writes; endpoints
+that write are therefore sent from a single thread on SQLite.
+"""
+
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from account.api.authentication import clear_token_cache
+from benchmarks.dataset import PASSWORD, create_throwaway_products, create_throwaway_user, next_throwaway_number
+from cart.models import Cart
+
+# Budgets applied to every endpoint unless BENCHMARK_BUDGETS overrides them:
+# queries of one request on cold caches, and 95th percentile latency in ms.
+# Outside a test transaction the BEGIN and COMMIT of a deletion are counted
+# too, so some budgets are above the counts pinned in the apps' tests
+DEFAULT_BUDGET = {'queries': None, 'p95_ms': 250}
+
+BUDGETS = {
+    'products:list': {'queries': 1},
+    'products:list-filtered': {'queries': 1},
+    'products:list-facets': {'queries': 2},
+    'products:list-async': {'queries': 1},
+    'products:categories': {'queries': 1},
+    'products:categories-async': {'queries': 1},
+    'products:detail': {'queries': 1},
+    'products:detail-async': {'queries': 1},
+    'products:search': {'queries': 2},
+    'products:batch-update': {'queries': 7},
+    'products:batch-delete': {'queries': 9},
+    'products:create': {'queries': 6},
+    'products:update': {'queries': 5},
+    'products:delete': {'queries': 8},
+    'cart:get': {'queries': 3},
+    'cart:get-async': {'queries': 3},
+    'cart:put': {'queries': 4},
+    'cart:patch': {'queries': 7},
+    'orders:list': {'queries': 3},
+    'orders:checkout': {'queries': 8},
+    'account:whoami': {'queries': 1},
+    'account:profile': {'queries': 3},
+    # Password hashing dominates the login time by design
+    'account:login': {'queries': 11, 'p95_ms': 2000},
+    'account:register': {'queries': 2, 'p95_ms': 2000},
+    'account:update': {'queries': 5},
+    'account:password': {'queries': 7, 'p95_ms': 2000},
+    'account:logout': {'queries': 4},
+    'account:delete': {'queries': 18},
+}
+
+
+def get_budgets(path=None):
+    """
+    Return the budget of every endpoint: BUDGETS, then settings.BENCHMARK_BUDGETS,
+    then the JSON file at ``path``, each overriding the previous one.
+    """
+    budgets = {label: {**DEFAULT_BUDGET, **BUDGETS.get(label, {})} for label in ENDPOINTS}
+    overrides = [getattr(settings, 'BENCHMARK_BUDGETS', {})]
+    if path:
+        with open(path) as budget_file:
+            overrides.append(json.load(budget_file))
+    for override in overrides:
+        for label, budget in override.items():
+            budgets.setdefault(label, dict(DEFAULT_BUDGET)).update(budget)
+    return budgets
+
+
+@dataclass
+class Endpoint:
+    label: str
+    build: callable            # (dataset, user, index, **prepared) -> (method, path, data)
+    auth: bool = False
+    # (dataset, user, index) -> None or a dict passed on to build, run before
+    # the request and not timed; a 'user' in the dict sends the request as that user
+    prepare: callable = None
+    expected_status: int = 200
+    writes: bool = False
+
+    def request(self, client, dataset, user, index, prepared=None):
+        prepared = dict(prepared or {})
+        user = prepared.pop('user', user)
+        method, path, data = self.build(dataset, user, index, **prepared)
+        headers = {'HTTP_AUTHORIZATION': f'Token {user[2]}'} if self.auth else {}
+        if method == 'get':
+            return client.get(path, data, **headers)
+        return getattr(client, method)(path, data, content_type='application/json', **headers)
+
+
+ENDPOINTS = {}
+
+
+def endpoint(label, **options):
+    def register(build):
+        ENDPOINTS[label] = Endpoint(label, build, **options)
+        return build
+    return register
+
+
+def _available_product(dataset, index):
+    return dataset.available[index * 7919 % len(dataset.available)]
+
+
+def _cart_items(dataset, index):
+    return {str(_available_product(dataset, index + offset)[0]): offset + 1 for offset in range(3)}
+
+
+@endpoint('products:list')
+def product_list(dataset, user, index):
+    return 'get', reverse('products:list-products'), None
+
+
+@endpoint('products:list-filtered')
+def product_list_filtered(dataset, user, index):
+    category = dataset.categories[index % len(dataset.categories)]
+    return 'get', reverse('products:list-products'), {'category_slug': category, 'min_price': 50, 'ordering': 'price'}
+
+
+@endpoint('products:list-facets')
+def product_list_facets(dataset, user, index):
+    return 'get', reverse('products:list-products'), {'facets': 'true'}
+
+
+@endpoint('products:list-async')
+def product_list_async(dataset, user, index):
+    return 'get', reverse('products:async-list-products'), None
+
+
+@endpoint('products:categories')
+def categories(dataset, user, index):
+    return 'get', reverse('products:categories'), None
+
+
+@endpoint('products:categories-async')
+def categories_async(dataset, user, index):
+    return 'get', reverse('products:async-categories'), None
+
+
+@endpoint('products:detail')
+def product_detail(dataset, user, index):
+    product_id, slug, _ = _available_product(dataset, index)
+    return 'get', reverse('products:api-products'), {'id': product_id, 'slug': slug}
+
+
+@endpoint('products:detail-async')
+def product_detail_async(dataset, user, index):
+    product_id, slug, _ = _available_product(dataset, index)
+    return 'get', reverse('products:async-api-products'), {'id': product_id, 'slug': slug}
+
+
+@endpoint('products:search')
+def product_search(dataset, user, index):
+    return 'get', reverse('products:search-products'), {'q': ['camiseta', 'azul', 'couro', 'tênis'][index % 4]}
+
+
+@endpoint('products:batch-update', auth=True, writes=True)
+def product_batch_update(dataset, user, index):
+    products = dataset.products_of(user[0])[:5]
+    return 'post', reverse('products:batch-products'), {
+        'update': [
+            {'id': product_id, 'slug': slug, 'price': f'{10 + index % 90}.90'}
+            for product_id, slug, _ in products
+        ],
+    }
+
+
+def _throwaway_products(count):
+    def prepare(dataset, user, index):
+        return {'products': create_throwaway_products(user[0], count)}
+    return prepare
+
+
+def _throwaway_user(dataset, user, index):
+    return {'user': create_throwaway_user()}
+
+
+@endpoint('products:batch-delete', auth=True, prepare=_throwaway_products(5), writes=True)
+def product_batch_delete(dataset, user, index, products):
+    return 'post', reverse('products:batch-products'), {
+        'delete': [{'id': product_id, 'slug': slug} for product_id, slug, _ in products],
+    }
+
+
+@endpoint('products:create', auth=True, expected_status=201, writes=True)
+def product_create(dataset, user, index):
+    return 'post', reverse('products:api-products'), {
+        'name': f'Produto novo {next_throwaway_number()}',
+        'price': f'{10 + index % 90}.90',
+        'category': dataset.category_ids[index % len(dataset.category_ids)],
+    }
+
+
+def _own_product(dataset, user, index):
+    products = dataset.products_of(user[0]) or create_throwaway_products(user[0], 1)
+    return {'product': products[index % len(products)]}
+
+
+@endpoint('products:update', auth=True, prepare=_own_product, writes=True)
+def product_update(dataset, user, index, product):
+    product_id, slug, _ = product
+    return 'put', reverse('products:api-products'), {'id': product_id, 'slug': slug, 'price': f'{10 + index % 90}.90'}
+
+
+@endpoint('products:delete', auth=True, prepare=_throwaway_products(1), expected_status=204, writes=True)
+def product_delete(dataset, user, index, products):
+    product_id, slug, _ = products[0]
+    return 'delete', reverse('products:api-products'), {'id': product_id, 'slug': slug}
+
+
+@endpoint('cart:get', auth=True)
+def cart_get(dataset, user, index):
+    return 'get', reverse('cart:cart-api'), None
+
+
+@endpoint('cart:get-async', auth=True)
+def cart_get_async(dataset, user, index):
+    return 'get', reverse('cart:async-cart-api'), None
+
+
+@endpoint('cart:put', auth=True, writes=True)
+def cart_put(dataset, user, index):
+    return 'put', reverse('cart:cart-api'), {'items': _cart_items(dataset, index)}
+
+
+@endpoint('cart:patch', auth=True, writes=True)
+def cart_patch(dataset, user, index):
+    product_id = _available_product(dataset, index)[0]
+    return 'patch', reverse('cart:cart-api'), {'operations': [{'op': 'add', 'product_id': product_id, 'quantity': 1}]}
+
+
+@endpoint('orders:list', auth=True)
+def order_list(dataset, user, index):
+    return 'get', reverse('orders:api-orders'), None
+
+
+def _fill_cart(dataset, user, index):
+    Cart.objects.get(user_id=user[0]).set_items(_cart_items(dataset, index))
+
+
+@endpoint('orders:checkout', auth=True, prepare=_fill_cart, expected_status=201, writes=True)
+def order_checkout(dataset, user, index):
+    return 'post', reverse('orders:api-orders'), {'order_data': {
+        'first_name': 'Cliente',
+        'last_name': user[1],
+        'email': f'{user[1]}@example.com',
+        'address': 'Rua Marquês de São Vicente, 225',
+        'postal_code': '22451-900',
+        'city': 'Rio de Janeiro',
+    }}
+
+
+@endpoint('account:whoami', auth=True)
+def account_whoami(dataset, user, index):
+    return 'get', reverse('account:token-auth'), None
+
+
+@endpoint('account:profile', auth=True)
+def account_profile(dataset, user, index):
+    return 'get', reverse('account:register-account'), None
+
+
+@endpoint('account:login', writes=True)  # updates last_login and the session
+def account_login(dataset, user, index):
+    return 'post', reverse('account:token-auth'), {'username': user[1], 'password': PASSWORD}
+
+
+@endpoint('account:register', expected_status=201, writes=True)
+def account_register(dataset, user, index):
+    username = f'cadastro{next_throwaway_number()}'
+    return 'post', reverse('account:register-account'), {
+        'username': username, 'password': PASSWORD, 'email': f'{username}@example.com', 'date_of_birth': '2000-01-31',
+    }
+
+
+@endpoint('account:update', auth=True, writes=True)
+def account_update(dataset, user, index):
+    return 'put', reverse('account:register-account'), {'first_name': 'Cliente', 'last_name': f'Número {index}'}
+
+
+@endpoint('account:password', auth=True, prepare=_throwaway_user, writes=True)
+def account_password(dataset, user, index):
+    return 'put', reverse('account:token-auth'), {
+        'old_password': PASSWORD, 'new_password1': 'outra-senha-1', 'new_password2': 'outra-senha-1',
+    }
+
+
+@endpoint('account:logout', auth=True, prepare=_throwaway_user, writes=True)
+def account_logout(dataset, user, index):
+    return 'delete', reverse('account:token-auth'), None
+
+
+@endpoint('account:delete', auth=True, prepare=_throwaway_user, writes=True)
+def account_delete(dataset, user, index):
+    return 'delete', reverse('account:register-account'), None
+
+
+def clear_caches():
+    for alias in settings.CACHES:
+        caches[alias].clear()
+    clear_token_cache()
+
+
+def count_queries(endpoint, dataset):
+    """
+    Queries made by one request on cold caches, and the response status.
+    """
+    client = Client()
+    user = dataset.users[0]
+    prepared = endpoint.prepare(dataset, user, 0) if endpoint.prepare is not None else None
+    clear_caches()
+    with CaptureQueriesContext(connection) as queries:
+        response = endpoint.request(client, dataset, user, 0, prepared)
+    return len(queries), response.status_code
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        raise ValueError('percentile() needs at least one value.')
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    return statistics.quantiles(sorted_values, n=100, method='inclusive')[round(fraction * 100) - 1]
+
+
+def run_load(endpoint, dataset, requests, concurrency):
+    """
+    Send ``requests`` requests from ``concurrency`` threads and return the
+    latencies in seconds, the statuses of unexpected responses and the wall time.
+    """
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker(worker_index):
+        client = Client()
+        user = dataset.users[worker_index % len(dataset.users)]
+        try:
+            while True:
+                with lock:
+                    index = next(counter, None)
+                if index is None:
+                    return
+                prepared = endpoint.prepare(dataset, user, index) if endpoint.prepare is not None else None
+                start = time.perf_counter()
+                response = endpoint.request(client, dataset, user, index, prepared)
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                    if response.status_code != endpoint.expected_status:
+                        errors.append(response.status_code)
+        finally:
+            # Threads open their own database connections
+            connections.close_all()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(worker, worker_index) for worker_index in range(concurrency)]:
+            future.result()
+    return latencies, errors, time.perf_counter() - start
@@ -0,0 +1,126 @@
+import json
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+from benchmarks import dataset, load
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a synthetic dataset in a test database and benchmark the API: '
+        'query counts, latency percentiles and throughput per endpoint. Fails '
+        'when an endpoint exceeds its budget (see benchmarks/load.py).'
+    )
+
+    def add_arguments(self, parser):
+        sizes = parser.add_argument_group('dataset')
+        sizes.add_argument('--categories', type=int, default=dataset.DEFAULTS['categories'])
+        sizes.add_argument('--products', type=int, default=dataset.DEFAULTS['products'])
+        sizes.add_argument('--users', type=int, default=dataset.DEFAULTS['users'])
+        sizes.add_argument('--cart-items', type=int, default=dataset.DEFAULTS['cart_items'], help='Products in each cart.')
+        sizes.add_argument('--orders', type=int, default=dataset.DEFAULTS['orders'], help='Orders of each user.')
+        sizes.add_argument('--order-items', type=int, default=dataset.DEFAULTS['order_items'], help='Lines of each order.')
+        sizes.add_argument('--seed', type=int, default=dataset.DEFAULTS['seed'])
+
+        parser.add_argument('--requests', type=int, default=200, help='Requests sent to each endpoint.')
+        parser.add_argument('--concurrency', type=int, default=4, help='Threads sending requests at the same time.')
+        parser.add_argument(
+            '--endpoint', action='append', default=[],
+            help='Only benchmark endpoints whose label starts with this prefix, e.g. "cart" or "products:list". Repeatable.',
+        )
+        parser.add_argument('--budgets', help='JSON file of {"label": {"queries": n, "p95_ms": n}} overriding the budgets.')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+
+    def handle(self, *args, **options):
+        endpoints = [
+            endpoint for label, endpoint in load.ENDPOINTS.items()
+            if not options['endpoint'] or label.startswith(tuple(options['endpoint']))
+        ]
+        if not endpoints:
+            raise CommandError('No endpoint matches --endpoint.')
+        if options['users'] < 1 or options['products'] < 1 or options['categories'] < 1:
+            raise CommandError('The dataset needs at least one user, category and product.')
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests and --concurrency must be at least 1.')
+        budgets = load.get_budgets(options['budgets'])
+
+        with tempfile.TemporaryDirectory() as directory:
+            # Worker threads need a file database: an in-memory SQLite test
+            # database locks whole tables between connections
+            if connection.vendor == 'sqlite':
+                connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'benchmark.sqlite3')
+            setup_test_environment(debug=False)
+            old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+            if connection.vendor == 'sqlite':
+                # Let the worker threads read while another one writes; the
+                # mode is stored in this temporary file only
+                with connection.cursor() as cursor:
+                    cursor.execute('PRAGMA journal_mode = WAL')
+            try:
+                self.stdout.write('Seeding the dataset...')
+                data = dataset.seed(
+                    options['categories'], options['products'], options['users'],
+                    options['cart_items'], options['orders'], options['order_items'], options['seed'],
+                )
+                results = [self.benchmark(endpoint, data, options) for endpoint in endpoints]
+            finally:
+                teardown_databases(old_config, verbosity=0)
+                teardown_test_environment()
+
+        self.report(results)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+
+        failures = self.check_budgets(results, budgets)
+        if failures:
+            raise CommandError('Budgets exceeded:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('Every endpoint is within its budget.'))
+
+    def benchmark(self, endpoint, data, options):
+        queries, status = load.count_queries(endpoint, data)
+        concurrency = options['concurrency']
+        if endpoint.writes and connection.vendor == 'sqlite':
+            concurrency = 1
+        latencies, errors, elapsed = load.run_load(endpoint, data, options['requests'], concurrency)
+        latencies.sort()
+        return {
+            'endpoint': endpoint.label,
+            'status': status,
+            'queries': queries,
+            'requests': len(latencies),
+            'concurrency': concurrency,
+            'errors': len(errors) + (status != endpoint.expected_status),
+            'p50_ms': load.percentile(latencies, 0.50) * 1000,
+            'p95_ms': load.percentile(latencies, 0.95) * 1000,
+            'p99_ms': load.percentile(latencies, 0.99) * 1000,
+            'throughput': len(latencies) / elapsed,
+        }
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"endpoint":<28} {"status":>6} {"queries":>7} {"p50":>9} {"p95":>9} {"p99":>9} {"req/s":>8} {"threads":>7} {"errors":>6}'
+        )
+        for result in results:
+            self.stdout.write(
+                f'{result["endpoint"]:<28} {result["status"]:>6} {result["queries"]:>7} '
+                f'{result["p50_ms"]:>7.2f}ms {result["p95_ms"]:>7.2f}ms {result["p99_ms"]:>7.2f}ms '
+                f'{result["throughput"]:>8.1f} {result["concurrency"]:>7} {result["errors"]:>6}'
+            )
+
+    def check_budgets(self, results, budgets):
+        failures = []
+        for result in results:
+            label = result['endpoint']
+            budget = budgets.get(label, load.DEFAULT_BUDGET)
+            if result['errors']:
+                failures.append(f'{label}: {result["errors"]} unexpected responses')
+            if budget.get('queries') is not None and result['queries'] > budget['queries']:
+                failures.append(f'{label}: {result["queries"]} queries, budget {budget["queries"]}')
+            if budget.get('p95_ms') is not None and result['p95_ms'] > budget['p95_ms']:
+                failures.append(f'{label}: p95 {result["p95_ms"]:.2f}ms, budget {budget["p95_ms"]}ms')
+        return failures
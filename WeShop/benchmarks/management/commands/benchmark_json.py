@@ -0,0 +1,119 @@
+import timeit
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from products.api.serializer import ProductListSerializer
+from products.models import Product
+from WeShop import renderers
+
+
+def product_payload(count):
+    """
+    A product listing page, as rendered by ProductsListAPI.
+    """
+    now = timezone.now()
+    products = [
+        Product(
+            id=index,
+            category_id=index % 12 + 1,
+            user_id=index % 40 + 1,
+            name=f'Camiseta estampada modelo {index}',
+            slug=f'camiseta-estampada-modelo-{index}',
+            description='Camiseta de algodão com estampa exclusiva, disponível em vários tamanhos. ' * 3,
+            price=Decimal(index % 500) + Decimal('0.90'),
+            available=index % 7 != 0,
+            created=now - timedelta(minutes=index),
+            updated=now - timedelta(seconds=index),
+        )
+        for index in range(1, count + 1)
+    ]
+    return {
+        'next': 'http://testserver/products/list/?cursor=cD1DYW1pc2V0YQ%3D%3D',
+        'previous': None,
+        'results': ProductListSerializer(products, many=True).data,
+    }
+
+
+def order_payload(count):
+    """
+    An order history page, as rendered by OrdersAPI.get: raw Decimals and datetimes.
+    """
+    now = timezone.now()
+    orders = {}
+    for order_id in range(1, count + 1):
+        items = [
+            {
+                'product_id': order_id * 10 + line,
+                'product_name': f'Produto {order_id * 10 + line}',
+                'price': Decimal(line * 13) + Decimal('0.99'),
+                'quantity': line,
+            }
+            for line in range(1, 6)
+        ]
+        orders[order_id] = [{
+            'total_cost': sum(item['price'] * item['quantity'] for item in items),
+            'address': 'Rua Marquês de São Vicente, 225',
+            'postal_code': '22451-900',
+            'city': 'Rio de Janeiro',
+            'paid': order_id % 2 == 0,
+            'created_at': now - timedelta(hours=order_id),
+            'updated_at': now - timedelta(hours=order_id, minutes=-5),
+            'items': items,
+        }]
+    return {'next': None, 'previous': None, 'results': orders}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare DRF's JSON renderer and parser with WeShop.renderers on "
+        'product and order payloads.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100, help='Products in the product payload.')
+        parser.add_argument('--orders', type=int, default=100, help='Orders in the order payload.')
+        parser.add_argument('--number', type=int, default=50, help='Runs per measurement.')
+        parser.add_argument('--repeat', type=int, default=5, help='Measurements, the best one is reported.')
+
+    def handle(self, *args, **options):
+        if renderers.orjson is None:
+            self.stdout.write(self.style.WARNING('orjson is not installed, the fast path falls back to the json module.'))
+
+        payloads = {
+            f'products ({options["products"]})': product_payload(options['products']),
+            f'orders ({options["orders"]})': order_payload(options['orders']),
+        }
+        stdlib_renderer, fast_renderer = JSONRenderer(), renderers.FastJSONRenderer()
+        stdlib_parser, fast_parser = JSONParser(), renderers.FastJSONParser()
+
+        self.stdout.write(f'{"payload":<18} {"operation":<8} {"size":>9} {"stdlib":>10} {"fast":>10} {"speedup":>8}')
+        for name, data in payloads.items():
+            body = stdlib_renderer.render(data)
+            if fast_renderer.render(data) != body:
+                self.stderr.write(self.style.ERROR(f'{name}: the renderers produce different output.'))
+
+            measurements = {
+                'render': (lambda: stdlib_renderer.render(data), lambda: fast_renderer.render(data)),
+                'parse': (lambda: stdlib_parser.parse(BytesIO(body)), lambda: fast_parser.parse(BytesIO(body))),
+            }
+            for operation, (stdlib, fast) in measurements.items():
+                stdlib_time = self.measure(stdlib, options)
+                fast_time = self.measure(fast, options)
+                self.stdout.write(
+                    f'{name:<18} {operation:<8} {len(body):>9} {stdlib_time * 1000:>8.3f}ms '
+                    f'{fast_time * 1000:>8.3f}ms {stdlib_time / fast_time:>7.1f}x'
+                )
+
+    def measure(self, function, options):
+        """
+        Best time of one call, in seconds.
+        """
+        runs = timeit.repeat(function, number=options['number'], repeat=options['repeat'])
+        return min(runs) / options['number']
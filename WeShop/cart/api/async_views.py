@@ -0,0 +1,20 @@
+from cart.models import Cart
+from .views import cart_data
+from WeShop.async_views import AsyncAPIView
+from WeShop.responses import JSONResponse
+
+from rest_framework import status
+
+class AsyncCartAPI(AsyncAPIView):
+    """
+    Async version of CartAPI.get. Updates stay on the sync CartAPI.
+    """
+
+    async def get(self, request):
+        user = await self.authenticate(request)
+        if user is None:
+            return JSONResponse({'error': 'Invalid or missing token.'}, status=status.HTTP_401_UNAUTHORIZED)
+
+        cart, created = await Cart.objects.aget_or_create(user=user)
+        items = await cart.aget_items()
+        return JSONResponse(cart_data(user, cart, items, await cart.aget_total_price()), status=status.HTTP_200_OK)
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import views, async_views
 
 app_name = 'cart'
 
@@ -8,4 +8,9 @@ urlpatterns = [
     path('api/',
          views.CartAPI.as_view(),
          name = 'cart-api'),
+
+    # Async version of the cart read, for ASGI deployments
+    path('async/api/',
+         async_views.AsyncCartAPI.as_view(),
+         name = 'async-cart-api'),
 ]
\ No newline at end of file
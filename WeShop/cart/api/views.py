@@ -1,11 +1,13 @@
 from cart.models import Cart
+from products.models import Product
+from .serializer import CartPatchSerializer
 
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.authtoken.models import Token
 
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
@@ -42,6 +44,15 @@ class CartAPI(APIView):
                             type=openapi.TYPE_STRING,
                             format=openapi.FORMAT_DATETIME,
                             description="Timestamp when the cart was last updated"
+                        ),
+                        "total_items": openapi.Schema(
+                            type=openapi.TYPE_INTEGER,
+                            description="Total quantity of products in the cart"
+                        ),
+                        "total_price": openapi.Schema(
+                            type=openapi.TYPE_NUMBER,
+                            format=openapi.FORMAT_FLOAT,
+                            description="Total price of the cart"
                         )
                     }
                 )
@@ -51,12 +62,8 @@ class CartAPI(APIView):
         }
     )
     def get(self, request):
-        try:
-            # Extract the token from the Authorization header
-            token = request.META.get('HTTP_AUTHORIZATION').split(' ')[1]
-            token_obj = Token.objects.get(key=token)
-            user = token_obj.user
-        except (Token.DoesNotExist, IndexError):
+        user = request.user
+        if not user.is_authenticated:
             return Response({'error': 'Invalid or missing token.'}, status=status.HTTP_401_UNAUTHORIZED)
 
         # Fetch or create a cart for the user
@@ -64,15 +71,7 @@ class CartAPI(APIView):
         if created:
             cart.save()  # Save the newly created cart
 
-        # Prepare the cart data for response
-        cart_data = {
-            "user": user.username,
-            "items": cart.items,  # The dictionary of product IDs and quantities
-            "created_at": cart.created_at,
-            "updated_at": cart.updated_at
-        }
-
-        return Response(cart_data, status=status.HTTP_200_OK)
+        return Response(cart_data(user, cart, cart.get_items(), cart.get_total_price()), status=status.HTTP_200_OK)
     
 
     @swagger_auto_schema(
@@ -119,12 +118,21 @@ class CartAPI(APIView):
                             type=openapi.TYPE_STRING,
                             format=openapi.FORMAT_DATETIME,
                             description="Timestamp when the cart was last updated"
+                        ),
+                        "total_items": openapi.Schema(
+                            type=openapi.TYPE_INTEGER,
+                            description="Total quantity of products in the cart"
+                        ),
+                        "total_price": openapi.Schema(
+                            type=openapi.TYPE_NUMBER,
+                            format=openapi.FORMAT_FLOAT,
+                            description="Total price of the cart"
                         )
                     }
                 )
             ),
             400: openapi.Response(
-                description="Invalid items format",
+                description="Invalid items format, product ID or quantity",
                 examples={
                     "application/json": {
                         "error": "Invalid items format. Expected a dictionary of product IDs and quantities."
@@ -138,12 +146,8 @@ class CartAPI(APIView):
     )
     def put(self, request):
 
-        try:
-            # Extract the token from the Authorization header
-            token = request.META.get('HTTP_AUTHORIZATION').split(' ')[1]
-            token_obj = Token.objects.get(key=token)
-            user = token_obj.user
-        except (Token.DoesNotExist, IndexError):
+        user = request.user
+        if not user.is_authenticated:
             return Response({'error': 'Invalid or missing token.'}, status=status.HTTP_401_UNAUTHORIZED)
 
         # Fetch or create a cart for the user
@@ -156,18 +160,134 @@ class CartAPI(APIView):
                 return Response({'error': 'Invalid items format. Expected a dictionary of product IDs and quantities.'}, status=status.HTTP_400_BAD_REQUEST)
 
             # Update the cart's items
-            cart.items = items
-            cart.save()
-
-            # Prepare the response data
-            cart_data = {
-                "user": user.username,
-                "items": cart.items,  # Updated items dictionary
-                "created_at": cart.created_at,
-                "updated_at": cart.updated_at
-            }
+            try:
+                cart.set_items(items)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-            return Response(cart_data, status=status.HTTP_200_OK)
+            return Response(cart_data(user, cart, cart.get_items(), cart.get_total_price()), status=status.HTTP_200_OK)
 
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    @swagger_auto_schema(
+        operation_summary="Apply changes to the user's cart",
+        operation_description="Applies a list of `add`, `set` and `remove` operations to the authenticated user's cart in a single transaction. Only the lines that changed are returned, together with the new totals.",
+        request_body=CartPatchSerializer,
+        responses={
+            200: openapi.Response(
+                description="Cart updated successfully",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        "user": openapi.Schema(
+                            type=openapi.TYPE_STRING,
+                            description="Username of the cart owner"
+                        ),
+                        "changed": openapi.Schema(
+                            type=openapi.TYPE_ARRAY,
+                            items=openapi.Schema(
+                                type=openapi.TYPE_OBJECT,
+                                properties={
+                                    "product_id": openapi.Schema(
+                                        type=openapi.TYPE_INTEGER,
+                                        description="ID of the product"
+                                    ),
+                                    "quantity": openapi.Schema(
+                                        type=openapi.TYPE_INTEGER,
+                                        description="New quantity of the product, 0 if it was removed"
+                                    )
+                                }
+                            ),
+                            description="Cart lines touched by the operations"
+                        ),
+                        "updated_at": openapi.Schema(
+                            type=openapi.TYPE_STRING,
+                            format=openapi.FORMAT_DATETIME,
+                            description="Timestamp when the cart was last updated"
+                        ),
+                        "total_items": openapi.Schema(
+                            type=openapi.TYPE_INTEGER,
+                            description="Total quantity of products in the cart"
+                        ),
+                        "total_price": openapi.Schema(
+                            type=openapi.TYPE_NUMBER,
+                            format=openapi.FORMAT_FLOAT,
+                            description="Total price of the cart"
+                        )
+                    }
+                )
+            ),
+            400: openapi.Response(
+                description="Invalid operations or unknown products",
+                examples={
+                    "application/json": {
+                        "error": "Some products do not exist or are not available.",
+                        "product_ids": [42]
+                    }
+                }
+            ),
+            401: openapi.Response(description="Invalid or missing token")
+        }
+    )
+    def patch(self, request):
+        user = request.user
+        if not user.is_authenticated:
+            return Response({'error': 'Invalid or missing token.'}, status=status.HTTP_401_UNAUTHORIZED)
+
+        serializer = CartPatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        operations = serializer.validated_data['operations']
+
+        # Validate every product that is added or set with a single query.
+        # Removals are allowed for any id so carts can drop deleted products.
+        product_ids = {operation['product_id'] for operation in operations if operation['op'] != 'remove'}
+        products = Product.objects.filter(available=True).only('id').in_bulk(product_ids)
+        missing = sorted(product_ids - products.keys())
+        if missing:
+            return Response(
+                {'error': 'Some products do not exist or are not available.', 'product_ids': missing},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        with transaction.atomic():
+            cart, _ = Cart.objects.select_for_update().get_or_create(user=user)
+            for operation in operations:
+                product = products.get(operation['product_id']) or Product(id=operation['product_id'])
+                if operation['op'] == 'add':
+                    cart.add_product(product, operation['quantity'], save=False)
+                elif operation['op'] == 'set':
+                    cart.set_quantity(product, operation['quantity'], save=False)
+                else:
+                    cart.remove_product(product, save=False)
+            cart.save()
+
+        items = cart.get_items()
+        changed_ids = dict.fromkeys(operation['product_id'] for operation in operations)
+        response_data = {
+            "user": user.username,
+            "changed": [
+                {"product_id": product_id, "quantity": items.get(str(product_id), 0)}
+                for product_id in changed_ids
+            ],
+            "updated_at": cart.updated_at,
+            "total_items": cart.get_total_items(),
+            "total_price": cart.get_total_price()
+        }
+        return Response(response_data, status=status.HTTP_200_OK)
+
+
+def cart_data(user, cart, items, total_price):
+    """
+    Representation of a cart, shared by CartAPI and its async version.
+    ``items`` is the dictionary of product IDs and quantities.
+    """
+    return {
+        "user": user.username,
+        "items": items,
+        "created_at": cart.created_at,
+        "updated_at": cart.updated_at,
+        "total_items": sum(items.values()),
+        "total_price": total_price
+    }
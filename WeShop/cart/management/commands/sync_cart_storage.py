@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from cart.models import CART_STORAGE_JSON, CART_STORAGE_TABLE, Cart, CartItem, cart_storage, parse_product_id
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy every cart from one storage mode to the other. Run it when changing '
+        'CART_STORAGE: carts are only written to the configured mode, so the other '
+        'one is out of date.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--to', choices=[CART_STORAGE_JSON, CART_STORAGE_TABLE],
+            help='Mode to copy the carts to, the configured CART_STORAGE by default.',
+        )
+        parser.add_argument('--chunk-size', type=int, default=500, help='Carts copied per transaction.')
+
+    def handle(self, *args, **options):
+        target = options['to'] or cart_storage()
+        chunk_size = max(options['chunk_size'], 1)
+        carts = Cart.objects.only('id', 'items').order_by('id')
+
+        copied = 0
+        chunk = []
+        for cart in carts.iterator(chunk_size=chunk_size):
+            chunk.append(cart)
+            if len(chunk) >= chunk_size:
+                copied += self.copy(chunk, target)
+                chunk = []
+        if chunk:
+            copied += self.copy(chunk, target)
+        self.stdout.write(self.style.SUCCESS(f'Copied {copied} carts to the {target} storage.'))
+
+    @transaction.atomic
+    def copy(self, carts, target):
+        ids = [cart.id for cart in carts]
+        if target == CART_STORAGE_TABLE:
+            # Replace the rows with the JSON contents, dropping products that no longer exist
+            entries = {}
+            for cart in carts:
+                for key, quantity in (cart.items or {}).items():
+                    product_id = parse_product_id(key)
+                    if product_id is not None and type(quantity) is int and quantity > 0:
+                        entries[cart.id, product_id] = quantity
+            existing = set(Product.objects.filter(id__in={product_id for _, product_id in entries}).values_list('id', flat=True))
+            CartItem.objects.filter(cart_id__in=ids).delete()
+            CartItem.objects.bulk_create(
+                CartItem(cart_id=cart_id, product_id=product_id, quantity=quantity)
+                for (cart_id, product_id), quantity in entries.items()
+                if product_id in existing
+            )
+        else:
+            items = {cart_id: {} for cart_id in ids}
+            lines = CartItem.objects.filter(cart_id__in=ids).order_by('cart_id', 'id')
+            for cart_id, product_id, quantity in lines.values_list('cart_id', 'product_id', 'quantity'):
+                items[cart_id][str(product_id)] = quantity
+            for cart in carts:
+                cart.items = items[cart.id]
+            Cart.objects.bulk_update(carts, ['items'])
+        return len(carts)
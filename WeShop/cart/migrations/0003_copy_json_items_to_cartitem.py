@@ -0,0 +1,63 @@
+# Generated by Django 4.2.16 on 2026-10-18 17:41
+
+from django.db import migrations
+
+
+def copy_json_items_to_rows(apps, schema_editor):
+    """
+    Create a CartItem row for every valid entry of the Cart.items JSON blobs.
+    Entries pointing to products that no longer exist are skipped.
+    """
+    Cart = apps.get_model("cart", "Cart")
+    CartItem = apps.get_model("cart", "CartItem")
+    Product = apps.get_model("products", "Product")
+
+    def flush(rows):
+        existing = set(
+            Product.objects.filter(id__in={row.product_id for row in rows}).values_list(
+                "id", flat=True
+            )
+        )
+        CartItem.objects.bulk_create(
+            [row for row in rows if row.product_id in existing],
+            ignore_conflicts=True,
+        )
+
+    rows = []
+    for cart in Cart.objects.only("id", "items").iterator(chunk_size=500):
+        for key, quantity in (cart.items or {}).items():
+            if not str(key).isdigit() or not isinstance(quantity, int) or quantity < 1:
+                continue
+            rows.append(
+                CartItem(cart_id=cart.id, product_id=int(key), quantity=quantity)
+            )
+        if len(rows) >= 500:
+            flush(rows)
+            rows = []
+    if rows:
+        flush(rows)
+
+
+def copy_rows_to_json_items(apps, schema_editor):
+    Cart = apps.get_model("cart", "Cart")
+    CartItem = apps.get_model("cart", "CartItem")
+
+    items = {}
+    for cart_id, product_id, quantity in CartItem.objects.values_list(
+        "cart_id", "product_id", "quantity"
+    ).iterator():
+        items.setdefault(cart_id, {})[str(product_id)] = quantity
+    for cart in Cart.objects.filter(id__in=items):
+        cart.items = items[cart.id]
+        cart.save(update_fields=["items"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cart", "0002_cartitem"),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_json_items_to_rows, copy_rows_to_json_items),
+    ]
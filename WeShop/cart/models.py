@@ -1,8 +1,51 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
 from django.conf import settings
 from products.models import Product
+from products.prices import aget_prices, get_prices
 from django.core.serializers.json import DjangoJSONEncoder
 
+# Where cart contents are stored, selected with settings.CART_STORAGE
+CART_STORAGE_JSON = 'json'    # the Cart.items JSON dictionary
+CART_STORAGE_TABLE = 'table'  # one CartItem row per product
+
+
+def cart_storage():
+    return getattr(settings, 'CART_STORAGE', CART_STORAGE_JSON)
+
+
+def parse_product_id(key):
+    """
+    The product ID of a cart key (an int or a string of digits), or None.
+    """
+    if isinstance(key, bool):
+        return None
+    try:
+        product_id = int(key)
+    except (TypeError, ValueError):
+        return None
+    return product_id if product_id > 0 else None
+
+
+def clean_items(items):
+    """
+    Validate a dictionary of product IDs and quantities and return it with
+    normalised keys, e.g. "01" and 1 both become "1".
+    Raises ValueError for invalid IDs or quantities and for repeated products.
+    """
+    cleaned = {}
+    for key, quantity in items.items():
+        product_id = parse_product_id(key)
+        if product_id is None:
+            raise ValueError(f'Invalid product ID {key!r}.')
+        if isinstance(quantity, bool) or not isinstance(quantity, int) or quantity < 1:
+            raise ValueError(f'Invalid quantity for product {product_id}. Expected a positive integer.')
+        if str(product_id) in cleaned:
+            raise ValueError(f'Product {product_id} is listed more than once.')
+        cleaned[str(product_id)] = quantity
+    return cleaned
+
+
 class Cart(models.Model):
     user = models.OneToOneField(
         settings.AUTH_USER_MODEL,
@@ -19,29 +62,141 @@ class Cart(models.Model):
     def __str__(self):
         return f"Cart for {self.user.username}"
 
-    def add_product(self, product, quantity=1):
+    @property
+    def uses_table(self):
+        return cart_storage() == CART_STORAGE_TABLE
+
+    def get_items(self):
+        """
+        Get the cart contents as a dictionary of product IDs (as strings) and quantities,
+        whatever the storage mode.
+        """
+        if not self.uses_table:
+            return self.items
+        if not hasattr(self, '_line_items'):
+            self._line_items = {
+                str(product_id): quantity
+                for product_id, quantity in self.lines.order_by('id').values_list('product_id', 'quantity')
+            }
+        return self._line_items
+
+    async def aget_items(self):
+        """
+        Async version of get_items, for async views.
+        """
+        if not self.uses_table:
+            return self.items
+        if not hasattr(self, '_line_items'):
+            self._line_items = {
+                str(product_id): quantity
+                async for product_id, quantity in self.lines.order_by('id').values_list('product_id', 'quantity')
+            }
+        return self._line_items
+
+    def set_items(self, items):
+        """
+        Replace the cart contents with a dictionary of product IDs and quantities,
+        validated by clean_items (ValueError if invalid).
+        In table mode, IDs of products that do not exist are dropped.
+        """
+        items = clean_items(items)
+        if not self.uses_table:
+            self.items = items
+            self.save()
+            return
+
+        products = Product.objects.in_bulk([int(key) for key in items])
+        with transaction.atomic():
+            self.lines.exclude(product_id__in=list(products)).delete()
+            existing = {line.product_id: line for line in self.lines.all()}
+            changed, created = [], []
+            for key, quantity in items.items():
+                product_id = int(key)
+                if product_id not in products:
+                    continue
+                line = existing.get(product_id)
+                if line is None:
+                    created.append(CartItem(cart=self, product_id=product_id, quantity=quantity))
+                elif line.quantity != quantity:
+                    line.quantity = quantity
+                    changed.append(line)
+            CartItem.objects.bulk_create(created)
+            CartItem.objects.bulk_update(changed, ['quantity'])
+            self._lines_changed()
+
+    def add_product(self, product, quantity=1, save=True):
         """
         Add a product to the cart or update its quantity if already in the cart.
+        Pass save=False to batch several changes and save the cart once.
         """
+        if self.uses_table:
+            with transaction.atomic():
+                # Increment in the database so concurrent requests never lose an update
+                updated = self.lines.filter(product=product).update(quantity=F('quantity') + quantity)
+                if not updated:
+                    try:
+                        with transaction.atomic():
+                            CartItem.objects.create(cart=self, product=product, quantity=quantity)
+                    except IntegrityError:
+                        self.lines.filter(product=product).update(quantity=F('quantity') + quantity)
+                self._lines_changed(save)
+            return
+
         if str(product.id) in self.items:
             self.items[str(product.id)] += quantity
         else:
             self.items[str(product.id)] = quantity
-        self.save()
+        if save:
+            self.save()
 
-    def remove_product(self, product):
+    def set_quantity(self, product, quantity, save=True):
+        """
+        Set the quantity of a product in the cart, removing it when the quantity is 0.
+        """
+        if quantity <= 0:
+            self.remove_product(product, save=save)
+            return
+
+        if self.uses_table:
+            with transaction.atomic():
+                updated = self.lines.filter(product=product).update(quantity=quantity)
+                if not updated:
+                    try:
+                        with transaction.atomic():
+                            CartItem.objects.create(cart=self, product=product, quantity=quantity)
+                    except IntegrityError:
+                        self.lines.filter(product=product).update(quantity=quantity)
+                self._lines_changed(save)
+            return
+
+        self.items[str(product.id)] = quantity
+        if save:
+            self.save()
+
+    def remove_product(self, product, save=True):
         """
         Remove a product from the cart.
         """
+        if self.uses_table:
+            if self.lines.filter(product=product).delete()[0]:
+                self._lines_changed(save)
+            return
+
         product_id = str(product.id)
         if product_id in self.items:
             del self.items[product_id]
-            self.save()
+            if save:
+                self.save()
 
     def clear_cart(self):
         """
         Clear all items in the cart.
         """
+        if self.uses_table:
+            self.lines.all().delete()
+            self._lines_changed()
+            return
+
         self.items = {}
         self.save()
 
@@ -49,14 +204,52 @@ class Cart(models.Model):
         """
         Get the total number of items in the cart.
         """
-        return sum(self.items.values())
+        return sum(self.get_items().values())
 
     def get_total_price(self):
         """
         Calculate the total price of the cart.
+        Prices are looked up in one batch; products that no longer exist are ignored.
+        """
+        items = self.get_items()
+        return self._total_price(items, get_prices(items))
+
+    async def aget_total_price(self):
+        """
+        Async version of get_total_price, for async views.
         """
+        items = await self.aget_items()
+        return self._total_price(items, await aget_prices(items))
+
+    def _total_price(self, items, prices):
         total = 0
-        for product_id, quantity in self.items.items():
-            product = Product.objects.get(id=product_id)
-            total += product.price * quantity
+        for product_id, quantity in items.items():
+            price = prices.get(parse_product_id(product_id))
+            if price is not None:
+                total += price * quantity
         return total
+
+    def _lines_changed(self, save=True):
+        """
+        Forget the loaded CartItem contents and record the change on the cart.
+        """
+        self.__dict__.pop('_line_items', None)
+        if save:
+            self.save(update_fields=['updated_at'])
+
+
+class CartItem(models.Model):
+    """
+    A product and its quantity in a cart, used when CART_STORAGE is 'table'.
+    """
+    cart = models.ForeignKey(Cart, related_name='lines', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, related_name='cart_items', on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='unique_cart_product'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} in cart {self.cart_id}"
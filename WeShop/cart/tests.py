@@ -1,3 +1,134 @@
-from django.test import TestCase
+from io import StringIO
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from cart.models import Cart, CartItem
+from WeShop.testing import QueryCountTestCase, create_products
+
+
+def create_cart(size):
+    """
+    A user whose cart holds ``size`` products, stored in the configured mode,
+    and three more products to add to it.
+    """
+    fixture = create_products(size + 3, username='buyer')
+    products, extra = fixture['products'][:size], fixture['products'][size:]
+    cart = Cart.objects.create(user=fixture['user'])
+    if cart.uses_table:
+        CartItem.objects.bulk_create(CartItem(cart=cart, product=product, quantity=2) for product in products)
+    else:
+        cart.items = {str(product.id): 2 for product in products}
+        cart.save()
+    return {**fixture, 'products': products, 'extra': extra}
+
+
+class CartQueryCountTests(QueryCountTestCase):
+    queries = {'get': 3, 'put': 4, 'patch': 7}
+
+    def get(self, fixture):
+        return self.client_for(fixture['token']).get('/cart/api/')
+
+    def get_async(self, fixture):
+        return self.client.get('/cart/async/api/', HTTP_AUTHORIZATION=f'Token {fixture["token"].key}')
+
+    def put(self, fixture):
+        items = {str(product.id): 1 for product in fixture['products']}
+        return self.client_for(fixture['token']).put('/cart/api/', {'items': items}, format='json')
+
+    def patch(self, fixture):
+        # The queries grow with the operations sent, not with the cart contents
+        operations = [{'op': 'add', 'product_id': product.id, 'quantity': 1} for product in fixture['extra']]
+        return self.client_for(fixture['token']).patch('/cart/api/', {'operations': operations}, format='json')
+
+    def test_get(self):
+        self.assertQueryCount(self.queries['get'], create_cart, self.get, status=200)
+
+    def test_get_async(self):
+        self.assertQueryCount(self.queries['get'], create_cart, self.get_async, status=200)
+
+    def test_put(self):
+        self.assertQueryCount(self.queries['put'], create_cart, self.put, status=200)
+
+    def test_patch(self):
+        self.assertQueryCount(self.queries['patch'], create_cart, self.patch, status=200)
+
+
+@override_settings(CART_STORAGE='table')
+class TableCartQueryCountTests(CartQueryCountTests):
+    # One query for the lines; writes replace or update the CartItem rows
+    # inside savepoints, one atomic update per patch operation
+    queries = {'get': 4, 'put': 11, 'patch': 26}
+
+
+class CartPatchTests(QueryCountTestCase):
+
+    def test_add_set_remove(self):
+        fixture = create_cart(2)
+        kept, removed = fixture['products']
+        added = fixture['extra'][0]
+        response = self.client_for(fixture['token']).patch('/cart/api/', {'operations': [
+            {'op': 'add', 'product_id': added.id, 'quantity': 1},
+            {'op': 'add', 'product_id': added.id, 'quantity': 2},
+            {'op': 'set', 'product_id': kept.id, 'quantity': 5},
+            {'op': 'remove', 'product_id': removed.id},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {change['product_id']: change['quantity'] for change in response.data['changed']},
+            {added.id: 3, kept.id: 5, removed.id: 0},
+        )
+        cart = Cart.objects.get(user=fixture['user'])
+        self.assertEqual(cart.get_items(), {str(kept.id): 5, str(added.id): 3})
+        self.assertEqual(response.data['total_items'], 8)
+
+    def test_unknown_product_changes_nothing(self):
+        fixture = create_cart(1)
+        response = self.client_for(fixture['token']).patch('/cart/api/', {'operations': [
+            {'op': 'add', 'product_id': fixture['extra'][0].id, 'quantity': 1},
+            {'op': 'add', 'product_id': 999999, 'quantity': 1},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['product_ids'], [999999])
+        self.assertEqual(Cart.objects.get(user=fixture['user']).get_items(), {str(fixture['products'][0].id): 2})
+
+
+    def test_put_validates_items(self):
+        fixture = create_cart(0)
+        client = self.client_for(fixture['token'])
+        product_id = fixture['extra'][0].id
+        for items in ({str(product_id): 1, f'0{product_id}': 2}, {'abc': 1}, {str(product_id): 0}, {str(product_id): '2'}):
+            with self.subTest(items=items):
+                response = client.put('/cart/api/', {'items': items}, format='json')
+                self.assertEqual(response.status_code, 400)
+
+        response = client.put('/cart/api/', {'items': {f'0{product_id}': 2}}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['items'], {str(product_id): 2})
+
+
+@override_settings(CART_STORAGE='table')
+class TableCartPatchTests(CartPatchTests):
+    pass
+
+
+class SyncCartStorageTests(TestCase):
+
+    def test_round_trip(self):
+        fixture = create_cart(2)
+        first, second = fixture['products']
+        cart = Cart.objects.get(user=fixture['user'])
+        cart.items[str(999999)] = 1  # a deleted product is dropped from the table
+        cart.save()
+
+        call_command('sync_cart_storage', to='table', stdout=StringIO())
+        self.assertEqual(
+            set(CartItem.objects.values_list('product_id', 'quantity')), {(first.id, 2), (second.id, 2)},
+        )
+
+        CartItem.objects.filter(product=first).update(quantity=7)
+        call_command('sync_cart_storage', to='json', stdout=StringIO())
+        cart.refresh_from_db()
+        self.assertEqual(cart.items, {str(first.id): 7, str(second.id): 2})
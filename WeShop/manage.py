@@ -7,6 +7,10 @@ import sys
 def main():
     """Run administrative tasks."""
     os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'WeShop.settings')
+    # Only the development server reports metrics; tests and other commands
+    # would add to the counters of the running service
+    if sys.argv[1:2] != ['runserver']:
+        os.environ.setdefault('METRICS_ENABLED', '0')
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
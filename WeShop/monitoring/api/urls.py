@@ -0,0 +1,10 @@
+from django.urls import path
+from . import views
+
+app_name = 'monitoring'
+
+urlpatterns = [
+    path('profile/',
+         views.ProfileReportAPI.as_view(),
+         name = 'profile-report'),
+]
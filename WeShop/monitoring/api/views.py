@@ -0,0 +1,63 @@
+from monitoring.profiling import registry
+
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+
+from drf_yasg.utils import swagger_auto_schema
+from drf_yasg import openapi
+
+class ProfileReportAPI(APIView):
+
+    @swagger_auto_schema(
+        operation_summary="Dump the request profiles of this process",
+        operation_description="Returns the views and SQL query fingerprints that took the most time since the process started or the last reset, with latency percentiles, queries per request and duplicate queries per request. Each worker process keeps its own profiles. Staff users only.",
+        manual_parameters=[
+            openapi.Parameter(
+                'limit',
+                openapi.IN_QUERY,
+                description="Number of views and queries to return (default 20)",
+                type=openapi.TYPE_INTEGER,
+                required=False
+            )
+        ],
+        responses={
+            200: openapi.Response(description="Hottest views and queries, slowest first"),
+            400: openapi.Response(description="Invalid limit"),
+            401: openapi.Response(description="Invalid or missing token"),
+            403: openapi.Response(description="The user is not staff")
+        }
+    )
+    def get(self, request):
+        user = request.user
+        if not user.is_authenticated:
+            return Response({'error': 'Invalid or missing token.'}, status=status.HTTP_401_UNAUTHORIZED)
+        if not user.is_staff:
+            return Response({'error': 'Only staff users can read the profiles.'}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            return Response({'error': '"limit" must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response({'error': '"limit" must be positive.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(registry.report(limit), status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        operation_summary="Reset the request profiles of this process",
+        responses={
+            204: openapi.Response(description="Profiles cleared"),
+            401: openapi.Response(description="Invalid or missing token"),
+            403: openapi.Response(description="The user is not staff")
+        }
+    )
+    def delete(self, request):
+        user = request.user
+        if not user.is_authenticated:
+            return Response({'error': 'Invalid or missing token.'}, status=status.HTTP_401_UNAUTHORIZED)
+        if not user.is_staff:
+            return Response({'error': 'Only staff users can reset the profiles.'}, status=status.HTTP_403_FORBIDDEN)
+
+        registry.clear()
+        return Response(status=status.HTTP_204_NO_CONTENT)
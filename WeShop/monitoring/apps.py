@@ -0,0 +1,14 @@
+from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+class MonitoringConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "monitoring"
+
+    def ready(self):
+        from monitoring.metrics import count_connection
+        from monitoring.profiling import install_query_recorder
+
+        connection_created.connect(install_query_recorder, dispatch_uid='monitoring_query_recorder')
+        connection_created.connect(count_connection, dispatch_uid='monitoring_count_connection')
@@ -0,0 +1,343 @@
+"""
+Prometheus metrics shared by every worker process.
+
+Each process counts in memory under its own short lock, and a background
+thread regularly writes its totals to its own ``<pid>.json`` file in
+METRICS['DIRECTORY']; files are replaced atomically, so requests never wait
+for a write or for another process. The /metrics endpoint sums the files, so
+the counters of all WSGI or ASGI workers are reported together. Like the
+multiprocess mode of prometheus_client, the counts of exited processes are
+merged into ``exited.json`` rather than dropped, so the totals never go down
+when a worker restarts and Prometheus does not see a counter reset.
+
+Metrics are off in management commands other than runserver (see manage.py),
+so tests and scripts do not add to the counters of the running service.
+"""
+
+import atexit
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: scrapes are not serialised between processes
+    fcntl = None
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': os.environ.get('METRICS_ENABLED', '1') == '1',
+    'DIRECTORY': os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'weshop-metrics')),
+    'FLUSH_INTERVAL': 1.0,  # seconds between writes of this process' file
+    'TOKEN': os.environ.get('METRICS_TOKEN'),  # /metrics requires "Authorization: Bearer <token>"
+    'ALLOWED_IPS': ['127.0.0.1', '::1'],       # clients served without a token, only with DEBUG on
+}
+
+# Counters and histograms of the processes that exited, in METRICS['DIRECTORY']
+EXITED_FILENAME = 'exited.json'
+
+# name: (type, help, histogram buckets)
+DEFINITIONS = {
+    'weshop_http_requests_total': ('counter', 'HTTP requests by URL name, method and status.', None),
+    'weshop_http_request_duration_seconds': (
+        'histogram', 'Time to respond to HTTP requests, by URL name.',
+        [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0],
+    ),
+    'weshop_db_queries_total': ('counter', 'SQL queries run while handling requests, by URL name.', None),
+    'weshop_db_duplicate_queries_total': (
+        'counter', 'Queries repeated with the same SQL and parameters within a request, by URL name.', None,
+    ),
+    'weshop_db_query_duration_seconds_total': ('counter', 'Time spent in SQL queries, by URL name.', None),
+    'weshop_db_connections_created_total': ('counter', 'Database connections opened.', None),
+    'weshop_cache_requests_total': ('counter', 'Application cache lookups by cache and result (hit or miss).', None),
+    'weshop_orders_created_total': ('counter', 'Orders created at checkout.', None),
+    'weshop_checkout_lines_total': ('counter', 'Order lines created at checkout.', None),
+    'weshop_checkout_lines': ('histogram', 'Lines per order created at checkout.', [1, 2, 3, 5, 10, 20, 50]),
+}
+
+
+def get_config():
+    config = DEFAULTS.copy()
+    config.update(getattr(settings, 'METRICS', {}))
+    return config
+
+
+def _key(name, labels):
+    return json.dumps([name, sorted(labels.items())])
+
+
+class ProcessMetrics:
+    """
+    The metrics of this process and the file they are written to.
+    """
+
+    def __init__(self, directory, flush_interval):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.pid = os.getpid()
+        self.path = os.path.join(directory, f'{self.pid}.json')
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._flusher = None
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+        self._changed()
+
+    def observe(self, name, value, **labels):
+        buckets = DEFINITIONS[name][2]
+        key = _key(name, labels)
+        position = bisect_left(buckets, value)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {'buckets': [0] * (len(buckets) + 1), 'sum': 0.0}
+            histogram['buckets'][position] += 1
+            histogram['sum'] += value
+        self._changed()
+
+    def _changed(self):
+        self._dirty.set()
+        if self._flusher is None:
+            with self._lock:
+                if self._flusher is None:
+                    self._flusher = threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True)
+                    self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            self._dirty.wait()
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        # Copy under the lock and serialise after releasing it, so requests
+        # counting meanwhile are not held up by json.dumps
+        with self._lock:
+            self._dirty.clear()
+            counters = dict(self.counters)
+            histograms = {
+                key: {'buckets': list(histogram['buckets']), 'sum': histogram['sum']}
+                for key, histogram in self.histograms.items()
+            }
+        data = {'pid': self.pid, 'counters': counters, 'histograms': histograms}
+        try:
+            _write(self.path, data)
+        except OSError:
+            logger.exception('Could not write the metrics file %s', self.path)
+
+
+def _write(path, data):
+    # Each thread writes its own temporary file, the rename is atomic
+    temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(temporary, 'w') as output:
+        output.write(json.dumps(data))
+    os.replace(temporary, path)
+
+
+_process_metrics = None
+_process_lock = threading.Lock()
+
+
+def get_process_metrics():
+    """
+    The metrics of the current process, created on first use and again in a
+    forked worker, whose counters and file are its own.
+    """
+    global _process_metrics
+    if _process_metrics is None or _process_metrics.pid != os.getpid():
+        with _process_lock:
+            if _process_metrics is None or _process_metrics.pid != os.getpid():
+                config = get_config()
+                _process_metrics = ProcessMetrics(config['DIRECTORY'], config['FLUSH_INTERVAL'])
+    return _process_metrics
+
+
+@atexit.register
+def _flush_at_exit():
+    if _process_metrics is not None and _process_metrics.pid == os.getpid() and _process_metrics.counters:
+        _process_metrics.flush()
+
+
+def enabled():
+    return get_config()['ENABLED']
+
+
+def inc(name, value=1, **labels):
+    if enabled():
+        get_process_metrics().inc(name, value, **labels)
+
+
+def observe(name, value, **labels):
+    if enabled():
+        get_process_metrics().observe(name, value, **labels)
+
+
+def count_cache(cache, hits, misses):
+    """
+    Count lookups in one of the application caches, for the hit ratio.
+    """
+    if hits:
+        inc('weshop_cache_requests_total', hits, cache=cache, result='hit')
+    if misses:
+        inc('weshop_cache_requests_total', misses, cache=cache, result='miss')
+
+
+def count_connection(sender=None, connection=None, **kwargs):
+    """
+    connection_created receiver counting new database connections.
+    """
+    inc('weshop_db_connections_created_total', database=connection.alias)
+
+
+def observe_request(view, method, status, elapsed, profile):
+    """
+    Record a finished request and its queries (a monitoring.profiling.RequestProfile).
+    """
+    if not enabled():
+        return
+    process_metrics = get_process_metrics()
+    process_metrics.inc('weshop_http_requests_total', view=view, method=method, status=str(status))
+    process_metrics.observe('weshop_http_request_duration_seconds', elapsed, view=view)
+    process_metrics.inc('weshop_db_queries_total', profile.query_count, view=view)
+    process_metrics.inc('weshop_db_duplicate_queries_total', profile.duplicates, view=view)
+    process_metrics.inc('weshop_db_query_duration_seconds_total', profile.db_time, view=view)
+
+
+def _running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # alive, run by another user
+    return True
+
+
+def _read(path):
+    try:
+        with open(path) as metrics_file:
+            return json.load(metrics_file)
+    except (OSError, ValueError):
+        return None  # not written yet, or removed while listing the directory
+
+
+def _add(counters, histograms, data):
+    for key, value in data['counters'].items():
+        counters[key] = counters.get(key, 0) + value
+    for key, histogram in data['histograms'].items():
+        total = histograms.setdefault(key, {'buckets': [0] * len(histogram['buckets']), 'sum': 0.0})
+        total['buckets'] = [a + b for a, b in zip(total['buckets'], histogram['buckets'])]
+        total['sum'] += histogram['sum']
+
+
+@contextmanager
+def _directory_lock(directory):
+    """
+    Serialise the scrapes of all processes, which merge and remove files.
+    """
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, 'merge.lock'), 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+
+def collect():
+    """
+    Sum the counters and histograms of every process, keyed by name and labels.
+    """
+    if enabled():
+        get_process_metrics().flush()
+    return collect_directory(get_config()['DIRECTORY'])
+
+
+def collect_directory(directory):
+    """
+    Sum the metrics files in ``directory``. Histograms are summed bucket by
+    bucket. The files of exited processes are merged into EXITED_FILENAME and
+    removed, so their counts stay in the totals.
+    """
+    with _directory_lock(directory):
+        exited_path = os.path.join(directory, EXITED_FILENAME)
+        exited = _read(exited_path) or {'counters': {}, 'histograms': {}}
+        counters, histograms = {}, {}
+        merged = []
+        for filename in os.listdir(directory):
+            pid, extension = os.path.splitext(filename)
+            if extension != '.json' or not pid.isdigit():
+                continue
+            path = os.path.join(directory, filename)
+            data = _read(path)
+            if data is None:
+                continue
+            if _running(int(pid)):
+                _add(counters, histograms, data)
+            else:
+                _add(exited['counters'], exited['histograms'], data)
+                merged.append(path)
+        if merged:
+            _write(exited_path, exited)
+            for path in merged:
+                os.remove(path)
+        _add(counters, histograms, exited)
+    return counters, histograms
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(labels, **extra):
+    labels = [*labels, *extra.items()]
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """
+    The summed metrics in the Prometheus text exposition format.
+    """
+    counters, histograms = collect()
+    # name -> [(labels, sample lines)], so series sort by labels while the
+    # lines of a histogram keep their bucket order
+    series = {name: [] for name in DEFINITIONS}
+    for key, value in counters.items():
+        name, labels = json.loads(key)
+        series.setdefault(name, []).append((labels, [f'{name}{_labels(labels)} {_number(value)}']))
+    for key, histogram in histograms.items():
+        name, labels = json.loads(key)
+        bounds = [*DEFINITIONS[name][2], '+Inf']
+        lines, cumulative = [], 0
+        for bound, count in zip(bounds, histogram['buckets']):
+            cumulative += count
+            lines.append(f'{name}_bucket{_labels(labels, le=bound)} {cumulative}')
+        lines.append(f'{name}_sum{_labels(labels)} {_number(histogram["sum"])}')
+        lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+        series[name].append((labels, lines))
+
+    output = []
+    for name, (kind, help_text, _) in DEFINITIONS.items():
+        output.append(f'# HELP {name} {help_text}')
+        output.append(f'# TYPE {name} {kind}')
+        for _, lines in sorted(series.get(name, []), key=lambda item: item[0]):
+            output.extend(lines)
+    return '\n'.join(output) + '\n'
@@ -0,0 +1,60 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from monitoring import metrics
+from monitoring.profiling import get_config, registry, start_profile, stop_profile
+
+
+class ProfilingMiddleware:
+    """
+    Time every request, its queries and their duplicates (see monitoring/profiling.py).
+
+    Adds a Server-Timing header with the database time, the rest of the
+    application time and the total, and records the request under its URL name
+    in the registry and in the Prometheus metrics (see monitoring/metrics.py).
+    Goes first in MIDDLEWARE so the other middleware is measured too. Works in
+    both WSGI and ASGI deployments; for streaming responses only the time to
+    the first byte is measured.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = get_config()
+        self.enabled = self.config['ENABLED'] or metrics.enabled()
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+        token = start_profile()
+        try:
+            response = self.get_response(request)
+        finally:
+            profile = stop_profile(token)
+        return self.finish(request, response, profile)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        token = start_profile()
+        try:
+            response = await self.get_response(request)
+        finally:
+            profile = stop_profile(token)
+        return self.finish(request, response, profile)
+
+    def finish(self, request, response, profile):
+        elapsed = profile.elapsed
+        match = request.resolver_match
+        view = (match.view_name if match else None) or 'unresolved'
+        if self.config['ENABLED']:
+            registry.add(view, profile, elapsed)
+        metrics.observe_request(view, request.method, response.status_code, elapsed, profile)
+        if self.config['SERVER_TIMING']:
+            response.headers['Server-Timing'] = profile.server_timing(elapsed)
+        return response
@@ -0,0 +1,231 @@
+"""
+Per-request SQL and latency profiling.
+
+Every database connection gets an execute wrapper (see install_query_recorder)
+that times each query and adds it to the profile of the current request. The
+profile lives in a context variable, so it follows async views into the
+threads where the async ORM runs their queries. When the request ends the
+profile is added to the in-process registry: a latency histogram per view and
+the time spent in each query fingerprint, i.e. the SQL with its parameters
+left out, so the same query run for every row of a list shows up as one hot
+fingerprint executed many times per request.
+"""
+
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import lru_cache
+
+from django.conf import settings
+
+DEFAULTS = {
+    'ENABLED': True,
+    'SERVER_TIMING': True,     # add a Server-Timing header to every response
+    'BUCKETS': [5, 10, 25, 50, 100, 250, 500, 1000, 2500],  # upper bounds in ms
+    'MAX_QUERIES': 500,        # query fingerprints kept in the registry
+}
+
+
+def get_config():
+    config = DEFAULTS.copy()
+    config.update(getattr(settings, 'PROFILING', {}))
+    return config
+
+
+_IN_LIST = re.compile(r'\bIN \((?:%s|\?)(?:\s*,\s*(?:%s|\?))*\)', re.IGNORECASE)
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SPACES = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(sql):
+    """
+    The SQL with literals and IN lists of any length collapsed, so that
+    queries differing only by their values are grouped together.
+    """
+    sql = _IN_LIST.sub('IN (...)', sql)
+    sql = _LITERALS.sub('?', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+class RequestProfile:
+    """
+    Queries run while handling one request.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.db_time = 0.0
+        self.queries = {}   # fingerprint -> [count, seconds]
+        self.statements = set()
+        self.duplicates = 0  # queries repeated with the same SQL and parameters
+
+    def add_query(self, sql, params, duration):
+        self.db_time += duration
+        entry = self.queries.setdefault(fingerprint(sql), [0, 0.0])
+        entry[0] += 1
+        entry[1] += duration
+        try:
+            statement = (sql, repr(params))
+        except Exception:
+            return
+        if statement in self.statements:
+            self.duplicates += 1
+        else:
+            self.statements.add(statement)
+
+    @property
+    def query_count(self):
+        return sum(count for count, _ in self.queries.values())
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def server_timing(self, elapsed):
+        return (
+            f'db;dur={self.db_time * 1000:.2f};desc="{self.query_count} queries", '
+            f'app;dur={(elapsed - self.db_time) * 1000:.2f}, '
+            f'total;dur={elapsed * 1000:.2f}'
+        )
+
+
+_current = ContextVar('request_profile', default=None)
+
+
+def start_profile():
+    """
+    Start profiling the current request; returns the token for stop_profile.
+    """
+    return _current.set(RequestProfile())
+
+
+def stop_profile(token):
+    profile = _current.get()
+    _current.reset(token)
+    return profile
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Execute wrapper timing each query for the profile of the current request.
+    """
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.add_query(sql, params, time.perf_counter() - start)
+
+
+def install_query_recorder(sender=None, connection=None, **kwargs):
+    """
+    connection_created receiver adding record_query to every new connection.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class Registry:
+    """
+    Aggregated profiles of the requests handled by this process.
+    """
+
+    def __init__(self, buckets, max_queries):
+        self.buckets = list(buckets)
+        self.max_queries = max_queries
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self.views = {}
+            self.queries = {}
+            self.dropped_queries = 0
+
+    def add(self, view, profile, elapsed):
+        bucket = bisect_left(self.buckets, elapsed * 1000)
+        with self._lock:
+            stats = self.views.get(view)
+            if stats is None:
+                stats = self.views[view] = {
+                    'requests': 0, 'time': 0.0, 'max_time': 0.0, 'db_time': 0.0,
+                    'queries': 0, 'duplicates': 0, 'histogram': [0] * (len(self.buckets) + 1),
+                }
+            stats['requests'] += 1
+            stats['time'] += elapsed
+            stats['max_time'] = max(stats['max_time'], elapsed)
+            stats['db_time'] += profile.db_time
+            stats['queries'] += profile.query_count
+            stats['duplicates'] += profile.duplicates
+            stats['histogram'][bucket] += 1
+
+            for sql, (count, duration) in profile.queries.items():
+                query = self.queries.get(sql)
+                if query is None:
+                    if len(self.queries) >= self.max_queries:
+                        self.dropped_queries += 1
+                        continue
+                    query = self.queries[sql] = {'count': 0, 'time': 0.0, 'max_per_request': 0, 'views': set()}
+                query['count'] += count
+                query['time'] += duration
+                query['max_per_request'] = max(query['max_per_request'], count)
+                query['views'].add(view)
+
+    def percentile(self, histogram, fraction):
+        """
+        Upper bound, in ms, of the bucket holding the given fraction of requests.
+        None when it falls in the last, unbounded bucket.
+        """
+        target = fraction * sum(histogram)
+        seen = 0
+        for position, count in enumerate(histogram):
+            seen += count
+            if seen >= target and count:
+                return self.buckets[position] if position < len(self.buckets) else None
+        return None
+
+    def report(self, limit=20):
+        """
+        The views and query fingerprints taking the most time, slowest first.
+        """
+        with self._lock:
+            views = [
+                {
+                    'view': view,
+                    'requests': stats['requests'],
+                    'total_ms': stats['time'] * 1000,
+                    'mean_ms': stats['time'] * 1000 / stats['requests'],
+                    'max_ms': stats['max_time'] * 1000,
+                    'p50_ms': self.percentile(stats['histogram'], 0.50),
+                    'p95_ms': self.percentile(stats['histogram'], 0.95),
+                    'p99_ms': self.percentile(stats['histogram'], 0.99),
+                    'db_ms': stats['db_time'] * 1000,
+                    'queries_per_request': stats['queries'] / stats['requests'],
+                    'duplicates_per_request': stats['duplicates'] / stats['requests'],
+                    'histogram': dict(zip([*map(str, self.buckets), 'inf'], stats['histogram'])),
+                }
+                for view, stats in self.views.items()
+            ]
+            queries = [
+                {
+                    'sql': sql,
+                    'count': query['count'],
+                    'total_ms': query['time'] * 1000,
+                    'max_per_request': query['max_per_request'],
+                    'views': sorted(query['views']),
+                }
+                for sql, query in self.queries.items()
+            ]
+            dropped = self.dropped_queries
+        views.sort(key=lambda view: view['total_ms'], reverse=True)
+        queries.sort(key=lambda query: query['total_ms'], reverse=True)
+        return {'views': views[:limit], 'queries': queries[:limit], 'dropped_queries': dropped}
+
+
+_config = get_config()
+registry = Registry(_config['BUCKETS'], _config['MAX_QUERIES'])
@@ -0,0 +1,142 @@
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from monitoring import metrics
+from monitoring.profiling import registry
+from WeShop.testing import clear_caches, create_products
+
+
+def exited_pid():
+    """
+    The pid of a process that already exited.
+    """
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+class MetricsCollectTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, pid, requests):
+        key = metrics._key('weshop_http_requests_total', {'view': 'products:list-products'})
+        with open(os.path.join(self.directory, f'{pid}.json'), 'w') as output:
+            json.dump({'pid': pid, 'counters': {key: requests}, 'histograms': {}}, output)
+        return key
+
+    def test_exited_process_counts_are_kept(self):
+        key = self.write(os.getpid(), 2)
+        self.write(exited_pid(), 5)
+
+        counters, _ = metrics.collect_directory(self.directory)
+        self.assertEqual(counters[key], 7)
+        self.assertEqual(
+            sorted(os.listdir(self.directory)), sorted([metrics.EXITED_FILENAME, f'{os.getpid()}.json', 'merge.lock'])
+        )
+
+        # A later scrape, after another worker exited too, never goes down
+        self.write(exited_pid(), 1)
+        counters, _ = metrics.collect_directory(self.directory)
+        self.assertEqual(counters[key], 8)
+
+    def test_flush_writes_a_snapshot(self):
+        process_metrics = metrics.ProcessMetrics(self.directory, flush_interval=60)
+        process_metrics.inc('weshop_orders_created_total')
+        process_metrics.observe('weshop_checkout_lines', 3)
+        process_metrics.flush()
+        process_metrics.inc('weshop_orders_created_total')
+
+        counters, histograms = metrics.collect_directory(self.directory)
+        self.assertEqual(counters[metrics._key('weshop_orders_created_total', {})], 1)
+        self.assertEqual(histograms[metrics._key('weshop_checkout_lines', {})]['buckets'], [0, 0, 1, 0, 0, 0, 0, 0])
+
+
+class MetricsViewTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.settings = {'ENABLED': False, 'DIRECTORY': directory.name, 'TOKEN': None}
+
+    def test_token_required_outside_debug(self):
+        with override_settings(METRICS=self.settings, DEBUG=False):
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+        with override_settings(METRICS=self.settings, DEBUG=True):
+            self.assertEqual(self.client.get('/metrics').status_code, 200)
+            self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.1').status_code, 403)
+
+    def test_token(self):
+        with override_settings(METRICS={**self.settings, 'TOKEN': 'segredo'}):
+            self.assertEqual(self.client.get('/metrics').status_code, 401)
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer segredo')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('# TYPE weshop_http_requests_total counter', response.content.decode())
+
+
+@override_settings(PROFILING={'ENABLED': True, 'SERVER_TIMING': True})
+class ProfilingTests(TestCase):
+
+    def setUp(self):
+        clear_caches()
+        registry.clear()
+        self.addCleanup(clear_caches)
+        self.addCleanup(registry.clear)
+        self.fixture = create_products(3)
+
+    def test_request_is_profiled(self):
+        product = self.fixture['products'][0]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/products/api/', {'id': product.id, 'slug': product.slug})
+        self.assertEqual(response.status_code, 200)
+
+        timing = re.fullmatch(
+            r'db;dur=([\d.]+);desc="(\d+) queries", app;dur=([\d.]+), total;dur=([\d.]+)', response['Server-Timing'],
+        )
+        self.assertIsNotNone(timing)
+        db_ms, count, app_ms, total_ms = map(float, timing.groups())
+        self.assertEqual(count, len(queries))
+        self.assertAlmostEqual(db_ms + app_ms, total_ms, delta=0.02)
+
+        report = registry.report()
+        [view] = report['views']
+        self.assertEqual(view['view'], 'products:api-products')
+        self.assertEqual(view['requests'], 1)
+        self.assertEqual(view['queries_per_request'], len(queries))
+        self.assertEqual(view['duplicates_per_request'], 0)
+        self.assertGreater(view['db_ms'], 0)
+        self.assertLessEqual(view['db_ms'], view['total_ms'])
+        self.assertEqual(sum(view['histogram'].values()), 1)
+        self.assertEqual(sum(query['count'] for query in report['queries']), len(queries))
+        self.assertTrue(all(query['views'] == ['products:api-products'] for query in report['queries']))
+
+    def test_report_is_staff_only(self):
+        user = self.fixture['user']
+        client = APIClient()
+        self.assertEqual(client.get('/monitoring/profile/').status_code, 401)
+
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.fixture["token"].key}')
+        response = client.get('/monitoring/profile/')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.data, {'error': 'Only staff users can read the profiles.'})
+        self.assertEqual(client.delete('/monitoring/profile/').status_code, 403)
+
+        user.is_staff = True
+        user.save()
+        response = client.get('/monitoring/profile/')
+        self.assertEqual(response.status_code, 200)
+        # The rejected requests were profiled like any other
+        [view] = response.data['views']
+        self.assertEqual((view['view'], view['requests']), ('monitoring:profile-report', 3))
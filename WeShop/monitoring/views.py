@@ -0,0 +1,29 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+
+from monitoring import metrics
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+@require_GET
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint with the metrics of every worker process.
+
+    Requires the METRICS['TOKEN'] bearer token. Without a token the metrics
+    are only served with DEBUG on, to METRICS['ALLOWED_IPS']: behind a reverse
+    proxy on the same host every client would otherwise come from loopback.
+    """
+    config = metrics.get_config()
+    token = config['TOKEN']
+    if token:
+        expected = f'Bearer {token}'
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), expected):
+            return HttpResponse('Invalid or missing token.\n', status=401, content_type=CONTENT_TYPE)
+    elif not settings.DEBUG or request.META.get('REMOTE_ADDR') not in config['ALLOWED_IPS']:
+        return HttpResponse('Set METRICS_TOKEN to serve the metrics.\n', status=403, content_type=CONTENT_TYPE)
+    return HttpResponse(metrics.render(), content_type=CONTENT_TYPE)
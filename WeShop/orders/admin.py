@@ -1,18 +1,50 @@
 from django.contrib import admin
 
+from WeShop.pagination import ApproximateCountPaginator
+
 from .models import Order, OrderItem
 
+
+class OrderItemInline(admin.TabularInline):
+    model = OrderItem
+    fields = ['product', 'product_name', 'product_slug', 'price', 'quantity']
+    readonly_fields = ['product_name', 'product_slug']
+    # A raw id input rather than a select listing every product
+    raw_id_fields = ['product']
+    extra = 0
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ['user', 'email', 'address',
+    list_display = ['id', 'user', 'email', 'city', 'total_cost', 'item_count',
+                    'paid', 'created',
                      ]
-    list_filter = ['user', 'created', 'updated']
-    
+    list_select_related = ['user']
+    # Filtering by user goes through the search box, not a sidebar listing every user
+    list_filter = ['paid', 'created']
+    search_fields = ['email', 'first_name', 'last_name', 'user__username']
+    autocomplete_fields = ['user']
+    readonly_fields = ['total_cost', 'item_count']
+    date_hierarchy = 'created'
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+    inlines = [OrderItemInline]
 
-@admin.register(OrderItem)
-class OrderItemAdmin(admin.ModelAdmin):
-    list_display = ['order', 'price',
-                     ]
-    list_filter = ['order',]
-    list_editable = ['price']
-    
+    def save_formset(self, request, form, formset, change):
+        # Lines added or pointed at another product here get the same product
+        # snapshot as at checkout
+        formset.save(commit=False)
+        for inline_form in formset.saved_forms:
+            item = inline_form.instance
+            if 'product' in inline_form.changed_data and item.product_id is not None:
+                item.product_name = item.product.name
+                item.product_slug = item.product.slug
+            item.save()
+        for item in formset.deleted_objects:
+            item.delete()
+        formset.save_m2m()
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Keep the totals stored on the order in step with its lines
+        form.instance.update_totals()
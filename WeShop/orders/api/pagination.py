@@ -0,0 +1,14 @@
+from django.conf import settings
+
+from rest_framework.pagination import CursorPagination
+
+
+class OrderCursorPagination(CursorPagination):
+    """
+    Keyset pagination for a user's order history, newest orders first.
+    """
+
+    page_size = getattr(settings, 'ORDERS_PAGE_SIZE', 20)
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'ORDERS_MAX_PAGE_SIZE', 100)
+    ordering = ('-created', '-id')
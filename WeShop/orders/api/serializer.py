@@ -11,8 +11,9 @@ class OrderSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'first_name', 'last_name', 'email',
             'user', 'address', 'postal_code', 'city',
-            'created', 'updated', 'paid',
+            'created', 'updated', 'paid', 'total_cost', 'item_count',
         ]
+        read_only_fields = ['total_cost', 'item_count']
         
 class OrderItemsSerializer(serializers.ModelSerializer):
 
@@ -21,4 +22,5 @@ class OrderItemsSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = OrderItem
-        fields = ['order', 'product', 'price', 'quantity']
\ No newline at end of file
+        fields = ['order', 'product', 'product_name', 'product_slug', 'price', 'quantity']
+        read_only_fields = ['product_name', 'product_slug']
\ No newline at end of file
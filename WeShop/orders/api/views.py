@@ -1,18 +1,28 @@
+from datetime import datetime, time
+
 from orders.models import Order, OrderItem
 from cart.models import Cart
 from products.models import Product
 from .serializer import OrderSerializer
+from .pagination import OrderCursorPagination
+from orders.services import checkout
+from monitoring import metrics
+from WeShop.streaming import CHUNK_SIZE, stream_json_object, wants_stream
+
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.authtoken.models import Token
 
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
 class OrdersAPI(APIView):
-    
+    pagination_class = OrderCursorPagination
+
     @swagger_auto_schema(
     operation_summary="Create an order from the user's cart",
     operation_description="Allows an authenticated user to create an order using their current cart. Order details and cart items are processed, and the cart is cleared after the order is created.",
@@ -69,6 +79,10 @@ class OrdersAPI(APIView):
                         format=openapi.FORMAT_FLOAT,
                         description="Total cost of the order"
                     ),
+                    "item_count": openapi.Schema(
+                        type=openapi.TYPE_INTEGER,
+                        description="Number of units ordered"
+                    ),
                     "created_at": openapi.Schema(
                         type=openapi.TYPE_STRING,
                         format=openapi.FORMAT_DATETIME,
@@ -92,6 +106,10 @@ class OrdersAPI(APIView):
                                     type=openapi.TYPE_STRING,
                                     description="Name of the product"
                                 ),
+                                "product_slug": openapi.Schema(
+                                    type=openapi.TYPE_STRING,
+                                    description="Slug of the product"
+                                ),
                                 "price": openapi.Schema(
                                     type=openapi.TYPE_NUMBER,
                                     format=openapi.FORMAT_FLOAT,
@@ -129,12 +147,8 @@ class OrdersAPI(APIView):
     }
 )
     def post(self, request):
-        try:
-            # Extract the token from the Authorization header
-            token = request.META.get('HTTP_AUTHORIZATION').split(' ')[1]
-            token_obj = Token.objects.get(key=token)
-            user = token_obj.user
-        except (Token.DoesNotExist, IndexError):
+        user = request.user
+        if not user.is_authenticated:
             return Response({'error': 'Invalid or missing token.'}, status=status.HTTP_401_UNAUTHORIZED)
 
         try:
@@ -143,48 +157,28 @@ class OrdersAPI(APIView):
             if not isinstance(order_data, dict):
                 return Response({'error': 'Invalid order_data format. Expected a dictionary.'}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Create the Order
-            order = Order.objects.create(
-                user=user,
-                first_name=order_data.get('first_name'),
-                last_name=order_data.get('last_name'),
-                email=order_data.get('email'),
-                address=order_data.get('address'),
-                postal_code=order_data.get("postal_code"),
-                city=order_data.get("city"),
-            )
-            
-            # Fetch the user's cart
-            cart = Cart.objects.get(user=user)
-            cart_items = cart.items
-
-            # Add items from the cart to the Order
-            for product_id, quantity in cart_items.items():
-                product = Product.objects.get(id=product_id)
-                OrderItem.objects.create(
-                    order=order,
-                    product=product,
-                    price=product.price,
-                    quantity=quantity
-                )
+            # Create the order and its items from the cart in a single transaction
+            order, items = checkout(user, order_data)
+            metrics.inc('weshop_orders_created_total')
+            metrics.inc('weshop_checkout_lines_total', len(items))
+            metrics.observe('weshop_checkout_lines', len(items))
 
-            # Clear the cart after creating the Order
-            cart.clear_cart()
-
-            # Prepare the response data
+            # Prepare the response data from the objects already in memory
             response_data = {
                 "order_id": order.id,
-                "total_cost": order.get_total_cost(),
+                "total_cost": order.total_cost,
+                "item_count": order.item_count,
                 "created_at": order.created,
                 "updated_at": order.updated,
                 "items": [
                     {
-                        "product_id": item.product.id,
-                        "product_name": item.product.name,
+                        "product_id": item.product_id,
+                        "product_name": item.product_name,
+                        "product_slug": item.product_slug,
                         "price": item.price,
                         "quantity": item.quantity
                     }
-                    for item in order.items.all()
+                    for item in items
                 ]
             }
 
@@ -196,41 +190,133 @@ class OrdersAPI(APIView):
             return Response({'error': 'One or more products in the cart do not exist.'}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        
+
+    @swagger_auto_schema(
+        operation_summary="Retrieve the user's order history",
+        operation_description="Returns a page of the authenticated user's orders, newest first, keyed by order ID. Use the `next` and `previous` links to navigate between pages.",
+        manual_parameters=[
+            openapi.Parameter(
+                'since',
+                openapi.IN_QUERY,
+                description="Only return orders created at or after this ISO 8601 date or datetime",
+                type=openapi.TYPE_STRING,
+                required=False
+            ),
+            openapi.Parameter(
+                'cursor',
+                openapi.IN_QUERY,
+                description="Opaque pagination cursor taken from the `next` or `previous` links",
+                type=openapi.TYPE_STRING,
+                required=False
+            ),
+            openapi.Parameter(
+                'page_size',
+                openapi.IN_QUERY,
+                description="Number of orders per page",
+                type=openapi.TYPE_INTEGER,
+                required=False
+            ),
+            openapi.Parameter(
+                'stream',
+                openapi.IN_QUERY,
+                description="Stream every order, keyed by order ID, instead of one page",
+                type=openapi.TYPE_BOOLEAN,
+                required=False
+            )
+        ],
+        responses={
+            200: openapi.Response(description="Page of orders"),
+            400: openapi.Response(
+                description="Invalid since parameter",
+                examples={
+                    "application/json": {
+                        "error": 'Invalid "since" parameter. Expected an ISO 8601 date or datetime.'
+                    }
+                }
+            ),
+            401: openapi.Response(description="Invalid or missing token")
+        }
+    )
     def get(self, request):
-        
-        try:
-            # Extract the token from the Authorization header
-            token = request.META.get('HTTP_AUTHORIZATION').split(' ')[1]
-            token_obj = Token.objects.get(key=token)
-            user = token_obj.user
-        except (Token.DoesNotExist, IndexError):
+        user = request.user
+        if not user.is_authenticated:
             return Response({'error': 'Invalid or missing token.'}, status=status.HTTP_401_UNAUTHORIZED)
-        
-        orders = Order.objects.filter(user = user)
+
+        # Totals and product names are stored on the orders and their lines, so products are not read
+        orders = Order.objects.filter(user=user).prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.only(
+                'order_id', 'product_id', 'product_name', 'product_slug', 'price', 'quantity'
+            ))
+        )
+
+        since = request.query_params.get('since')
+        if since:
+            since = parse_since(since)
+            if since is None:
+                return Response(
+                    {'error': 'Invalid "since" parameter. Expected an ISO 8601 date or datetime.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            orders = orders.filter(created__gte=since)
+
+        if wants_stream(request):
+            # Items are prefetched for each chunk of orders read by the iterator
+            orders = orders.order_by(*self.pagination_class.ordering)
+            return stream_json_object(
+                (order.id, order_data(order)) for order in orders.iterator(chunk_size=CHUNK_SIZE)
+            )
+
+        # Orders and their items take two queries whatever the page size
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(orders, request, view=self)
+
         response_data = {}
-        for order in orders:
-            response_data[order.id] = [
+        for order in page:
+            response_data[order.id] = order_data(order)
+        return paginator.get_paginated_response(response_data)
+
+
+def order_data(order):
+    """
+    Representation of an order in the order history.
+    """
+    return [
+        {
+            "total_cost": order.total_cost,
+            "item_count": order.item_count,
+            "address": order.address,
+            "postal_code": order.postal_code,
+            "city": order.city,
+            "paid": order.paid,
+            "created_at": order.created,
+            "updated_at": order.updated,
+            "items": [
                 {
-                "total_cost": order.get_total_cost(),
-                "address": order.address,
-                "postal_code": order.postal_code,
-                "city": order.city,
-                "paid": order.paid,
-                "created_at": order.created,
-                "updated_at": order.updated,
-                "items": [
-                    {
-                        "product_id": item.product.id,
-                        "product_name": item.product.name,
-                        "price": item.price,
-                        "quantity": item.quantity
-                    }
-                    for item in order.items.all()
-                ]
+                    "product_id": item.product_id,
+                    "product_name": item.product_name,
+                    "product_slug": item.product_slug,
+                    "price": item.price,
+                    "quantity": item.quantity
                 }
-                ]
-        return Response(response_data, status=status.HTTP_200_OK)
-            
-        
-        
\ No newline at end of file
+                for item in order.items.all()
+            ]
+        }
+    ]
+
+
+def parse_since(value):
+    """
+    Parse the ``since`` filter as an aware datetime, accepting plain dates too.
+    """
+    try:
+        since = parse_datetime(value)
+        if since is None:
+            day = parse_date(value)
+            if day is None:
+                return None
+            since = datetime.combine(day, time.min)
+    except ValueError:
+        return None
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.16 on 2026-10-18 18:14
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_totals_and_snapshots(apps, schema_editor):
+    """
+    Store the totals of existing orders and copy the current name and slug of
+    the products into their lines, one UPDATE statement each.
+    """
+    Order = apps.get_model("orders", "Order")
+    OrderItem = apps.get_model("orders", "OrderItem")
+    Product = apps.get_model("products", "Product")
+
+    cost = models.DecimalField(max_digits=12, decimal_places=2)
+    lines = OrderItem.objects.filter(order_id=OuterRef("pk")).order_by().values("order_id")
+    Order.objects.update(
+        total_cost=Coalesce(
+            Subquery(
+                lines.annotate(
+                    total=Sum(F("price") * F("quantity"), output_field=cost)
+                ).values("total")
+            ),
+            Value(Decimal("0.00")),
+            output_field=cost,
+        ),
+        item_count=Coalesce(
+            Subquery(lines.annotate(count=Sum("quantity")).values("count")),
+            Value(0),
+        ),
+    )
+
+    product = Product.objects.filter(pk=OuterRef("product_id"))
+    OrderItem.objects.filter(product__isnull=False).update(
+        product_name=Subquery(product.values("name")[:1]),
+        product_slug=Subquery(product.values("slug")[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0002_order_totals_and_item_snapshots"),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_totals_and_snapshots, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,24 @@
+from decimal import Decimal
+
 from django.db import models
+from django.db.models import F, Sum, Value
+from django.db.models.functions import Coalesce
 from products.models import Product
 from django.conf import settings
 
 
+def line_totals():
+    """
+    Aggregates of OrderItem rows giving the ``total_cost`` and ``item_count``
+    of their order.
+    """
+    cost = models.DecimalField(max_digits=12, decimal_places=2)
+    return {
+        'total_cost': Coalesce(Sum(F('price') * F('quantity'), output_field=cost), Value(Decimal('0.00')), output_field=cost),
+        'item_count': Coalesce(Sum('quantity'), Value(0)),
+    }
+
+
 class Order(models.Model):
     # Relate the order to a user account
     user = models.ForeignKey(
@@ -19,6 +35,9 @@ class Order(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
     paid = models.BooleanField(default=False)
+    # Written at checkout from the order lines, so reading an order needs no join
+    total_cost = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    item_count = models.PositiveIntegerField(default=0)  # units, the sum of the line quantities
 
     class Meta:
         ordering = ['-created']
@@ -30,11 +49,23 @@ class Order(models.Model):
         return f'Order {self.id} by {self.user.username}'
 
     def get_total_cost(self):
-        return sum(item.get_cost() for item in self.items.all())
+        return self.total_cost
+
+    def update_totals(self):
+        """
+        Recompute ``total_cost`` and ``item_count`` after the lines were edited.
+        """
+        totals = self.items.aggregate(**line_totals())
+        self.total_cost, self.item_count = totals['total_cost'], totals['item_count']
+        self.save(update_fields=['total_cost', 'item_count', 'updated'])
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE)
-    product = models.ForeignKey(Product, related_name='order_items', on_delete=models.CASCADE)
+    # Orders outlive the products they list: the name and slug are copied at
+    # checkout and the link is cleared if the product is deleted
+    product = models.ForeignKey(Product, related_name='order_items', on_delete=models.SET_NULL, null=True, blank=True)
+    product_name = models.CharField(max_length=200, default='')
+    product_slug = models.SlugField(max_length=200, default='', db_index=False)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     quantity = models.PositiveIntegerField(default=1)
 
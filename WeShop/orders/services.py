@@ -0,0 +1,61 @@
+from decimal import Decimal
+
+from django.db import transaction
+
+from cart.models import Cart, parse_product_id
+from orders.models import Order, OrderItem
+from products.models import Product
+
+
+@transaction.atomic
+def checkout(user, order_data):
+    """
+    Turn the user's cart into an order and clear the cart.
+
+    The cart row is locked for the duration of the transaction, every product
+    is fetched with a single query and the order lines are written with one
+    bulk insert, so the query count does not depend on the cart size.
+    Nothing is written if the cart or any of its products is missing.
+
+    The order totals and the product name and slug of each line are stored
+    with them, so reading the order later does not depend on the catalogue.
+
+    Returns the order and its items, with ``item.product`` already populated.
+    """
+    cart = Cart.objects.select_for_update().get(user=user)
+    cart_items = cart.get_items()
+
+    product_ids = [parse_product_id(key) for key in cart_items]
+    products = Product.objects.only('id', 'name', 'slug', 'price').in_bulk(
+        [product_id for product_id in product_ids if product_id is not None]
+    )
+    if len(products) != len(set(product_ids)):
+        raise Product.DoesNotExist('One or more products in the cart do not exist.')
+
+    lines = [(products[product_id], quantity) for product_id, quantity in zip(product_ids, cart_items.values())]
+    order = Order.objects.create(
+        user=user,
+        first_name=order_data.get('first_name'),
+        last_name=order_data.get('last_name'),
+        email=order_data.get('email'),
+        address=order_data.get('address'),
+        postal_code=order_data.get('postal_code'),
+        city=order_data.get('city'),
+        total_cost=sum((product.price * quantity for product, quantity in lines), Decimal('0.00')),
+        item_count=sum(quantity for _, quantity in lines),
+    )
+
+    items = OrderItem.objects.bulk_create([
+        OrderItem(
+            order=order,
+            product=product,
+            product_name=product.name,
+            product_slug=product.slug,
+            price=product.price,
+            quantity=quantity,
+        )
+        for product, quantity in lines
+    ])
+
+    cart.clear_cart()
+    return order, items
@@ -1,3 +1,126 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
 
-# Create your tests here.
+from cart.models import Cart
+from orders.models import Order, OrderItem
+from products.models import Product
+from WeShop.testing import QueryCountTestCase, create_products
+
+ORDER_DATA = {
+    'first_name': 'Maria',
+    'last_name': 'Silva',
+    'email': 'maria@example.com',
+    'address': 'Rua Marquês de São Vicente, 225',
+    'postal_code': '22451-900',
+    'city': 'Rio de Janeiro',
+}
+
+
+def create_orders(orders, items):
+    """
+    A user with ``orders`` orders of ``items`` lines each, and a cart of ``items`` products.
+    """
+    fixture = create_products(items, username='buyer')
+    products = fixture['products']
+    order_rows = Order.objects.bulk_create(
+        Order(
+            user=fixture['user'],
+            total_cost=sum(product.price * 2 for product in products),
+            item_count=2 * items,
+            **ORDER_DATA
+        )
+        for _ in range(orders)
+    )
+    OrderItem.objects.bulk_create(
+        OrderItem(
+            order=order, product=product, product_name=product.name, product_slug=product.slug,
+            price=product.price, quantity=2,
+        )
+        for order in order_rows
+        for product in products
+    )
+    Cart.objects.create(user=fixture['user']).set_items({str(product.id): 1 for product in products})
+    return fixture
+
+
+class OrderQueryCountTests(QueryCountTestCase):
+
+    def list_orders(self, fixture):
+        return self.client_for(fixture['token']).get('/orders/api/')
+
+    def test_list_many_orders(self):
+        self.assertQueryCount(3, lambda size: create_orders(size, 3), self.list_orders, status=200)
+
+    def test_list_many_items(self):
+        self.assertQueryCount(3, lambda size: create_orders(3, size), self.list_orders, status=200)
+
+    def test_list_stream(self):
+        def request(fixture):
+            response = self.client_for(fixture['token']).get('/orders/api/', {'stream': 'true'})
+            b''.join(response.streaming_content)
+            return response
+
+        self.assertQueryCount(3, lambda size: create_orders(size, 3), request, status=200)
+
+    def test_checkout(self):
+        def request(fixture):
+            return self.client_for(fixture['token']).post('/orders/api/', {'order_data': ORDER_DATA}, format='json')
+
+        self.assertQueryCount(8, lambda size: create_orders(0, size), request, status=201)
+
+
+class CheckoutTests(QueryCountTestCase):
+
+    def test_missing_product_rolls_back(self):
+        fixture = create_orders(0, 2)
+        cart = Cart.objects.get(user=fixture['user'])
+        items = cart.get_items()
+        Product.objects.filter(id=fixture['products'][1].id).delete()
+
+        response = self.client_for(fixture['token']).post('/orders/api/', {'order_data': ORDER_DATA}, format='json')
+
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Cart.objects.get(user=fixture['user']).get_items(), items)
+
+    def test_checkout_stores_totals_and_snapshots(self):
+        fixture = create_orders(0, 2)
+        response = self.client_for(fixture['token']).post('/orders/api/', {'order_data': ORDER_DATA}, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get()
+        self.assertEqual(order.total_cost, sum(product.price for product in fixture['products']))
+        self.assertEqual(order.item_count, 2)
+        self.assertEqual(
+            sorted(order.items.values_list('product_name', flat=True)),
+            [product.name for product in fixture['products']],
+        )
+        self.assertEqual(Cart.objects.get(user=fixture['user']).get_items(), {})
+
+
+class OrderAdminTests(QueryCountTestCase):
+
+    def test_changing_line_product_refreshes_snapshot(self):
+        fixture = create_orders(1, 2)
+        order = Order.objects.get()
+        item = order.items.order_by('id').first()
+        other = next(product for product in fixture['products'] if product.id != item.product_id)
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'senha')
+        self.client.force_login(admin)
+
+        data = {
+            **{field: getattr(order, field) for field in ORDER_DATA},
+            'user': fixture['user'].id,
+            'items-TOTAL_FORMS': 2, 'items-INITIAL_FORMS': 2,
+            'items-MIN_NUM_FORMS': 0, 'items-MAX_NUM_FORMS': 1000,
+        }
+        for index, line in enumerate(order.items.order_by('id')):
+            data.update({
+                f'items-{index}-id': line.id, f'items-{index}-order': order.id,
+                f'items-{index}-product': other.id if line == item else line.product_id,
+                f'items-{index}-price': line.price, f'items-{index}-quantity': line.quantity,
+            })
+        response = self.client.post(f'/admin/orders/order/{order.id}/change/', data)
+
+        self.assertEqual(response.status_code, 302)
+        item.refresh_from_db()
+        self.assertEqual((item.product_name, item.product_slug), (other.name, other.slug))
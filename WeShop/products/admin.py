@@ -1,18 +1,27 @@
 from django.contrib import admin
 
+from WeShop.pagination import ApproximateCountPaginator
+
 from .models import Category, Product
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ['name', 'slug']
     prepopulated_fields = {'slug': ('name',)}
+    search_fields = ['name']
 
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ['name', 'slug', 'price',
+    list_display = ['name', 'slug', 'category', 'price',
                     'available', 'created', 
                     'updated', 'image']
-    list_filter = ['available', 'created', 'updated']
+    list_select_related = ['category']
+    list_filter = ['available', 'created']
     list_editable = ['price', 'available']
-    prepopulated_fields = {'slug': ('name',)}
\ No newline at end of file
+    prepopulated_fields = {'slug': ('name',)}
+    search_fields = ['name', 'slug']
+    autocomplete_fields = ['category', 'user']
+    date_hierarchy = 'created'
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
@@ -0,0 +1,68 @@
+from .serializer import CategorySerializer, ProductSerializer, ProductListSerializer
+from .pagination import ProductCursorPagination
+from .filters import FilterError, ProductFilter
+from .cache import acache_catalogue_response
+from .views import product_lookup, product_page, product_rows
+from products.models import Product, Category
+from WeShop.async_views import AsyncAPIView
+from WeShop.responses import JSONResponse
+from WeShop.streaming import aserialize_rows, stream_json_array, stream_requested
+
+from asgiref.sync import sync_to_async
+
+from rest_framework.request import Request
+from rest_framework import status
+
+class AsyncCategoryListAPI(AsyncAPIView):
+    """
+    Async version of CategoryListAPI.
+    """
+
+    @acache_catalogue_response
+    async def get(self, request):
+        queryset = Category.objects.all()
+        if stream_requested(request):
+            return stream_json_array(aserialize_rows(queryset, CategorySerializer))
+        serializer = CategorySerializer()
+        return JSONResponse([serializer.to_representation(category) async for category in queryset])
+
+class AsyncProductsListAPI(AsyncAPIView):
+    """
+    Async version of ProductsListAPI, accepting the same filters and cursors.
+    """
+    pagination_class = ProductCursorPagination
+
+    @acache_catalogue_response
+    async def get(self, request):
+        try:
+            filters = ProductFilter(request.GET)
+        except FilterError as e:
+            return JSONResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if stream_requested(request):
+            return stream_json_array(aserialize_rows(product_rows(filters), ProductListSerializer))
+
+        # DRF's cursor paginator decodes the cursor and reads the page in one
+        # synchronous call, so the page is built in the thread used by the async ORM
+        data = await sync_to_async(product_page)(self, Request(request), filters)
+        if data is None:
+            return JSONResponse({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+        return JSONResponse(data)
+
+class AsyncProductAPI(AsyncAPIView):
+    """
+    Async version of ProductAPI.get. Writes stay on the sync ProductAPI.
+    """
+
+    async def get(self, request):
+        try:
+            lookup = product_lookup(request.GET)
+        except ValueError as e:
+            return JSONResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            product = await Product.objects.aget(**lookup)
+        except Product.DoesNotExist:
+            return JSONResponse({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+        return JSONResponse(ProductSerializer(product).data)
@@ -0,0 +1,173 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from products.api.cache import bump_catalogue_version
+from products.models import Category, Product
+from products.prices import invalidate_prices
+from products.search import get_search_backend
+from products.signals import bulk_change
+
+from .serializer import (
+    ProductBatchCreateSerializer,
+    ProductBatchDeleteSerializer,
+    ProductBatchUpdateSerializer,
+    ProductSerializer,
+)
+
+ACTIONS = ('create', 'update', 'delete')
+
+
+def max_batch_size():
+    return getattr(settings, 'PRODUCTS_BATCH_MAX_SIZE', 1000)
+
+
+class ProductBatch:
+    """
+    Create, update and delete many products of one user in a single transaction.
+
+    The batch is applied only if every item is valid. Categories and products
+    are each fetched with one query for the whole batch, products are written
+    with bulk_create/bulk_update, and ``results`` holds the outcome of every
+    item under its action, in request order:
+
+        {'create': [{'index': 0, 'status': 201, 'product': {...}}],
+         'update': [{'index': 0, 'status': 404, 'error': 'Product not found.'}],
+         'delete': [{'index': 0, 'status': 424, 'error': '...'}]}
+    """
+
+    serializers = {
+        'create': ProductBatchCreateSerializer,
+        'update': ProductBatchUpdateSerializer,
+        'delete': ProductBatchDeleteSerializer,
+    }
+
+    def __init__(self, user, data):
+        self.user = user
+        self.items = {action: data.get(action) or [] for action in ACTIONS}
+        self.results = {action: [None] * len(self.items[action]) for action in ACTIONS}
+        self.valid = True
+
+    def fail(self, action, index, status, error):
+        result = {'index': index, 'status': status}
+        result['errors' if isinstance(error, dict) else 'error'] = error
+        self.results[action][index] = result
+        self.valid = False
+
+    @transaction.atomic
+    def run(self):
+        """
+        Validate and apply the batch. Returns whether it was applied.
+        """
+        if self.validate():
+            self.apply()
+            return True
+        for action in ACTIONS:
+            for index, result in enumerate(self.results[action]):
+                if result is None:
+                    self.results[action][index] = {
+                        'index': index,
+                        'status': 424,
+                        'error': 'Not applied because other items of the batch are invalid.',
+                    }
+        return False
+
+    def validate(self):
+        self.data = {action: {} for action in ACTIONS}
+        for action in ACTIONS:
+            for index, item in enumerate(self.items[action]):
+                serializer = self.serializers[action](data=item)
+                if serializer.is_valid():
+                    self.data[action][index] = serializer.validated_data
+                else:
+                    self.fail(action, index, 400, serializer.errors)
+
+        # Slugs come from the names; two new products must not end up with the same one
+        slugs = set()
+        for index, data in self.data['create'].items():
+            if data['slug'] in slugs:
+                self.fail('create', index, 400, {
+                    'name': [f'Another product of the batch has the slug "{data["slug"]}".']
+                })
+            slugs.add(data['slug'])
+
+        # Every category of the batch in one query
+        category_ids = {
+            data['category']
+            for action in ('create', 'update')
+            for data in self.data[action].values()
+            if 'category' in data
+        }
+        if category_ids:
+            existing = set(Category.objects.filter(id__in=category_ids).values_list('id', flat=True))
+            for action in ('create', 'update'):
+                for index, data in self.data[action].items():
+                    if 'category' in data and data['category'] not in existing:
+                        self.fail(action, index, 400, {
+                            'category': [f'Invalid pk "{data["category"]}" - object does not exist.']
+                        })
+
+        # Every product to change in one query, locked until the batch is applied
+        product_ids = [data['id'] for action in ('update', 'delete') for data in self.data[action].values()]
+        self.products = Product.objects.select_for_update().in_bulk(product_ids) if product_ids else {}
+        seen = set()
+        for action in ('update', 'delete'):
+            for index, data in self.data[action].items():
+                product = self.products.get(data['id'])
+                if product is None or product.slug != data['slug']:
+                    self.fail(action, index, 404, 'Product not found.')
+                elif product.user_id != self.user.id:
+                    self.fail(action, index, 403, f'You must be the owner of the product to {action} it.')
+                elif product.pk in seen:
+                    self.fail(action, index, 400, 'The product appears more than once in the batch.')
+                seen.add(data['id'])
+        return self.valid
+
+    def apply(self):
+        created = [
+            Product(
+                user=self.user,
+                category_id=data['category'],
+                **{field: value for field, value in data.items() if field != 'category'},
+            )
+            for data in self.data['create'].values()
+        ]
+        Product.objects.bulk_create(created)
+
+        # bulk_update does not touch auto_now fields, so set updated here
+        now = timezone.now()
+        updated, fields = [], {'updated'}
+        for data in self.data['update'].values():
+            product = self.products[data['id']]
+            for field, value in data.items():
+                if field in ('id', 'slug'):
+                    continue
+                setattr(product, 'category_id' if field == 'category' else field, value)
+                fields.add(field)
+            product.updated = now
+            updated.append(product)
+        if updated:
+            Product.objects.bulk_update(updated, sorted(fields))
+
+        deleted_ids = [data['id'] for data in self.data['delete'].values()]
+        if deleted_ids:
+            # The per-product delete signals would each run their own queries
+            with bulk_change():
+                Product.objects.filter(id__in=deleted_ids).delete()
+
+        # bulk_create and bulk_update send no signals, see products/signals.py
+        search = get_search_backend()
+        if all(product.pk for product in created):
+            search.index(created + updated)
+        else:
+            search.rebuild()
+        search.remove(deleted_ids)
+        invalidate_prices([product.pk for product in updated] + deleted_ids)
+        bump_catalogue_version()
+
+        for index, product in zip(self.data['create'], created):
+            self.results['create'][index] = {'index': index, 'status': 201, 'product': ProductSerializer(product).data}
+        for index, product in zip(self.data['update'], updated):
+            self.results['update'][index] = {'index': index, 'status': 200, 'product': ProductSerializer(product).data}
+        for index in self.data['delete']:
+            self.results['delete'][index] = {'index': index, 'status': 204}
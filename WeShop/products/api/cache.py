@@ -0,0 +1,180 @@
+"""
+Cached catalogue responses, invalidated by a version that the product and
+category signals move forward (see products/signals.py).
+
+The version and the entries live in the CATALOGUE_CACHE['BACKEND'] cache.
+With several workers this must be a shared cache (Redis, Memcached,
+database): Django's default LocMemCache is per process, so a change made
+through one worker would leave the others serving the old catalogue until
+their entries expire.
+"""
+
+import hashlib
+import time
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from rest_framework.response import Response
+
+from WeShop.responses import JSONResponse
+from monitoring.metrics import count_cache
+
+DEFAULTS = {
+    'BACKEND': 'default',  # CACHES alias; must be a shared backend when running several workers
+    'TIMEOUT': 60,
+    'KEY_PREFIX': 'catalogue',
+}
+
+
+def get_config():
+    config = DEFAULTS.copy()
+    config.update(getattr(settings, 'CATALOGUE_CACHE', {}))
+    return config
+
+
+def _cache():
+    return caches[get_config()['BACKEND']]
+
+
+def _version_key():
+    return f"{get_config()['KEY_PREFIX']}:version"
+
+
+def get_catalogue_version():
+    """
+    Return the timestamp of the last catalogue change known to the cache,
+    or of the first request after the cache was emptied.
+    """
+    cache = _cache()
+    version = cache.get(_version_key())
+    if version is None:
+        version = time.time()
+        cache.add(_version_key(), version, None)
+        version = cache.get(_version_key(), version)
+    return version
+
+
+async def aget_catalogue_version():
+    """
+    Async version of get_catalogue_version, for async views.
+    """
+    cache = _cache()
+    version = await cache.aget(_version_key())
+    if version is None:
+        version = time.time()
+        await cache.aadd(_version_key(), version, None)
+        version = await cache.aget(_version_key(), version)
+    return version
+
+
+def bump_catalogue_version():
+    """
+    Invalidate every cached catalogue response.
+
+    Entries are keyed on the version, so moving it forward orphans all of them
+    at once; they expire on their own after CATALOGUE_CACHE['TIMEOUT'].
+    """
+    _cache().set(_version_key(), time.time(), None)
+
+
+def response_cache_key(request, version):
+    """
+    Key of the response to ``request``. The format of the renderer picked
+    from the Accept header is part of it, so every representation gets its
+    own ETag; async views only render JSON.
+    """
+    query = urlencode(sorted(request.GET.lists()), doseq=True)
+    renderer = getattr(request, 'accepted_renderer', None)
+    renderer_format = renderer.format if renderer is not None else 'json'
+    digest = hashlib.sha1(f'{renderer_format}:{request.get_host()}{request.path}?{query}'.encode()).hexdigest()
+    return f"{get_config()['KEY_PREFIX']}:{version}:{digest}"
+
+
+def _conditional_headers(entry):
+    return {
+        'ETag': entry['etag'],
+        'Last-Modified': http_date(entry['last_modified']),
+        'Cache-Control': 'public, max-age=0, must-revalidate',
+        'Vary': 'Accept',
+    }
+
+
+def cache_catalogue_response(view_method):
+    """
+    Cache the data of successful catalogue GET responses.
+
+    Responses carry an ETag and a Last-Modified header derived from the
+    catalogue version, so a miss costs no query besides the view's own, and
+    conditional requests are answered with 304 when the client copy is still
+    current.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        version = get_catalogue_version()
+        key = response_cache_key(request, version)
+        cache = _cache()
+        entry = cache.get(key)
+        count_cache('catalogue', entry is not None, entry is None)
+
+        if entry is None:
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code != 200 or response.streaming:
+                return response
+            entry = _entry(key, version, response.data)
+            cache.set(key, entry, get_config()['TIMEOUT'])
+
+        return _not_modified(request, entry) or Response(entry['data'], headers=_conditional_headers(entry))
+
+    return wrapper
+
+
+def acache_catalogue_response(view_method):
+    """
+    Async version of cache_catalogue_response, for views returning JSONResponse.
+    """
+    @wraps(view_method)
+    async def wrapper(self, request, *args, **kwargs):
+        version = await aget_catalogue_version()
+        key = response_cache_key(request, version)
+        cache = _cache()
+        entry = await cache.aget(key)
+        count_cache('catalogue', entry is not None, entry is None)
+
+        if entry is None:
+            response = await view_method(self, request, *args, **kwargs)
+            if response.status_code != 200 or response.streaming:
+                return response
+            entry = _entry(key, version, response.data)
+            await cache.aset(key, entry, get_config()['TIMEOUT'])
+
+        return _not_modified(request, entry) or JSONResponse(entry['data'], headers=_conditional_headers(entry))
+
+    return wrapper
+
+
+def _entry(key, version, data):
+    return {
+        'data': data,
+        'etag': quote_etag(hashlib.sha1(key.encode()).hexdigest()[:32]),
+        'last_modified': int(version),
+    }
+
+
+def _not_modified(request, entry):
+    """
+    A 304 response when the client copy is still current, else None.
+    """
+    not_modified = get_conditional_response(
+        request,
+        etag=entry['etag'],
+        last_modified=entry['last_modified'],
+    )
+    if not_modified is not None:
+        for header, value in _conditional_headers(entry).items():
+            not_modified.headers[header] = value
+    return not_modified
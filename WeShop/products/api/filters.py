@@ -0,0 +1,198 @@
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db.models import Case, Count, IntegerField, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from products.models import Product
+
+
+class FilterError(ValueError):
+    pass
+
+
+def parse_bool(value):
+    value = value.lower()
+    if value in ('true', '1'):
+        return indexed_bool(True)
+    if value in ('false', '0'):
+        return indexed_bool(False)
+    raise ValueError(value)
+
+
+def indexed_bool(value):
+    # A plain True makes Django write "WHERE available" on SQLite, which cannot
+    # use the composite indexes; comparing to a Value writes "available = %s".
+    return Value(value)
+
+
+def parse_decimal(value):
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ValueError(value)
+
+
+def parse_aware_datetime(value):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(value)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class ProductFilter:
+    """
+    Declarative filters and orderings for product listings.
+
+    A request combines equality filters, at most one range filter and an
+    ordering. A combination is accepted only when one of ``indexes`` starts
+    with exactly the equality columns, followed by the ordering column, and
+    the range filter (if any) is on that same column. Such a query is served
+    by a single index range scan, whatever the catalogue size.
+    """
+
+    # query parameter: (indexed column, lookup, parser)
+    equality_filters = {
+        'category_slug': ('category', 'category__slug', str),
+        'available': ('available', 'available', parse_bool),
+        'user': ('user', 'user_id', int),
+    }
+    range_filters = {
+        'min_price': ('price', 'price__gte', parse_decimal),
+        'max_price': ('price', 'price__lte', parse_decimal),
+        'created_after': ('created', 'created__gte', parse_aware_datetime),
+        'created_before': ('created', 'created__lte', parse_aware_datetime),
+    }
+    # ordering value: column it sorts on
+    orderings = {
+        'name': 'name',
+        'price': 'price',
+        '-price': 'price',
+        '-created': 'created',
+    }
+    # Parameters of the listing that are not filters; any other one is rejected,
+    # so a misspelt filter fails instead of being ignored
+    other_params = {'ordering', 'cursor', 'page_size', 'facets', 'stream', 'format'}
+    # Preferred ordering when none is given: sort on the range column, or by
+    # name; the first indexed ordering is used when that one is not
+    default_orderings = {
+        'price': 'price',
+        'created': '-created',
+        None: 'name',
+    }
+    # Columns of the indexes declared on Product.Meta.indexes
+    indexes = [
+        tuple(field.lstrip('-') for field in index.fields)
+        for index in Product._meta.indexes
+    ]
+
+    def __init__(self, query_params):
+        known = self.other_params.union(self.equality_filters, self.range_filters)
+        unknown = sorted(param for param in query_params if param not in known)
+        if unknown:
+            raise FilterError(f'Unknown parameter "{unknown[0]}". Filters: {", ".join([*self.equality_filters, *self.range_filters])}.')
+
+        self.lookups = {'available': indexed_bool(True)}
+        self.columns = {'available'}
+        self.range_column = None
+
+        for param, (column, lookup, parse) in self.equality_filters.items():
+            if param in query_params:
+                self.lookups[lookup] = self._parse(param, parse, query_params[param])
+                self.columns.add(column)
+        self.category_slug = self.lookups.get('category__slug')
+
+        for param, (column, lookup, parse) in self.range_filters.items():
+            if param in query_params:
+                if self.range_column not in (None, column):
+                    raise FilterError('Only one of price or created date can be filtered by range.')
+                self.lookups[lookup] = self._parse(param, parse, query_params[param])
+                self.range_column = column
+
+        self.ordering = query_params.get('ordering') or self.default_ordering()
+        if self.ordering not in self.orderings:
+            raise FilterError(f'Invalid ordering. Choose one of: {", ".join(self.orderings)}.')
+        if not self.is_indexed(self.ordering):
+            supported = [ordering for ordering in self.orderings if self.is_indexed(ordering)]
+            raise FilterError(
+                'This combination of filters and ordering is not supported. '
+                f'Supported orderings for these filters: {", ".join(supported) or "none"}.'
+            )
+
+    def default_ordering(self):
+        preferred = self.default_orderings[self.range_column]
+        if self.is_indexed(preferred):
+            return preferred
+        supported = [ordering for ordering in self.orderings if self.is_indexed(ordering)]
+        return supported[0] if supported else preferred
+
+    def _parse(self, param, parse, value):
+        try:
+            return parse(value)
+        except (TypeError, ValueError):
+            raise FilterError(f'Invalid value for "{param}".')
+
+    def is_indexed(self, ordering):
+        column = self.orderings[ordering]
+        if self.range_column not in (None, column):
+            return False
+        size = len(self.columns)
+        return any(
+            len(index) > size and set(index[:size]) == self.columns and index[size] == column
+            for index in self.indexes
+        )
+
+    def filter(self, queryset):
+        return queryset.filter(**self.lookups)
+
+    def facets(self, queryset):
+        """
+        Count products per category and per price bucket with one aggregate query.
+
+        Category counts ignore the category filter, so clients can show how many
+        products the other categories would return; price buckets are counted
+        within the selected category.
+        """
+        return self._summarize_facets(self._facet_rows(queryset))
+
+    def _price_bounds(self):
+        return [Decimal(str(bound)) for bound in getattr(settings, 'PRODUCT_PRICE_BUCKETS', [50, 100, 200, 500])]
+
+    def _facet_rows(self, queryset):
+        lookups = {lookup: value for lookup, value in self.lookups.items() if lookup != 'category__slug'}
+        bounds = self._price_bounds()
+        bucket = Case(
+            *[When(price__lt=bound, then=Value(position)) for position, bound in enumerate(bounds)],
+            default=Value(len(bounds)),
+            output_field=IntegerField(),
+        )
+        return (
+            queryset.filter(**lookups)
+            .order_by()
+            .annotate(bucket=bucket)
+            .values('category__slug', 'category__name', 'bucket')
+            .annotate(count=Count('id'))
+        )
+
+    def _summarize_facets(self, rows):
+        bounds = self._price_bounds()
+        categories, prices = {}, [0] * (len(bounds) + 1)
+        for row in rows:
+            slug = row['category__slug']
+            entry = categories.setdefault(slug, {'slug': slug, 'name': row['category__name'], 'count': 0})
+            entry['count'] += row['count']
+            if self.category_slug is None or slug == self.category_slug:
+                prices[row['bucket']] += row['count']
+
+        edges = [None, *bounds, None]
+        return {
+            'categories': sorted(categories.values(), key=lambda entry: entry['name']),
+            'price': [
+                {'min': edges[position], 'max': edges[position + 1], 'count': count}
+                for position, count in enumerate(prices)
+            ],
+        }
+
@@ -0,0 +1,35 @@
+from django.conf import settings
+
+from rest_framework.pagination import CursorPagination
+
+
+class ProductCursorPagination(CursorPagination):
+    """
+    Keyset pagination for product listings.
+
+    Pages are fetched with ``WHERE <ordering field> > <position>`` instead of an
+    OFFSET, so deep pages cost the same as the first one. Only orderings backed
+    by an index on Product are accepted.
+    """
+
+    page_size = getattr(settings, 'PRODUCTS_PAGE_SIZE', 20)
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'PRODUCTS_MAX_PAGE_SIZE', 100)
+    ordering_query_param = 'ordering'
+
+    # Maps the public ordering value to the indexed columns it sorts on.
+    # The trailing id keeps the order stable between products sharing a name.
+    orderings = {
+        'name': ('name', 'id'),
+        'price': ('price', 'id'),
+        '-price': ('-price', '-id'),
+        '-created': ('-created', '-id'),
+    }
+    default_ordering = 'name'
+
+    def get_ordering(self, request, queryset, view):
+        # Views that validate the ordering themselves (see ProductFilter) pass it on
+        ordering = getattr(view, 'ordering', None) or request.query_params.get(
+            self.ordering_query_param, self.default_ordering
+        )
+        return self.orderings.get(ordering, self.orderings[self.default_ordering])
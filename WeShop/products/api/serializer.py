@@ -1,6 +1,20 @@
 from rest_framework import serializers
 from products.models import Category, Product
+from products.images import variant_urls
 from django.contrib.auth.models import User
+from django.utils.text import slugify
+
+class ImageVariantsField(serializers.Field):
+    """
+    URLs of the resized WebP copies of the product image, by variant name.
+    Empty until the background processing of a new image has finished.
+    """
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return variant_urls(value or {}, self.context.get('request'))
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -10,9 +24,89 @@ class CategorySerializer(serializers.ModelSerializer):
 class ProductSerializer(serializers.ModelSerializer):
     user = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
     category = serializers.PrimaryKeyRelatedField(queryset=Category.objects.all())  # Accept category ID for write operations
+    image_variants = ImageVariantsField()
     class Meta:
         model = Product
         fields = [
-            'id', 'name', 'slug', 'image', 'description', 'price', 
+            'id', 'name', 'slug', 'image', 'image_variants', 'description', 'price', 
             'available', 'created', 'updated', 'category', 'user'
         ]
+
+class ProductListSerializer(serializers.Serializer):
+    """
+    Read-only representation of a product for listings.
+
+    Produces the same output as ProductSerializer, but reads the foreign keys
+    straight from the row so rendering a page does no relational work.
+    """
+    id = serializers.IntegerField(read_only=True)
+    name = serializers.CharField(read_only=True)
+    slug = serializers.SlugField(read_only=True)
+    image = serializers.ImageField(read_only=True)
+    image_variants = ImageVariantsField()
+    description = serializers.CharField(read_only=True)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    available = serializers.BooleanField(read_only=True)
+    created = serializers.DateTimeField(read_only=True)
+    updated = serializers.DateTimeField(read_only=True)
+    category = serializers.IntegerField(source='category_id', read_only=True)
+    user = serializers.IntegerField(source='user_id', read_only=True)
+
+    # Columns loaded by listing queries, see Product.objects.only()
+    columns = [
+        'id', 'name', 'slug', 'image', 'image_variants', 'description', 'price',
+        'available', 'created', 'updated', 'category_id', 'user_id'
+    ]
+
+class ProductPageSerializer(serializers.Serializer):
+    """
+    Shape of a paginated product listing, used to document the list endpoints.
+    """
+    next = serializers.URLField(allow_null=True)
+    previous = serializers.URLField(allow_null=True)
+    results = ProductListSerializer(many=True)
+
+class ProductBatchCreateSerializer(serializers.ModelSerializer):
+    """
+    A product to create in a batch. The category is a plain ID, checked for
+    the whole batch at once instead of with one query per product. The slug
+    is generated from the name, like ProductAPI.post, and added to the
+    validated data.
+    """
+    category = serializers.IntegerField()
+    class Meta:
+        model = Product
+        fields = ['name', 'description', 'price', 'available', 'category']
+
+    def validate(self, attrs):
+        slug = slugify(attrs['name'])
+        if not slug:
+            raise serializers.ValidationError({'name': ['The name must contain letters or digits to generate a slug.']})
+        return {**attrs, 'slug': slug}
+
+class ProductBatchUpdateSerializer(serializers.ModelSerializer):
+    """
+    Changes to a product in a batch, identified by its ID and slug like ProductAPI.put.
+    """
+    id = serializers.IntegerField()
+    slug = serializers.SlugField()
+    category = serializers.IntegerField(required=False)
+    class Meta:
+        model = Product
+        fields = ['id', 'slug', 'name', 'description', 'price', 'available', 'category']
+        extra_kwargs = {
+            'name': {'required': False},
+            'price': {'required': False},
+        }
+
+class ProductBatchDeleteSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    slug = serializers.SlugField()
+
+class ProductBatchSerializer(serializers.Serializer):
+    """
+    Shape of a batch request, used to document the batch endpoint.
+    """
+    create = ProductBatchCreateSerializer(many=True, required=False)
+    update = ProductBatchUpdateSerializer(many=True, required=False)
+    delete = ProductBatchDeleteSerializer(many=True, required=False)
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import views, async_views
 
 app_name = 'products'
 
@@ -13,4 +13,21 @@ urlpatterns = [
     path("categories/",
          views.CategoryListAPI.as_view(),
          name = 'categories'),
+    path("search/",
+         views.ProductSearchAPI.as_view(),
+         name = 'search-products'),
+    path("batch/",
+         views.ProductBatchAPI.as_view(),
+         name = 'batch-products'),
+
+    # Async versions of the read endpoints, for ASGI deployments
+    path("async/api/",
+         async_views.AsyncProductAPI.as_view(),
+         name = 'async-api-products'),
+    path("async/list/",
+         async_views.AsyncProductsListAPI.as_view(),
+         name = 'async-list-products'),
+    path("async/categories/",
+         async_views.AsyncCategoryListAPI.as_view(),
+         name = 'async-categories'),
 ]
\ No newline at end of file
@@ -1,5 +1,11 @@
-from .serializer import CategorySerializer, ProductSerializer
+from .serializer import CategorySerializer, ProductSerializer, ProductListSerializer, ProductPageSerializer, ProductBatchSerializer
+from .batch import ACTIONS, ProductBatch, max_batch_size
+from .pagination import ProductCursorPagination
+from .filters import FilterError, ProductFilter
+from .cache import cache_catalogue_response
 from products.models import Product, Category
+from products.search import get_search_backend, search_terms
+from WeShop.streaming import serialize_rows, stream_json_array, wants_stream
 
 from django.utils.text import slugify
 
@@ -9,8 +15,8 @@ from django.contrib.auth.models import User
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.authtoken.models import Token
 from rest_framework.parsers import JSONParser
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
@@ -20,6 +26,15 @@ class CategoryListAPI(APIView):
     @swagger_auto_schema(
         operation_summary="Retrieve all categories",
         operation_description="Fetches and returns a list of all categories.",
+        manual_parameters=[
+            openapi.Parameter(
+                'stream',
+                openapi.IN_QUERY,
+                description="Stream the list instead of rendering it at once",
+                type=openapi.TYPE_BOOLEAN,
+                required=False
+            )
+        ],
         responses={
             200: openapi.Response(
                 description="List of categories",
@@ -27,16 +42,20 @@ class CategoryListAPI(APIView):
             )
         }
     )
+    @cache_catalogue_response
     def get(self, request):
         queryset =  Category.objects.all()
+        if wants_stream(request):
+            return stream_json_array(serialize_rows(queryset, CategorySerializer))
         serializer = CategorySerializer(queryset, many=True)
         return Response(serializer.data)
 
 class ProductsListAPI(APIView):
+    pagination_class = ProductCursorPagination
 
     @swagger_auto_schema(
         operation_summary="Retrieve a list of products",
-        operation_description="Fetches and returns a list of available products. Optionally filters by category if a category_slug is provided.",
+        operation_description="Fetches and returns a page of available products. Optionally filters by category, owner, availability, price range or creation date range. Use the `next` and `previous` links to navigate between pages. Only filter and ordering combinations backed by a database index are accepted: without `ordering`, a price range sorts by price, a date range by `-created` and other filters by name or, when no index supports it, by the first supported ordering; an unsupported combination returns 400 with the supported orderings.",
         manual_parameters=[
             openapi.Parameter(
                 'category_slug',
@@ -44,26 +63,220 @@ class ProductsListAPI(APIView):
                 description="Slug of the category to filter products",
                 type=openapi.TYPE_STRING,
                 required=False
+            ),
+            openapi.Parameter(
+                'cursor',
+                openapi.IN_QUERY,
+                description="Opaque pagination cursor taken from the `next` or `previous` links",
+                type=openapi.TYPE_STRING,
+                required=False
+            ),
+            openapi.Parameter(
+                'page_size',
+                openapi.IN_QUERY,
+                description="Number of products per page",
+                type=openapi.TYPE_INTEGER,
+                required=False
+            ),
+            openapi.Parameter(
+                'ordering',
+                openapi.IN_QUERY,
+                description="Sort order of the products",
+                type=openapi.TYPE_STRING,
+                enum=list(ProductFilter.orderings),
+                required=False
+            ),
+            openapi.Parameter(
+                'available',
+                openapi.IN_QUERY,
+                description="Filter on availability (default true)",
+                type=openapi.TYPE_BOOLEAN,
+                required=False
+            ),
+            openapi.Parameter(
+                'user',
+                openapi.IN_QUERY,
+                description="ID of the user who owns the products",
+                type=openapi.TYPE_INTEGER,
+                required=False
+            ),
+            openapi.Parameter(
+                'min_price',
+                openapi.IN_QUERY,
+                description="Minimum price, inclusive",
+                type=openapi.TYPE_NUMBER,
+                required=False
+            ),
+            openapi.Parameter(
+                'max_price',
+                openapi.IN_QUERY,
+                description="Maximum price, inclusive",
+                type=openapi.TYPE_NUMBER,
+                required=False
+            ),
+            openapi.Parameter(
+                'created_after',
+                openapi.IN_QUERY,
+                description="Only products created at or after this ISO 8601 date and time",
+                type=openapi.TYPE_STRING,
+                format=openapi.FORMAT_DATETIME,
+                required=False
+            ),
+            openapi.Parameter(
+                'created_before',
+                openapi.IN_QUERY,
+                description="Only products created at or before this ISO 8601 date and time",
+                type=openapi.TYPE_STRING,
+                format=openapi.FORMAT_DATETIME,
+                required=False
+            ),
+            openapi.Parameter(
+                'stream',
+                openapi.IN_QUERY,
+                description="Stream the whole list as a JSON array instead of one page",
+                type=openapi.TYPE_BOOLEAN,
+                required=False
+            ),
+            openapi.Parameter(
+                'facets',
+                openapi.IN_QUERY,
+                description="Add a `facets` object with product counts per category and per price range",
+                type=openapi.TYPE_BOOLEAN,
+                required=False
             )
         ],
         responses={
             200: openapi.Response(
-                description="List of products",
-                schema=ProductSerializer(many=True)
+                description="Page of products",
+                schema=ProductPageSerializer()
+            ),
+            400: openapi.Response(
+                description="Invalid filter value, unknown parameter or unsupported filter and ordering combination",
+                examples={
+                    "application/json": {
+                        "error": 'Invalid value for "min_price".'
+                    }
+                }
             ),
             404: openapi.Response(description="Category not found")
         }
     )
+    @cache_catalogue_response
     def get(self, request):
-        category_slug = request.query_params.get('category_slug', None)
-        if category_slug:
-            category = get_object_or_404(Category, slug=category_slug)
-            products = Product.objects.filter(category=category, available=True)
-        else:
-            products = Product.objects.filter(available=True)
+        try:
+            filters = ProductFilter(request.query_params)
+        except FilterError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        serializer = ProductSerializer(products, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        if wants_stream(request):
+            # Every matching product as a plain array, read in chunks
+            return stream_json_array(serialize_rows(product_rows(filters), ProductListSerializer))
+
+        data = product_page(self, request, filters)
+        if data is None:
+            return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(data)
+
+class ProductSearchAPI(APIView):
+    page_size = ProductCursorPagination.page_size
+    max_page_size = ProductCursorPagination.max_page_size
+
+    @swagger_auto_schema(
+        operation_summary="Search products",
+        operation_description="Full-text search over product names and descriptions, best matches first. Every word of the query must match, and words also match as prefixes.",
+        manual_parameters=[
+            openapi.Parameter(
+                'q',
+                openapi.IN_QUERY,
+                description="Search query",
+                type=openapi.TYPE_STRING,
+                required=True
+            ),
+            openapi.Parameter(
+                'category_slug',
+                openapi.IN_QUERY,
+                description="Slug of the category to filter products",
+                type=openapi.TYPE_STRING,
+                required=False
+            ),
+            openapi.Parameter(
+                'available',
+                openapi.IN_QUERY,
+                description="Filter on availability: true (default), false or any",
+                type=openapi.TYPE_STRING,
+                enum=['true', 'false', 'any'],
+                required=False
+            ),
+            openapi.Parameter(
+                'page',
+                openapi.IN_QUERY,
+                description="Page number, starting at 1",
+                type=openapi.TYPE_INTEGER,
+                required=False
+            ),
+            openapi.Parameter(
+                'page_size',
+                openapi.IN_QUERY,
+                description="Number of products per page",
+                type=openapi.TYPE_INTEGER,
+                required=False
+            )
+        ],
+        responses={
+            200: openapi.Response(
+                description="Page of matching products",
+                schema=ProductPageSerializer()
+            ),
+            400: openapi.Response(
+                description="Missing or invalid query parameters",
+                examples={
+                    "application/json": {
+                        "error": 'The "q" query parameter is required.'
+                    }
+                }
+            )
+        }
+    )
+    @cache_catalogue_response
+    def get(self, request):
+        query = request.query_params.get('q', '')
+        if not search_terms(query):
+            return Response({'error': 'The "q" query parameter is required.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        available = {'true': True, 'false': False, 'any': None}.get(
+            request.query_params.get('available', 'true').lower(), True
+        )
+        try:
+            page = max(int(request.query_params.get('page', 1)), 1)
+            page_size = min(max(int(request.query_params.get('page_size', self.page_size)), 1), self.max_page_size)
+        except ValueError:
+            return Response({'error': '"page" and "page_size" must be integers.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Fetch one extra id to know whether there is a next page
+        ids = get_search_backend().search(
+            query,
+            category_slug=request.query_params.get('category_slug') or None,
+            available=available,
+            offset=(page - 1) * page_size,
+            limit=page_size + 1,
+        )
+        has_next = len(ids) > page_size
+        ids = ids[:page_size]
+        products = Product.objects.only(*ProductListSerializer.columns).in_bulk(ids)
+        serializer = ProductListSerializer([products[id] for id in ids if id in products], many=True)
+
+        url = request.build_absolute_uri()
+        if page > 2:
+            previous = replace_query_param(url, 'page', page - 1)
+        elif page == 2:
+            previous = remove_query_param(url, 'page')
+        else:
+            previous = None
+        return Response({
+            'next': replace_query_param(url, 'page', page + 1) if has_next else None,
+            'previous': previous,
+            'results': serializer.data,
+        }, status=status.HTTP_200_OK)
 
 class ProductAPI(APIView):
 
@@ -105,26 +318,14 @@ class ProductAPI(APIView):
     )
     def get(self, request):
         try:
-            # Extract query parameters
-            product_id = request.query_params.get('id')
-            product_slug = request.query_params.get('slug')
-
-            # Validate the query parameters
-            if not product_id or not product_slug:
-                return Response(
-                    {'error': 'Both "id" and "slug" are required as query parameters.'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+            lookup = product_lookup(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Fetch the product based on id and slug
-            product = get_object_or_404(Product, id=product_id, slug=product_slug, available=True)
-
-            # Serialize the product
-            serializer = ProductSerializer(product)
-            return Response(serializer.data, status=status.HTTP_200_OK)
-
-        except Exception as e:
-            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        # Raised outside a try block so a missing product gives 404, not 500
+        product = get_object_or_404(Product, **lookup)
+        serializer = ProductSerializer(product)
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
     
     @swagger_auto_schema(
@@ -145,12 +346,8 @@ class ProductAPI(APIView):
         }
     )
     def post(self, request):
-        try:
-            # Extract the token from the Authorization header
-            token = request.META.get('HTTP_AUTHORIZATION').split(' ')[1]
-            token_obj = Token.objects.get(key=token)
-            user = token_obj.user
-        except (Token.DoesNotExist, IndexError):
+        user = request.user
+        if not user.is_authenticated:
             return Response({'error': 'Invalid or missing token.'}, status=status.HTTP_401_UNAUTHORIZED)
 
         # Parse and validate product data
@@ -227,12 +424,8 @@ class ProductAPI(APIView):
     }
 )
     def put(self, request):
-        try:
-            # Extract the token from the Authorization header
-            token = request.META.get('HTTP_AUTHORIZATION').split(' ')[1]
-            token_obj = Token.objects.get(key=token)
-            user = token_obj.user
-        except (Token.DoesNotExist, IndexError):
+        user = request.user
+        if not user.is_authenticated:
             return Response({'error': 'Invalid or missing token.'}, status=status.HTTP_401_UNAUTHORIZED)
 
         try:
@@ -251,7 +444,7 @@ class ProductAPI(APIView):
             product = get_object_or_404(Product, id=product_id, slug=product_slug)
 
             # Check if the user is the owner of the product
-            if product.user == user:
+            if product.user_id == user.id:
                 # Update the product information
                 serializer = ProductSerializer(product, data=request.data, partial=True)
                 if serializer.is_valid():
@@ -292,12 +485,8 @@ class ProductAPI(APIView):
         }
     )
     def delete(self, request):
-        try:
-            # Extract the token from the Authorization header
-            token = request.META.get('HTTP_AUTHORIZATION').split(' ')[1]
-            token_obj = Token.objects.get(key=token)
-            user = token_obj.user
-        except (Token.DoesNotExist, IndexError):
+        user = request.user
+        if not user.is_authenticated:
             return Response({'error': 'Invalid or missing token.'}, status=status.HTTP_401_UNAUTHORIZED)
 
         try:
@@ -305,11 +494,110 @@ class ProductAPI(APIView):
             product_id = data.get('id')
             product_slug = data.get('slug')
             product = get_object_or_404(Product, id=product_id , slug=product_slug)
-            if product.user == user:
+            if product.user_id == user.id:
                 # Delete the product
                 product.delete()
                 return Response({'message': 'Product deleted successfully.'}, status=status.HTTP_204_NO_CONTENT)
             else:
                 return Response({'error': 'You must be the owner of the product to delete it.'}, status=status.HTTP_403_FORBIDDEN)
         except Exception as e:
-            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class ProductBatchAPI(APIView):
+
+    @swagger_auto_schema(
+        operation_summary="Create, update and delete products in a batch",
+        operation_description="Applies arrays of create, update and delete operations on the authenticated user's products in a single transaction. Updates and deletes identify products by `id` and `slug`, like the single-product endpoints. The batch is applied only if every item is valid; the response lists the result of each item under its operation, in request order, with the status it would have had as a single request (424 for valid items of a rejected batch).",
+        request_body=ProductBatchSerializer,
+        responses={
+            200: openapi.Response(
+                description="Batch applied",
+                examples={
+                    "application/json": {
+                        "create": [{"index": 0, "status": 201, "product": {"id": 12, "name": "Camisa"}}],
+                        "update": [{"index": 0, "status": 200, "product": {"id": 7, "price": "59.90"}}],
+                        "delete": [{"index": 0, "status": 204}]
+                    }
+                }
+            ),
+            400: openapi.Response(
+                description="Invalid request or batch not applied because some items are invalid",
+                examples={
+                    "application/json": {
+                        "create": [],
+                        "update": [{"index": 0, "status": 403, "error": "You must be the owner of the product to update it."}],
+                        "delete": [{"index": 0, "status": 424, "error": "Not applied because other items of the batch are invalid."}]
+                    }
+                }
+            ),
+            401: openapi.Response(description="Invalid or missing token")
+        }
+    )
+    def post(self, request):
+        user = request.user
+        if not user.is_authenticated:
+            return Response({'error': 'Invalid or missing token.'}, status=status.HTTP_401_UNAUTHORIZED)
+
+        data = request.data
+        if not isinstance(data, dict) or not any(isinstance(data.get(action), list) for action in ACTIONS):
+            return Response({'error': 'Expected "create", "update" or "delete" arrays.'}, status=status.HTTP_400_BAD_REQUEST)
+        if any(data.get(action) is not None and not isinstance(data.get(action), list) for action in ACTIONS):
+            return Response({'error': '"create", "update" and "delete" must be arrays.'}, status=status.HTTP_400_BAD_REQUEST)
+        if sum(len(data.get(action) or []) for action in ACTIONS) > max_batch_size():
+            return Response({'error': f'A batch can hold at most {max_batch_size()} items.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        batch = ProductBatch(user, data)
+        applied = batch.run()
+        return Response(batch.results, status=status.HTTP_200_OK if applied else status.HTTP_400_BAD_REQUEST)
+
+
+def product_queryset(filters):
+    """
+    Products matching the list filters, reading only the listed columns.
+    The category is filtered through the join so its lookup costs no extra query.
+    """
+    return filters.filter(Product.objects.only(*ProductListSerializer.columns))
+
+
+def product_rows(filters):
+    """
+    Every product matching the list filters, in the validated ordering, for streaming.
+    """
+    ordering = ProductCursorPagination.orderings[filters.ordering]
+    return product_queryset(filters).order_by(*ordering)
+
+
+def product_page(view, request, filters):
+    """
+    Data of a page of ProductsListAPI or its async version, or None when the
+    filtered category does not exist.
+    """
+    # The paginator sorts on the ordering validated by the filters
+    view.ordering = filters.ordering
+    paginator = view.pagination_class()
+    page = paginator.paginate_queryset(product_queryset(filters), request, view=view)
+
+    # An empty page is ambiguous: only then check whether the category exists
+    category_slug = filters.category_slug
+    if category_slug and not page and not Category.objects.filter(slug=category_slug).exists():
+        return None
+
+    serializer = ProductListSerializer(page, many=True)
+    data = paginator.get_paginated_response(serializer.data).data
+    if request.query_params.get('facets', '').lower() in ('true', '1'):
+        data['facets'] = filters.facets(Product.objects.all())
+    return data
+
+
+def product_lookup(params):
+    """
+    Lookup of ProductAPI.get and its async version from the query parameters.
+    Raises ValueError when "id" or "slug" is missing or invalid.
+    """
+    product_id = params.get('id')
+    product_slug = params.get('slug')
+    if not product_id or not product_slug:
+        raise ValueError('Both "id" and "slug" are required as query parameters.')
+    if not product_id.isdigit():
+        raise ValueError('"id" must be an integer.')
+    return {'id': product_id, 'slug': product_slug, 'available': True}
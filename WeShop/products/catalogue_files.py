@@ -0,0 +1,72 @@
+"""
+Reading and writing product catalogue files, one product per CSV row or JSON line.
+
+Both formats use the same fields, so an exported file can be imported again:
+
+    name, slug, category (slug), description, price, available
+"""
+
+import csv
+import json
+import os
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+FIELDS = ['name', 'slug', 'category', 'description', 'price', 'available']
+FORMATS = {
+    '.csv': 'csv',
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+}
+
+
+def detect_format(path, format=None):
+    if format:
+        return format
+    extension = os.path.splitext(path)[1].lower()
+    try:
+        return FORMATS[extension]
+    except KeyError:
+        raise ValueError(f'Cannot tell the format of {path}, use --format csv or jsonl.')
+
+
+def read_rows(file, format):
+    """
+    Yield (line number, row dict) for each product in an open text file.
+    Lines are read one at a time, so memory use does not depend on the file size.
+    """
+    if format == 'csv':
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            raise ValueError(f'Line {number} is not valid JSON.')
+        if not isinstance(row, dict):
+            raise ValueError(f'Line {number} is not a JSON object.')
+        yield number, row
+
+
+class RowWriter:
+    """
+    Write product dicts with the FIELDS keys to an open text file.
+    """
+
+    def __init__(self, file, format):
+        self.file = file
+        self.format = format
+        if format == 'csv':
+            self.writer = csv.DictWriter(file, fieldnames=FIELDS, extrasaction='ignore')
+            self.writer.writeheader()
+
+    def write(self, row):
+        if self.format == 'csv':
+            self.writer.writerow(row)
+        else:
+            self.file.write(json.dumps({field: row[field] for field in FIELDS}, cls=DjangoJSONEncoder))
+            self.file.write('\n')
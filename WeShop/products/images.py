@@ -0,0 +1,208 @@
+"""
+Resized, EXIF-free WebP variants of product images.
+
+When a product is saved with a new image, the original is decoded and
+resized in a background thread pool after the transaction commits, so the
+request only pays for storing the upload. Each variant is stored under a
+name derived from the hash of its content, which makes identical images
+share a file and lets the URLs be cached forever.
+
+Product.image_variants records the result:
+
+    {'source': 'products/2024/05/01/shirt.jpg',
+     'thumbnail': 'products/variants/3f/3fa9....webp',
+     'medium': 'products/variants/81/81c0....webp'}
+
+With ContentAddressedStorage (WeShop/storage.py) the storage picks the
+names itself, in the same hash-based layout.
+
+The original upload is served too (Product.image), so it is re-encoded
+without its metadata before it is stored (see strip_metadata): EXIF can
+carry the GPS position and the camera of whoever took the photo.
+"""
+
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from threading import Lock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import ExifTags, Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'VARIANTS': {
+        'thumbnail': (200, 200),
+        'medium': (800, 800),
+    },
+    'FORMAT': 'WEBP',
+    'QUALITY': 80,
+    'UPLOAD_TO': 'products/variants',
+    'WORKERS': 2,
+    'SYNC': False,  # process in the saving thread, e.g. for tests or scripts
+}
+
+_executor = None
+_executor_lock = Lock()
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'PRODUCT_IMAGES', {})}
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=get_config()['WORKERS'],
+                thread_name_prefix='product-images',
+            )
+        return _executor
+
+
+def render_variant(image, size, config):
+    """
+    Return the encoded bytes of ``image`` shrunk to fit in ``size``.
+    The image is re-encoded from pixels only, so no EXIF or other metadata survives.
+    """
+    variant = image.copy()
+    variant.thumbnail(size, Image.LANCZOS)
+    output = BytesIO()
+    variant.save(output, format=config['FORMAT'], quality=config['QUALITY'])
+    return output.getvalue()
+
+
+def strip_metadata(upload):
+    """
+    Return a copy of the uploaded image without EXIF, XMP or text metadata,
+    in its original format. The EXIF orientation is applied to the pixels
+    first, so the photo still shows the right way up; the colour profile is
+    kept, and so are the frames of an animation.
+    """
+    upload.seek(0)
+    image = Image.open(upload)
+    image_format = image.format
+    if image_format == 'MPO':
+        # Phone photos with a preview or depth image: keep the main picture
+        image_format = 'JPEG'
+
+    options = {}
+    if image_format != 'JPEG' and getattr(image, 'n_frames', 1) > 1:
+        options['save_all'] = True
+        options.update({key: image.info[key] for key in ('duration', 'loop') if key in image.info})
+    elif image.getexif().get(ExifTags.Base.Orientation, 1) != 1:
+        image = ImageOps.exif_transpose(image)
+    elif image_format == 'JPEG':
+        # The pixels are untouched, so reuse the quantisation tables: no quality loss
+        options['quality'] = 'keep'
+    if image_format == 'JPEG':
+        options.setdefault('quality', 95)
+    if image.info.get('icc_profile'):
+        options['icc_profile'] = image.info['icc_profile']
+
+    output = BytesIO()
+    image.save(output, format=image_format, **options)
+    return ContentFile(output.getvalue(), name=upload.name)
+
+
+def store_variant(content, config):
+    """
+    Store variant bytes under their SHA-256 and return the storage name.
+    An existing file with the same name already holds the same bytes. Storages
+    that pick their own names, such as ContentAddressedStorage, are honoured.
+    """
+    digest = hashlib.sha256(content).hexdigest()
+    extension = config['FORMAT'].lower()
+    name = f"{config['UPLOAD_TO']}/{digest[:2]}/{digest}.{extension}"
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(content))
+    return name
+
+
+def build_variants(source):
+    """
+    Generate and store every configured variant of the image stored at ``source``.
+    """
+    config = get_config()
+    largest = max(config['VARIANTS'].values())
+    with default_storage.open(source, 'rb') as file:
+        image = Image.open(file)
+        # Let JPEG decode at a reduced scale when the original is much larger
+        image.draft('RGB', largest)
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+        image.load()
+
+    variants = {'source': source}
+    for name, size in config['VARIANTS'].items():
+        variants[name] = store_variant(render_variant(image, size, config), config)
+    return variants
+
+
+def process_product_image(product_id, source):
+    """
+    Build the variants of a product image and record them on the product.
+    Nothing is recorded if the product image changed in the meantime.
+    """
+    from products.api.cache import bump_catalogue_version
+    from products.models import Product
+
+    try:
+        variants = build_variants(source)
+        # update() skips the post_save signals, so this cannot schedule itself again
+        if Product.objects.filter(pk=product_id, image=source).update(image_variants=variants):
+            bump_catalogue_version()
+    except Exception:
+        logger.exception('Could not process image %s of product %s', source, product_id)
+
+
+def _process_in_worker(product_id, source):
+    try:
+        process_product_image(product_id, source)
+    finally:
+        # Worker threads own their connections, do not leave them open
+        connections.close_all()
+
+
+def schedule_image_processing(product):
+    """
+    Process the product image once the current transaction commits,
+    if it changed since its variants were built.
+    """
+    source = product.image.name if product.image else ''
+    if product.image_variants.get('source', '') == source:
+        return
+
+    if not source:
+        def clear():
+            from products.models import Product
+            Product.objects.filter(pk=product.pk, image='').update(image_variants={})
+        transaction.on_commit(clear)
+        return
+
+    def run():
+        if get_config()['SYNC']:
+            process_product_image(product.pk, source)
+        else:
+            get_executor().submit(_process_in_worker, product.pk, source)
+    transaction.on_commit(run)
+
+
+def variant_urls(variants, request=None):
+    """
+    Map each variant name to the URL of its file.
+    """
+    urls = {}
+    for name, path in variants.items():
+        if name == 'source':
+            continue
+        url = default_storage.url(path)
+        urls[name] = request.build_absolute_uri(url) if request is not None else url
+    return urls
@@ -0,0 +1,59 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.catalogue_files import RowWriter, detect_format
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        'Export products to a CSV or JSON-lines file that import_products can read. '
+        'Products are read in chunks, so the table is never loaded at once.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Output file, or - for the standard output.')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='File format, detected from the extension by default.')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Products fetched from the database at a time.')
+        parser.add_argument('--category', help='Only export products of the category with this slug.')
+        parser.add_argument('--user', help='Only export products owned by this username.')
+        parser.add_argument('--available-only', action='store_true', help='Only export available products.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            format = detect_format(path, options['format'] or ('jsonl' if path == '-' else None))
+        except ValueError as e:
+            raise CommandError(e)
+
+        products = Product.objects.order_by('id')
+        if options['category']:
+            products = products.filter(category__slug=options['category'])
+        if options['user']:
+            products = products.filter(user__username=options['user'])
+        if options['available_only']:
+            products = products.filter(available=True)
+        rows = products.values('name', 'slug', 'category__slug', 'description', 'price', 'available')
+
+        started = time.monotonic()
+        exported = 0
+        file = sys.stdout if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+        try:
+            writer = RowWriter(file, format)
+            for row in rows.iterator(chunk_size=max(options['chunk_size'], 1)):
+                row['category'] = row.pop('category__slug')
+                writer.write(row)
+                exported += 1
+        finally:
+            if file is not sys.stdout:
+                file.close()
+
+        elapsed = time.monotonic() - started
+        rate = exported / elapsed if elapsed else exported
+        # Keep the standard output clean when the export is written to it
+        report = self.stderr if path == '-' else self.stdout
+        report.write(self.style.SUCCESS(
+            f'Exported {exported} products in {elapsed:.2f}s ({rate:.0f} products/s).'
+        ))
@@ -0,0 +1,182 @@
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from products.api.cache import bump_catalogue_version
+from products.catalogue_files import detect_format, read_rows
+from products.models import Category, Product
+from products.prices import invalidate_prices
+from products.search import get_search_backend
+
+
+# Fields of an existing product replaced by its row in the file
+UPDATED_FIELDS = ['category', 'name', 'description', 'price', 'available']
+
+
+def parse_available(value):
+    if value is None or value == '':
+        return True
+    if isinstance(value, bool):
+        return value
+    value = str(value).strip().lower()
+    if value in ('true', '1', 'yes'):
+        return True
+    if value in ('false', '0', 'no'):
+        return False
+    raise ValueError(f'invalid available value {value!r}')
+
+
+class Command(BaseCommand):
+    help = (
+        'Import products from a CSV or JSON-lines file, streaming the file and '
+        'writing the products in batches. Fields: name, slug, category (slug), '
+        'description, price, available. Products of the user with the same slug '
+        'are updated, so a file can be imported again.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import.')
+        parser.add_argument('--user', required=True, help='Username of the owner of the imported products.')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='File format, detected from the extension by default.')
+        parser.add_argument('--batch-size', type=int, default=500, help='Products written per transaction.')
+        parser.add_argument('--create-categories', action='store_true', help='Create the categories missing from the database.')
+
+    def handle(self, *args, **options):
+        try:
+            format = detect_format(options['path'], options['format'])
+        except ValueError as e:
+            raise CommandError(e)
+        try:
+            owner = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f'User {options["user"]!r} does not exist.')
+        batch_size = max(options['batch_size'], 1)
+
+        started = time.monotonic()
+        categories = self.resolve_categories(options['path'], format, options['create_categories'])
+
+        self.search = get_search_backend()
+        imported = updated = skipped = 0
+        batch = []
+        with open(options['path'], newline='', encoding='utf-8-sig') as file:
+            for number, row in read_rows(file, format):
+                try:
+                    batch.append(self.build_product(row, categories, owner))
+                except (ValueError, ValidationError) as e:
+                    skipped += 1
+                    message = '; '.join(e.messages) if isinstance(e, ValidationError) else str(e)
+                    self.stderr.write(f'Line {number}: {message}')
+                    continue
+                if len(batch) >= batch_size:
+                    created, changed = self.save(batch)
+                    imported, updated = imported + created + changed, updated + changed
+                    batch = []
+                    if options['verbosity'] > 1:
+                        self.stdout.write(f'{imported} products imported...')
+            if batch:
+                created, changed = self.save(batch)
+                imported, updated = imported + created + changed, updated + changed
+
+        if imported:
+            bump_catalogue_version()
+        elapsed = time.monotonic() - started
+        rate = imported / elapsed if elapsed else imported
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} products ({updated} updated) in {elapsed:.2f}s ({rate:.0f} products/s), '
+            f'skipped {skipped} invalid rows.'
+        ))
+
+    def resolve_categories(self, path, format, create):
+        """
+        Read the category slugs used by the file and fetch them with one query.
+        This pre-pass also checks that the whole file can be parsed.
+        """
+        slugs = set()
+        with open(path, newline='', encoding='utf-8-sig') as file:
+            try:
+                for _, row in read_rows(file, format):
+                    slugs.add(str(row.get('category') or '').strip())
+            except ValueError as e:
+                # Malformed files are rejected before anything is written
+                raise CommandError(e)
+        slugs.discard('')
+
+        categories = Category.objects.in_bulk(slugs, field_name='slug')
+        missing = sorted(slugs - set(categories))
+        if missing and create:
+            Category.objects.bulk_create(
+                [Category(name=slug.replace('-', ' ').capitalize(), slug=slug) for slug in missing]
+            )
+            categories = Category.objects.in_bulk(slugs, field_name='slug')
+        elif missing:
+            raise CommandError(
+                f'Unknown categories: {", ".join(missing)}. Create them first or use --create-categories.'
+            )
+        return categories
+
+    def build_product(self, row, categories, owner):
+        name = str(row.get('name') or '').strip()
+        if not name:
+            raise ValueError('name is required')
+        category = categories.get(str(row.get('category') or '').strip())
+        if category is None:
+            raise ValueError('category is required')
+        try:
+            price = Decimal(str(row.get('price')).strip())
+        except InvalidOperation:
+            raise ValueError(f'invalid price {row.get("price")!r}')
+
+        product = Product(
+            category=category,
+            user=owner,
+            name=name,
+            slug=str(row.get('slug') or '').strip() or slugify(name),
+            description=row.get('description') or '',
+            price=price,
+            available=parse_available(row.get('available')),
+        )
+        # Field checks only: the relations are already resolved and need no query
+        product.clean_fields(exclude=['category', 'user', 'image'])
+        return product
+
+    def save(self, batch):
+        """
+        Write a batch of products in one transaction and return the number of
+        products created and updated. Products of the owner with the slug of
+        a row are updated; a slug repeated in the batch keeps its last row.
+
+        bulk_create and bulk_update send no signals, so the search index, the
+        price cache and the catalogue cache are updated here instead.
+        """
+        rows = {product.slug: product for product in batch}
+        with transaction.atomic():
+            existing = {
+                product.slug: product
+                for product in Product.objects.select_for_update().filter(user=batch[0].user, slug__in=list(rows))
+            }
+            # bulk_update does not touch auto_now fields, so set updated here
+            now = timezone.now()
+            changed = []
+            for slug, product in existing.items():
+                row = rows.pop(slug)
+                for field in UPDATED_FIELDS:
+                    setattr(product, field, getattr(row, field))
+                product.updated = now
+                changed.append(product)
+            if changed:
+                Product.objects.bulk_update(changed, UPDATED_FIELDS + ['updated'])
+
+            created = Product.objects.bulk_create(list(rows.values()))
+            if all(product.pk for product in created):
+                self.search.index(created + changed)
+            else:
+                # Databases that do not return primary keys from bulk inserts
+                self.search.rebuild()
+        invalidate_prices([product.pk for product in created + changed if product.pk])
+        return len(created), len(changed)
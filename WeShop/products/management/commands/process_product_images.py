@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from products.images import process_product_image
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Build the resized image variants of products whose variants are missing or outdated.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Rebuild the variants of every product image.')
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image='').only('id', 'image', 'image_variants').order_by('id')
+        processed = 0
+        for product in products.iterator(chunk_size=500):
+            if options['all'] or product.image_variants.get('source') != product.image.name:
+                process_product_image(product.pk, product.image.name)
+                processed += 1
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} product images.'))
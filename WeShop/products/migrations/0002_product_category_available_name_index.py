@@ -0,0 +1,20 @@
+# Generated by Django 4.2.16 on 2026-10-18 17:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["category", "available", "name"],
+                name="products_pr_categor_9c68c5_idx",
+            ),
+        ),
+    ]
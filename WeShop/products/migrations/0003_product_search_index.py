@@ -0,0 +1,49 @@
+# Generated by Django 4.2.16 on 2026-10-18 17:45
+
+from django.db import migrations
+
+# Kept in sync with products.search (SQLITE_TABLE and POSTGRES_VECTOR)
+SQLITE_CREATE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS products_product_fts "
+    "USING fts5(name, description, tokenize='unicode61 remove_diacritics 2', prefix='2 3 4')"
+)
+SQLITE_FILL = (
+    "INSERT INTO products_product_fts (rowid, name, description) "
+    "SELECT id, name, description FROM products_product"
+)
+SQLITE_DROP = "DROP TABLE IF EXISTS products_product_fts"
+
+POSTGRES_CREATE = (
+    "CREATE INDEX IF NOT EXISTS products_product_search_idx ON products_product "
+    "USING GIN ((setweight(to_tsvector('simple', coalesce(products_product.name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(products_product.description, '')), 'B')))"
+)
+POSTGRES_DROP = "DROP INDEX IF EXISTS products_product_search_idx"
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(SQLITE_CREATE)
+        schema_editor.execute(SQLITE_FILL)
+    elif vendor == "postgresql":
+        schema_editor.execute(POSTGRES_CREATE)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(SQLITE_DROP)
+    elif vendor == "postgresql":
+        schema_editor.execute(POSTGRES_DROP)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0002_product_category_available_name_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -27,6 +27,9 @@ class Product(models.Model):
     slug = models.SlugField(max_length=200)
     image = models.ImageField(upload_to='products/%Y/%m/%d',
                               blank=True)
+    image_variants = models.JSONField(default=dict,
+                                      blank=True,
+                                      editable=False)  # Resized copies of image, see products/images.py
     description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=10,
                                  decimal_places=2)
@@ -40,6 +43,14 @@ class Product(models.Model):
             models.Index(fields=['id', 'slug']),
             models.Index(fields=['name']),
             models.Index(fields=['-created']),
+            models.Index(fields=['category', 'available', 'name']),
+            # Filter and sort combinations accepted by products.api.filters.ProductFilter
+            models.Index(fields=['available', 'name']),
+            models.Index(fields=['available', 'price']),
+            models.Index(fields=['category', 'available', 'price']),
+            models.Index(fields=['available', 'created']),
+            models.Index(fields=['category', 'available', 'created']),
+            models.Index(fields=['user', 'available', 'created']),
         ]
 
     def __str__(self):
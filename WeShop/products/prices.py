@@ -0,0 +1,105 @@
+from django.conf import settings
+from django.core.cache import caches
+
+from products.models import Product
+from monitoring.metrics import count_cache
+
+DEFAULTS = {
+    'BACKEND': 'default',  # CACHES alias
+    'TIMEOUT': 300,
+    'KEY_PREFIX': 'product-price',
+}
+
+
+def get_config():
+    config = DEFAULTS.copy()
+    config.update(getattr(settings, 'PRICE_CACHE', {}))
+    return config
+
+
+def _key(product_id):
+    return f"{get_config()['KEY_PREFIX']}:{product_id}"
+
+
+def _parse_ids(product_ids):
+    ids = set()
+    for product_id in product_ids:
+        try:
+            ids.add(int(product_id))
+        except (TypeError, ValueError):
+            continue
+    return ids
+
+
+def _split_cached(ids, cached):
+    """
+    Return the prices found in the cache entries and the ids missing from them.
+    """
+    prices = {}
+    missing = set()
+    for product_id in ids:
+        key = _key(product_id)
+        if key not in cached:
+            missing.add(product_id)
+        elif cached[key] is not None:
+            prices[product_id] = cached[key]
+    return prices, missing
+
+
+def _missing_rows(missing):
+    return Product.objects.filter(id__in=missing).order_by().values_list('id', 'price')
+
+
+def _add_fetched(prices, missing, rows):
+    """
+    Add the fetched prices and return the cache entries to store.
+    Unknown ids are cached as None so they are not queried again.
+    """
+    fetched = {_key(product_id): None for product_id in missing}
+    for product_id, price in rows:
+        prices[product_id] = price
+        fetched[_key(product_id)] = price
+    return fetched
+
+
+def get_prices(product_ids):
+    """
+    Return a ``{product_id: price}`` dict for the given ids.
+
+    Prices come from the price cache; the ones missing from it are loaded with
+    a single query and cached until the product changes or TIMEOUT expires.
+    Unknown or malformed ids are left out of the result.
+    """
+    ids = _parse_ids(product_ids)
+    if not ids:
+        return {}
+
+    config = get_config()
+    cache = caches[config['BACKEND']]
+    prices, missing = _split_cached(ids, cache.get_many([_key(product_id) for product_id in ids]))
+    count_cache('price', len(ids) - len(missing), len(missing))
+    if missing:
+        cache.set_many(_add_fetched(prices, missing, _missing_rows(missing)), config['TIMEOUT'])
+    return prices
+
+
+async def aget_prices(product_ids):
+    """
+    Async version of get_prices, for async views.
+    """
+    ids = _parse_ids(product_ids)
+    if not ids:
+        return {}
+
+    config = get_config()
+    cache = caches[config['BACKEND']]
+    prices, missing = _split_cached(ids, await cache.aget_many([_key(product_id) for product_id in ids]))
+    count_cache('price', len(ids) - len(missing), len(missing))
+    if missing:
+        rows = [row async for row in _missing_rows(missing)]
+        await cache.aset_many(_add_fetched(prices, missing, rows), config['TIMEOUT'])
+    return prices
+
+
+def invalidate_prices(product_ids):
+    caches[get_config()['BACKEND']].delete_many([_key(product_id) for product_id in product_ids])
@@ -0,0 +1,173 @@
+import re
+from abc import ABC, abstractmethod
+
+from django.db import connection
+from django.db.models import Q
+
+from products.models import Product
+
+# Name of the SQLite FTS5 table, see migration 0003_product_search_index
+SQLITE_TABLE = 'products_product_fts'
+
+# Expression covered by the PostgreSQL GIN index, see migration
+# 0003_product_search_index. Both must stay identical for the index to be used.
+POSTGRES_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(products_product.name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(products_product.description, '')), 'B')"
+)
+
+MAX_TERMS = 8
+
+
+def search_terms(query):
+    """
+    Split a user query into lowercase word terms, dropping any search syntax.
+    """
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+class SearchBackend(ABC):
+    """
+    Full-text search over product names and descriptions.
+
+    Every term of the query must match, and each term also matches longer
+    words starting with it, so partial input such as "cami" finds "camisa".
+    """
+
+    def search(self, query, category_slug=None, available=True, offset=0, limit=20):
+        """
+        Return the ids of matching products, best matches first.
+        """
+        terms = search_terms(query)
+        if not terms:
+            return []
+        return self.search_terms(terms, category_slug, available, offset, limit)
+
+    @abstractmethod
+    def search_terms(self, terms, category_slug, available, offset, limit):
+        """
+        Return the ids of the products matching every term, best matches first.
+        """
+
+    def index(self, products):
+        """
+        Add or refresh products in the index.
+        """
+
+    def remove(self, product_ids):
+        """
+        Remove products from the index.
+        """
+
+    def rebuild(self):
+        """
+        Rebuild the whole index from the products table.
+        """
+
+
+def _filters(category_slug, available):
+    joins, where, params = [], [], []
+    if available is not None:
+        where.append('products_product.available = %s')
+        params.append(available)
+    if category_slug:
+        joins.append('JOIN products_category ON products_category.id = products_product.category_id')
+        where.append('products_category.slug = %s')
+        params.append(category_slug)
+    return ' '.join(joins), ''.join(f' AND {condition}' for condition in where), params
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """
+    Search backed by an FTS5 table kept in sync by the Product signals.
+    """
+
+    def search_terms(self, terms, category_slug, available, offset, limit):
+        match = ' '.join(f'"{term}"*' for term in terms)
+        joins, where, params = _filters(category_slug, available)
+        sql = (
+            f'SELECT products_product.id FROM {SQLITE_TABLE} '
+            f'JOIN products_product ON products_product.id = {SQLITE_TABLE}.rowid {joins} '
+            f'WHERE {SQLITE_TABLE} MATCH %s{where} '
+            # Matches in the name weigh ten times more than in the description
+            f'ORDER BY bm25({SQLITE_TABLE}, 10.0, 1.0), products_product.id '
+            'LIMIT %s OFFSET %s'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [match, *params, limit, offset])
+            return [row[0] for row in cursor.fetchall()]
+
+    def index(self, products):
+        products = list(products)
+        if not products:
+            return
+        with connection.cursor() as cursor:
+            self._delete(cursor, [product.pk for product in products])
+            cursor.executemany(
+                f'INSERT INTO {SQLITE_TABLE} (rowid, name, description) VALUES (%s, %s, %s)',
+                [(product.pk, product.name, product.description) for product in products],
+            )
+
+    def remove(self, product_ids):
+        product_ids = list(product_ids)
+        if product_ids:
+            with connection.cursor() as cursor:
+                self._delete(cursor, product_ids)
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SQLITE_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {SQLITE_TABLE} (rowid, name, description) '
+                'SELECT id, name, description FROM products_product'
+            )
+
+    def _delete(self, cursor, product_ids):
+        placeholders = ', '.join(['%s'] * len(product_ids))
+        cursor.execute(f'DELETE FROM {SQLITE_TABLE} WHERE rowid IN ({placeholders})', product_ids)
+
+
+class PostgresSearchBackend(SearchBackend):
+    """
+    Search backed by a GIN index on a tsvector expression.
+    PostgreSQL maintains the index itself, so there is nothing to sync.
+    """
+
+    def search_terms(self, terms, category_slug, available, offset, limit):
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        joins, where, params = _filters(category_slug, available)
+        sql = (
+            'SELECT products_product.id FROM products_product '
+            f"{joins} WHERE ({POSTGRES_VECTOR}) @@ to_tsquery('simple', %s){where} "
+            f"ORDER BY ts_rank({POSTGRES_VECTOR}, to_tsquery('simple', %s)) DESC, products_product.id "
+            'LIMIT %s OFFSET %s'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [tsquery, *params, tsquery, limit, offset])
+            return [row[0] for row in cursor.fetchall()]
+
+
+class SimpleSearchBackend(SearchBackend):
+    """
+    Unindexed fallback for other databases, matching terms with icontains.
+    """
+
+    def search_terms(self, terms, category_slug, available, offset, limit):
+        products = Product.objects.all()
+        if available is not None:
+            products = products.filter(available=available)
+        if category_slug:
+            products = products.filter(category__slug=category_slug)
+        for term in terms:
+            products = products.filter(Q(name__icontains=term) | Q(description__icontains=term))
+        return list(products.order_by('name', 'id').values_list('id', flat=True)[offset:offset + limit])
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_search_backend():
+    return BACKENDS.get(connection.vendor, SimpleSearchBackend)()
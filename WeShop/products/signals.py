@@ -0,0 +1,85 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from products.api.cache import bump_catalogue_version
+from products.images import schedule_image_processing, strip_metadata
+from products.models import Category, Product
+from products.prices import invalidate_prices
+from products.search import get_search_backend
+
+_bulk_change = ContextVar('products_bulk_change', default=False)
+
+
+@contextmanager
+def bulk_change():
+    """
+    Skip the per-product handlers below while many products are written at
+    once, e.g. deleted by a queryset. The caller invalidates the catalogue,
+    the prices and the search index itself, once for all the products.
+    """
+    token = _bulk_change.set(True)
+    try:
+        yield
+    finally:
+        _bulk_change.reset(token)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def catalogue_changed(sender, instance, **kwargs):
+    """
+    Invalidate cached catalogue responses on every product or category change,
+    including price/availability edits made from the ProductAdmin changelist.
+    """
+    if not _bulk_change.get():
+        bump_catalogue_version()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_price_changed(sender, instance, **kwargs):
+    """
+    Drop the cached price so cart totals pick up the new one.
+    """
+    if not _bulk_change.get():
+        invalidate_prices([instance.pk])
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    """
+    Keep the full-text search index in sync with the product.
+    """
+    if not _bulk_change.get():
+        get_search_backend().index([instance])
+
+
+@receiver(pre_save, sender=Product)
+def strip_image_metadata(sender, instance, raw=False, **kwargs):
+    """
+    Drop the EXIF data (GPS position, camera) of a new upload before the
+    original is stored and served.
+    """
+    if raw or not instance.image or instance.image._committed:
+        return
+    instance.image.file = strip_metadata(instance.image.file)
+
+
+@receiver(post_save, sender=Product)
+def process_image(sender, instance, raw=False, **kwargs):
+    """
+    Build the resized variants in the background when the image changes.
+    """
+    if not raw:
+        schedule_image_processing(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    if not _bulk_change.get():
+        get_search_backend().remove([instance.pk])
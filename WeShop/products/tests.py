@@ -1,3 +1,640 @@
-from django.test import TestCase
+import itertools
+import json
+import os
+import tempfile
+from decimal import Decimal
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils.dateparse import parse_datetime
+from PIL import ExifTags, Image
+from rest_framework.test import APIClient
+
+from products.api.filters import FilterError, ProductFilter
+from products.api.views import product_rows
+from products.models import Category, Product
+from products.prices import get_prices
+from products.search import get_search_backend
+from WeShop.testing import QueryCountTestCase, clear_caches, create_products
+
+
+def create_catalogue(size, categories=1):
+    """
+    A user owning ``size`` available products spread over ``categories``
+    categories, indexed for search.
+    """
+    fixture = create_products(size, categories)
+    get_search_backend().rebuild()
+    return fixture
+
+
+class ProductQueryCountTests(QueryCountTestCase):
+
+    def test_list(self):
+        self.assertQueryCount(1, create_catalogue, lambda fixture: APIClient().get('/products/list/'), status=200)
+
+    def test_list_filtered(self):
+        def request(fixture):
+            response = APIClient().get('/products/list/', {'category_slug': 'categoria-0', 'min_price': 5, 'ordering': 'price'})
+            self.assertTrue(response.data['results'])
+            self.assertEqual({product['category'] for product in response.data['results']}, {fixture['categories'][0].id})
+            return response
+
+        self.assertQueryCount(1, lambda size: create_catalogue(size, categories=2), request, status=200)
+
+    def test_list_facets(self):
+        self.assertQueryCount(
+            2, lambda size: create_catalogue(size, categories=min(size, 10)),
+            lambda fixture: APIClient().get('/products/list/', {'facets': 'true'}),
+            status=200,
+        )
+
+    def test_list_stream(self):
+        def request(fixture):
+            response = APIClient().get('/products/list/', {'stream': 'true'})
+            b''.join(response.streaming_content)
+            return response
+
+        self.assertQueryCount(1, create_catalogue, request, status=200)
+
+    def test_list_async(self):
+        self.assertQueryCount(1, create_catalogue, lambda fixture: self.client.get('/products/async/list/'), status=200)
+
+    def test_categories(self):
+        self.assertQueryCount(
+            1, lambda size: create_catalogue(size, categories=size),
+            lambda fixture: APIClient().get('/products/categories/'),
+            status=200,
+        )
+
+    def test_categories_async(self):
+        self.assertQueryCount(
+            1, lambda size: create_catalogue(size, categories=size),
+            lambda fixture: self.client.get('/products/async/categories/'),
+            status=200,
+        )
+
+    def test_detail(self):
+        def request(fixture):
+            product = fixture['products'][-1]
+            return APIClient().get('/products/api/', {'id': product.id, 'slug': product.slug})
+
+        self.assertQueryCount(1, create_catalogue, request, status=200)
+
+    def test_detail_async(self):
+        def request(fixture):
+            product = fixture['products'][-1]
+            return self.client.get('/products/async/api/', {'id': product.id, 'slug': product.slug})
+
+        self.assertQueryCount(1, create_catalogue, request, status=200)
+
+    def test_search(self):
+        self.assertQueryCount(2, create_catalogue, lambda fixture: APIClient().get('/products/search/', {'q': 'camiseta'}), status=200)
+
+    def test_batch_update(self):
+        def request(fixture):
+            return self.client_for(fixture['token']).post('/products/batch/', {
+                'update': [
+                    {'id': product.id, 'slug': product.slug, 'price': '19.90'}
+                    for product in fixture['products']
+                ],
+            }, format='json')
+
+        self.assertQueryCount(7, create_catalogue, request, status=200)
+
+    def test_batch_create(self):
+        def request(fixture):
+            return self.client_for(fixture['token']).post('/products/batch/', {
+                'create': [
+                    {'name': f'Boné {index}', 'price': '29.90', 'category': fixture['categories'][0].id}
+                    for index in range(len(fixture['products']))
+                ],
+            }, format='json')
+
+        # SQLite takes at most 999 parameters per statement, so products are
+        # inserted 90 at a time; stay within one INSERT
+        self.assertQueryCount(7, create_catalogue, request, sizes=(1, 10, 90), status=200)
+
+    def test_batch_delete(self):
+        def request(fixture):
+            return self.client_for(fixture['token']).post('/products/batch/', {
+                'delete': [{'id': product.id, 'slug': product.slug} for product in fixture['products']],
+            }, format='json')
+
+        self.assertQueryCount(9, create_catalogue, request, status=200)
+
+    def test_create(self):
+        def request(fixture):
+            return self.client_for(fixture['token']).post('/products/api/', {
+                'name': 'Boné azul', 'price': '29.90', 'category': fixture['categories'][0].id,
+            }, format='json')
+
+        self.assertQueryCount(6, create_catalogue, request, status=201)
+
+    def test_update(self):
+        def request(fixture):
+            product = fixture['products'][-1]
+            return self.client_for(fixture['token']).put('/products/api/', {
+                'id': product.id, 'slug': product.slug, 'price': '19.90',
+            }, format='json')
+
+        self.assertQueryCount(5, create_catalogue, request, status=200)
+
+    def test_delete(self):
+        def request(fixture):
+            product = fixture['products'][-1]
+            return self.client_for(fixture['token']).delete('/products/api/', {
+                'id': product.id, 'slug': product.slug,
+            }, format='json')
+
+        self.assertQueryCount(6, create_catalogue, request, status=204)
+
+
+class ProductBatchTests(TestCase):
+
+    def test_rejected_batch_applies_nothing(self):
+        fixture = create_products(1)
+        other = Product.objects.create(
+            category=fixture['categories'][0], user=User.objects.create_user('other'),
+            name='Bermuda', slug='bermuda', price=Decimal('49.90'),
+        )
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {fixture["token"].key}')
+
+        response = client.post('/products/batch/', {
+            'create': [{'name': 'Boné', 'price': '29.90', 'category': fixture['categories'][0].id}],
+            'update': [{'id': other.id, 'slug': other.slug, 'price': '1.00'}],
+        }, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['create'][0]['status'], 424)
+        self.assertEqual(response.data['update'][0]['status'], 403)
+        self.assertFalse(Product.objects.filter(name='Boné').exists())
+        other.refresh_from_db()
+        self.assertEqual(other.price, Decimal('49.90'))
+
+
+    def batch(self, fixture, data):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {fixture["token"].key}')
+        return client.post('/products/batch/', data, format='json')
+
+    def test_names_without_a_slug_are_rejected(self):
+        fixture = create_products(1)
+        category = fixture['categories'][0].id
+
+        response = self.batch(fixture, {'create': [
+            {'name': 'Boné', 'price': '29.90', 'category': category},
+            {'name': '!!!', 'price': '29.90', 'category': category},
+        ]})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['create'][0]['status'], 424)
+        self.assertEqual(response.data['create'][1]['status'], 400)
+        self.assertIn('name', response.data['create'][1]['errors'])
+        self.assertFalse(Product.objects.filter(name='Boné').exists())
+
+    def test_duplicate_slugs_are_rejected(self):
+        fixture = create_products(1)
+        category = fixture['categories'][0].id
+
+        response = self.batch(fixture, {'create': [
+            {'name': 'Boné Azul', 'price': '29.90', 'category': category},
+            {'name': 'boné azul!', 'price': '19.90', 'category': category},
+        ]})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['create'][0]['status'], 424)
+        self.assertEqual(response.data['create'][1]['status'], 400)
+        self.assertIn('bone-azul', str(response.data['create'][1]['errors']['name']))
+        self.assertFalse(Product.objects.filter(slug='bone-azul').exists())
+
+    def test_search_and_catalogue_cache_follow_the_batch(self):
+        clear_caches()
+        self.addCleanup(clear_caches)
+        fixture = create_catalogue(2)
+        kept, deleted = fixture['products']
+        listing = self.client.get('/products/list/')
+        self.client.get('/products/search/', {'q': 'camiseta'})
+
+        response = self.batch(fixture, {
+            'create': [{'name': 'Boné Listrado', 'price': '29.90', 'category': fixture['categories'][0].id}],
+            'update': [{'id': kept.id, 'slug': kept.slug, 'name': 'Bermuda Xadrez'}],
+            'delete': [{'id': deleted.id, 'slug': deleted.slug}],
+        })
+        self.assertEqual(response.status_code, 200)
+
+        fresh = self.client.get('/products/list/', HTTP_IF_NONE_MATCH=listing['ETag'])
+        self.assertEqual(fresh.status_code, 200)
+        self.assertEqual(
+            sorted(product['name'] for product in fresh.json()['results']), ['Bermuda Xadrez', 'Boné Listrado'],
+        )
+
+        def found(query):
+            return [product['name'] for product in self.client.get('/products/search/', {'q': query}).json()['results']]
+
+        # The kept product still matches through its description
+        self.assertEqual(found('camiseta'), ['Bermuda Xadrez'])
+        self.assertEqual(found('xadrez'), ['Bermuda Xadrez'])
+        self.assertEqual(found('listrado'), ['Boné Listrado'])
+
+
+class SearchTests(TestCase):
+
+    def setUp(self):
+        clear_caches()
+        self.addCleanup(clear_caches)
+        self.fixture = create_products(0)
+        self.category = Category.objects.create(name='Roupas', slug='roupas')
+
+    def create(self, name, description=''):
+        return Product.objects.create(
+            category=self.category, user=self.fixture['user'], name=name, slug=name.lower().replace(' ', '-'),
+            description=description, price=Decimal('49.90'),
+        )
+
+    def search(self, query):
+        return get_search_backend().search(query)
+
+    def test_name_matches_rank_first(self):
+        # Created first, so the ranking cannot come from the id tie-breaker
+        in_description = self.create('Bolsa', 'Combina com jaqueta, jaqueta jeans ou jaqueta de couro')
+        in_name = self.create('Jaqueta Corta-vento', 'Leve e impermeável')
+
+        self.assertEqual(self.search('jaqueta'), [in_name.id, in_description.id])
+        response = self.client.get('/products/search/', {'q': 'jaqueta'})
+        self.assertEqual([product['id'] for product in response.json()['results']], [in_name.id, in_description.id])
+
+    def test_prefixes_and_diacritics(self):
+        pants = self.create('Calça Jeans', 'Algodão orgânico')
+        jacket = self.create('Jaqueta', 'Couro sintético')
+
+        self.assertEqual(self.search('cal'), [pants.id])
+        self.assertEqual(self.search('calca'), [pants.id])
+        self.assertEqual(self.search('CALÇA jea'), [pants.id])
+        self.assertEqual(self.search('algodao'), [pants.id])
+        self.assertEqual(self.search('sintetico'), [jacket.id])
+        self.assertEqual(self.search('calça couro'), [])
+
+    def test_index_follows_the_products(self):
+        product = self.create('Regata Listrada')
+        self.assertEqual(self.search('regata'), [product.id])
+
+        product.name = 'Bermuda Listrada'
+        product.save()
+        self.assertEqual(self.search('regata'), [])
+        self.assertEqual(self.search('bermuda'), [product.id])
+
+        product.delete()
+        self.assertEqual(self.search('bermuda'), [])
+        self.assertEqual(self.search('listrada'), [])
+
+
+class ProductFilterTests(TestCase):
+
+    values = {
+        'category_slug': 'categoria-1',
+        'available': 'true',
+        'min_price': '12',
+        'max_price': '18.5',
+        'created_after': '2000-01-01T00:00:00',
+        'created_before': '2100-01-01T00:00:00',
+    }
+    ranges = [(), ('min_price',), ('max_price',), ('min_price', 'max_price'), ('created_after',), ('created_before',)]
+
+    def setUp(self):
+        clear_caches()
+        self.addCleanup(clear_caches)
+        self.fixture = create_products(12, categories=2)
+        self.values = {**self.values, 'user': str(self.fixture['user'].id)}
+        other = User.objects.create_user('other')
+        Product.objects.create(
+            category=self.fixture['categories'][1], user=other, name='Bermuda', slug='bermuda', price=Decimal('15.00'),
+        )
+        Product.objects.filter(name__in=['Camiseta 3', 'Camiseta 8']).update(available=False)
+
+    def combinations(self):
+        """
+        Every set of filters with every ordering, including none.
+        """
+        for size in range(len(ProductFilter.equality_filters) + 1):
+            for equality in itertools.combinations(ProductFilter.equality_filters, size):
+                for ranges in self.ranges:
+                    for ordering in [None, *ProductFilter.orderings]:
+                        params = {param: self.values[param] for param in equality + ranges}
+                        if ordering:
+                            params['ordering'] = ordering
+                        yield params
+
+    def expected_ids(self, params, ordering):
+        """
+        The ids the listing must return, filtered and sorted in Python.
+        """
+        checks = {
+            'category_slug': lambda product, value: product.category.slug == value,
+            'available': lambda product, value: product.available == (value == 'true'),
+            'user': lambda product, value: product.user_id == int(value),
+            'min_price': lambda product, value: product.price >= Decimal(value),
+            'max_price': lambda product, value: product.price <= Decimal(value),
+            'created_after': lambda product, value: product.created >= parse_datetime(value + 'Z'),
+            'created_before': lambda product, value: product.created <= parse_datetime(value + 'Z'),
+        }
+        params = {'available': 'true', **params}
+        products = [
+            product for product in Product.objects.select_related('category')
+            if all(checks[param](product, value) for param, value in params.items() if param != 'ordering')
+        ]
+        column = ordering.lstrip('-')
+        products.sort(key=lambda product: (getattr(product, column), product.id), reverse=ordering.startswith('-'))
+        return [product.id for product in products]
+
+    def test_supported_combinations_use_an_index(self):
+        supported = []
+        for params in self.combinations():
+            try:
+                filters = ProductFilter(params)
+            except FilterError:
+                continue
+            supported.append(params)
+            with self.subTest(**params):
+                response = self.client.get('/products/list/', {**params, 'page_size': 100})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    [product['id'] for product in response.json()['results']],
+                    self.expected_ids(params, filters.ordering),
+                )
+                if connection.vendor == 'sqlite':
+                    plan = product_rows(filters).explain()
+                    self.assertNotIn('TEMP B-TREE', plan)
+                    self.assertRegex(plan, r'SEARCH products_product USING (COVERING )?INDEX')
+
+        self.assertIn({'category_slug': 'categoria-1', 'min_price': '12', 'ordering': '-price'}, supported)
+        self.assertIn({'user': self.values['user'], 'created_after': '2000-01-01T00:00:00'}, supported)
+
+    def test_unsupported_combinations_are_rejected(self):
+        rejected = []
+        for params in self.combinations():
+            try:
+                ProductFilter(params)
+            except FilterError as e:
+                rejected.append(params)
+                with self.subTest(**params):
+                    response = self.client.get('/products/list/', params)
+                    self.assertEqual(response.status_code, 400)
+                    self.assertEqual(response.json(), {'error': str(e)})
+
+        self.assertIn({'user': self.values['user'], 'ordering': 'name'}, rejected)
+        self.assertIn({'min_price': '12', 'ordering': '-created'}, rejected)
+        response = self.client.get('/products/list/', {'min_price': '12', 'created_after': '2000-01-01T00:00:00'})
+        self.assertEqual(response.json(), {'error': 'Only one of price or created date can be filtered by range.'})
+
+    def test_unknown_parameters_are_rejected(self):
+        for params in ({'colour': 'azul'}, {'min_prize': '10'}, {'category': 'categoria-1', 'ordering': 'name'}):
+            with self.subTest(**params):
+                response = self.client.get('/products/list/', params)
+                self.assertEqual(response.status_code, 400)
+                self.assertTrue(response.json()['error'].startswith(f'Unknown parameter "{next(iter(params))}"'))
+
+    def test_invalid_values_are_rejected(self):
+        for params in (
+            {'min_price': 'barato'}, {'available': 'talvez'}, {'user': 'eu'},
+            {'created_after': 'ontem'}, {'ordering': 'popularity'},
+        ):
+            with self.subTest(**params):
+                self.assertEqual(self.client.get('/products/list/', params).status_code, 400)
+
+
+class CatalogueCacheTests(TestCase):
+
+    def setUp(self):
+        clear_caches()
+        self.fixture = create_products(3)
+
+    def tearDown(self):
+        clear_caches()
+
+    def test_validators_and_not_modified(self):
+        response = self.client.get('/products/list/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+
+        cached = self.client.get('/products/list/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached['ETag'], response['ETag'])
+        since = self.client.get('/products/list/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(since.status_code, 304)
+
+    def test_representations_do_not_share_the_etag(self):
+        response = self.client.get('/products/list/')
+        self.assertIn('Accept', response['Vary'])
+        browsable = self.client.get('/products/list/', HTTP_ACCEPT='text/html')
+        self.assertEqual(browsable.status_code, 200)
+        self.assertIn('Accept', browsable['Vary'])
+        self.assertNotEqual(browsable['ETag'], response['ETag'])
+
+        stale = self.client.get('/products/list/', HTTP_ACCEPT='text/html', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(stale.status_code, 200)
+
+    def test_product_change_invalidates(self):
+        response = self.client.get('/products/list/')
+        product = self.fixture['products'][0]
+        product.name = 'Camiseta renomeada'
+        product.save()
+
+        fresh = self.client.get('/products/list/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(fresh.status_code, 200)
+        self.assertNotEqual(fresh['ETag'], response['ETag'])
+        self.assertIn('Camiseta renomeada', [item['name'] for item in fresh.json()['results']])
+
+
+class AsyncViewTests(TestCase):
+
+    def setUp(self):
+        clear_caches()
+        self.fixture = create_products(3, categories=2)
+
+    def tearDown(self):
+        clear_caches()
+
+    def assertSameResponse(self, path, params):
+        sync = self.client.get(f'/products/{path}', params)
+        asynchronous = self.client.get(f'/products/async/{path}', params)
+        self.assertEqual(asynchronous.status_code, sync.status_code)
+        sync_data, async_data = sync.json(), asynchronous.json()
+        if isinstance(sync_data, dict) and 'results' in sync_data:
+            # The next and previous links point at each view's own path
+            for data in (sync_data, async_data):
+                data.pop('next')
+                data.pop('previous')
+        self.assertEqual(async_data, sync_data)
+
+    def test_list_matches_sync(self):
+        self.assertSameResponse('list/', {'category_slug': 'categoria-1', 'facets': 'true'})
+        self.assertSameResponse('list/', {'category_slug': 'desconhecida'})
+        self.assertSameResponse('list/', {'colour': 'azul'})
+
+    def test_detail_matches_sync(self):
+        product = self.fixture['products'][0]
+        self.assertSameResponse('api/', {'id': product.id, 'slug': product.slug})
+        self.assertSameResponse('api/', {'id': product.id, 'slug': 'outra'})
+        self.assertSameResponse('api/', {'id': 'x', 'slug': product.slug})
+        self.assertSameResponse('api/', {'slug': product.slug})
+
+
+class PriceCacheTests(TestCase):
+
+    def setUp(self):
+        clear_caches()
+        self.fixture = create_products(2)
+
+    def tearDown(self):
+        clear_caches()
+
+    def test_prices_and_unknown_ids_are_cached(self):
+        products = self.fixture['products']
+        ids = [str(product.id) for product in products] + ['999999', 'x']
+        expected = {product.id: product.price for product in products}
+
+        with self.assertNumQueries(1):
+            self.assertEqual(get_prices(ids), expected)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_prices(ids), expected)
+
+    def test_price_change_invalidates(self):
+        product = self.fixture['products'][0]
+        get_prices([product.id])
+        product.price = Decimal('123.45')
+        product.save()
+
+        self.assertEqual(get_prices([product.id]), {product.id: Decimal('123.45')})
+
+
+class ImageMetadataTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        override = override_settings(
+            MEDIA_ROOT=media_root.name, MEDIA_SENDFILE_HEADER=None, PRODUCT_IMAGES={'SYNC': True},
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def upload(self):
+        exif = Image.Exif()
+        exif[ExifTags.Base.Make] = 'Camera'
+        exif[ExifTags.Base.Orientation] = 6  # rotated 90° clockwise
+        exif.get_ifd(ExifTags.IFD.GPSInfo)[ExifTags.GPS.GPSLatitudeRef] = 'S'
+        output = BytesIO()
+        Image.new('RGB', (40, 20), 'red').save(output, format='JPEG', exif=exif)
+        return SimpleUploadedFile('foto.jpg', output.getvalue(), content_type='image/jpeg')
+
+    def test_served_original_has_no_exif(self):
+        product = create_products(1)['products'][0]
+        product.image = self.upload()
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+
+        response = self.client.get(product.image.url)
+        self.assertEqual(response.status_code, 200)
+        image = Image.open(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(image.format, 'JPEG')
+        self.assertEqual(dict(image.getexif()), {})
+        # The orientation was applied to the pixels instead
+        self.assertEqual(image.size, (20, 40))
+        product.refresh_from_db()
+        self.assertEqual(set(product.image_variants), {'source', 'thumbnail', 'medium'})
+
+
+class CatalogueFileTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.fixture = create_products(3, categories=2)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def write_jsonl(self, name, rows):
+        with open(self.path(name), 'w', encoding='utf-8') as output:
+            for row in rows:
+                output.write(row if isinstance(row, str) else json.dumps(row))
+                output.write('\n')
+        return self.path(name)
+
+    def import_products(self, path, *args):
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_products', path, '--user', 'seller', *args, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def catalogue(self):
+        return sorted(Product.objects.values_list(
+            'name', 'slug', 'category__slug', 'description', 'price', 'available',
+        ))
+
+    def test_round_trip(self):
+        product = self.fixture['products'][1]
+        product.available = False
+        product.price = Decimal('7.50')
+        product.save()
+        exported = self.catalogue()
+        for extension in ('csv', 'jsonl'):
+            path = self.path(f'produtos.{extension}')
+            call_command('export_products', path, stdout=StringIO())
+
+            Product.objects.all().delete()
+            Category.objects.all().delete()
+            self.import_products(path, '--create-categories')
+
+            self.assertEqual(self.catalogue(), exported)
+
+    def test_malformed_rows(self):
+        category = self.fixture['categories'][0].slug
+        path = self.write_jsonl('produtos.jsonl', [
+            {'name': 'Boné', 'category': category, 'price': '29.90'},
+            {'name': 'Bermuda', 'category': category, 'price': 'barato'},
+            {'name': '', 'category': category, 'price': '9.90'},
+        ])
+
+        stdout, stderr = self.import_products(path)
+
+        self.assertIn('Imported 1 products', stdout)
+        self.assertIn('skipped 2 invalid rows', stdout)
+        self.assertIn("Line 2: invalid price 'barato'", stderr)
+        self.assertIn('Line 3: name is required', stderr)
+        self.assertEqual(Product.objects.filter(name='Boné').count(), 1)
+
+        # A line that cannot be parsed rejects the whole file before anything is written
+        path = self.write_jsonl('quebrado.jsonl', [{'name': 'Regata', 'category': category, 'price': '9.90'}, '{"name": '])
+        with self.assertRaisesMessage(CommandError, 'Line 2 is not valid JSON.'):
+            self.import_products(path)
+        self.assertFalse(Product.objects.filter(name='Regata').exists())
+
+    def test_reimport_updates_existing_products(self):
+        category = self.fixture['categories'][1].slug
+        existing = self.fixture['products'][0]
+        rows = [
+            {'name': 'Camiseta nova', 'slug': existing.slug, 'category': category, 'price': '15.00', 'available': False},
+            {'name': 'Boné', 'category': category, 'price': '29.90'},
+        ]
+        path = self.write_jsonl('produtos.jsonl', rows)
+        count = Product.objects.count()
+
+        self.import_products(path)
+        stdout, _ = self.import_products(path)
+
+        self.assertIn('Imported 2 products (2 updated)', stdout)
+        self.assertEqual(Product.objects.count(), count + 1)
+        existing.refresh_from_db()
+        self.assertEqual(
+            (existing.name, existing.category.slug, existing.price, existing.available),
+            ('Camiseta nova', category, Decimal('15.00'), False),
+        )
+        self.assertEqual(Product.objects.get(slug='bone').price, Decimal('29.90'))